@@ -0,0 +1,228 @@
+# api_client.py — cliente HTTP del servicio de scoring (risk_service.py)
+# - Una sesión requests por proceso con pool de conexiones keep-alive (RISK_API_POOL).
+# - Deadline estricto por llamada (RISK_API_DEADLINE_S): los reintentos sólo usan lo que queda.
+#   El timeout de requests es por lectura de socket, no total: el cuerpo se lee en streaming
+#   con un watchdog que corta la conexión al vencer el deadline aunque el servidor siga
+#   mandando bytes de a poco.
+# - Circuit breaker: tras RISK_API_BREAKER_FAILS fallas o llamadas lentas seguidas queda
+#   abierto RISK_API_BREAKER_OPEN_S y no se llama al servicio; luego deja pasar una prueba.
+# Cualquier falla de red, timeout, HTTP != 2xx, respuesta no-JSON o circuito abierto se
+# convierte en APIClientError para que el llamador caiga al cálculo local.
+
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RISK_API_URL = os.getenv("RISK_API_URL", "").strip().rstrip("/")
+RISK_API_DEADLINE_S = float(os.getenv("RISK_API_DEADLINE_S", os.getenv("RISK_API_TIMEOUT_S", "0.8")))
+RISK_API_CONNECT_S = float(os.getenv("RISK_API_CONNECT_S", "0.3"))
+RISK_API_RETRIES = int(os.getenv("RISK_API_RETRIES", "1"))
+RISK_API_POOL = int(os.getenv("RISK_API_POOL", "8"))
+RISK_API_SLOW_S = float(os.getenv("RISK_API_SLOW_S", "0.5"))
+BREAKER_FAILS = int(os.getenv("RISK_API_BREAKER_FAILS", "3"))
+BREAKER_OPEN_S = float(os.getenv("RISK_API_BREAKER_OPEN_S", "30"))
+
+
+class APIClientError(Exception):
+    """Error al hablar con el servicio de scoring (red, timeout, HTTP, payload o circuito abierto)."""
+
+    def __init__(self, msg: str, status: Optional[int] = None) -> None:
+        super().__init__(msg)
+        self.status = status
+
+
+class CircuitBreaker:
+    """closed → (N fallas/lentas seguidas) → open → (open_s) → half_open → 1 prueba → closed|open."""
+
+    def __init__(self, fails: int = BREAKER_FAILS, open_s: float = BREAKER_OPEN_S) -> None:
+        self.fails = max(1, fails)
+        self.open_s = open_s
+        self._lock = threading.Lock()
+        self._streak = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self._opened_at >= self.open_s else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.open_s or self._probing:
+                return False
+            self._probing = True  # una sola llamada de prueba en half_open
+            return True
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            self._probing = False
+            if ok:
+                self._streak = 0
+                self._opened_at = None
+                return
+            self._streak += 1
+            if self._opened_at is not None or self._streak >= self.fails:
+                if self._opened_at is None:
+                    self.trips += 1
+                    print(f"⚠️ [risk_api] circuito abierto por {self.open_s:.0f}s "
+                          f"({self._streak} fallas/lentas seguidas)")
+                self._opened_at = time.monotonic()
+
+
+def _read_body(r: requests.Response, deadline: float, chunk: int = 16384) -> bytes:
+    """Cuerpo de una respuesta en streaming; APIClientError si no termina antes de 'deadline'."""
+    # Un watchdog corta el socket al vencer el deadline: una lectura bloqueada (servidor que
+    # manda de a un byte) se destraba en ese momento y no al cumplirse el timeout por lectura.
+    sock = getattr(getattr(r.raw, "_connection", None), "sock", None)
+    expired = threading.Event()
+
+    def _cut() -> None:
+        expired.set()
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    timer = threading.Timer(max(0.0, deadline - time.monotonic()), _cut)
+    timer.daemon = True
+    timer.start()
+    parts: List[bytes] = []
+    try:
+        for part in r.iter_content(chunk):
+            if expired.is_set():
+                break
+            parts.append(part)
+    except requests.RequestException as e:
+        if not expired.is_set():
+            r.close()
+            raise APIClientError(f"{type(e).__name__}: {e}")
+    finally:
+        timer.cancel()
+    if expired.is_set():
+        r.close()  # conexión cortada o a medio leer: no vuelve al pool
+        raise APIClientError("deadline agotado leyendo la respuesta")
+    return b"".join(parts)
+
+
+class RiskAPIClient:
+    def __init__(self, base_url: str = RISK_API_URL, deadline_s: float = RISK_API_DEADLINE_S,
+                 retries: int = RISK_API_RETRIES, pool: int = RISK_API_POOL,
+                 slow_s: float = RISK_API_SLOW_S, breaker: Optional[CircuitBreaker] = None) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.deadline_s = deadline_s
+        self.retries = max(0, retries)
+        self.slow_s = slow_s
+        self.breaker = breaker or CircuitBreaker()
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool, max_retries=0)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._latencies: Deque[float] = deque(maxlen=512)
+        self._counts = {"calls": 0, "ok": 0, "errors": 0, "slow": 0, "rejected": 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._counts[key] += 1
+
+    def _post(self, path: str, payload: Any, deadline_s: Optional[float] = None) -> Any:
+        if not self.base_url:
+            raise APIClientError("RISK_API_URL no configurada")
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise APIClientError("circuito abierto")
+        self._count("calls")
+        t0 = time.monotonic()
+        deadline = t0 + (deadline_s if deadline_s is not None else self.deadline_s)
+        attempt = 0
+        while True:
+            left = deadline - time.monotonic()
+            try:
+                if left <= 0:
+                    raise APIClientError("deadline agotado")
+                try:
+                    r = self._session.post(self.base_url + path, json=payload, stream=True,
+                                           timeout=(min(RISK_API_CONNECT_S, left), left))
+                except requests.RequestException as e:
+                    raise APIClientError(f"{type(e).__name__}: {e}")
+                if r.status_code >= 500:
+                    r.close()
+                    raise APIClientError(f"HTTP {r.status_code}", r.status_code)
+                body = _read_body(r, deadline)
+                break
+            except APIClientError:
+                attempt += 1
+                if attempt > self.retries or deadline - time.monotonic() <= 0:
+                    self._finish(t0, ok=False)
+                    raise
+
+        self._finish(t0, ok=True)
+        try:
+            data = json.loads(body)
+        except ValueError:
+            raise APIClientError(f"respuesta no-JSON (HTTP {r.status_code})", r.status_code)
+        if r.status_code // 100 != 2:  # 4xx: el pedido es inválido, no es culpa del servicio
+            err = data.get("error") if isinstance(data, dict) else None
+            raise APIClientError(f"HTTP {r.status_code}: {err or r.reason}", r.status_code)
+        return data
+
+    def _finish(self, t0: float, ok: bool) -> None:
+        dt = time.monotonic() - t0
+        slow = ok and dt > self.slow_s
+        with self._lock:
+            self._latencies.append(dt)
+            self._counts["ok" if ok else "errors"] += 1
+            if slow:
+                self._counts["slow"] += 1
+        self.breaker.record(ok and not slow)  # lento cuenta como falla para el breaker
+
+    def score(self, paciente: Dict[str, Any], deadline_s: Optional[float] = None) -> Dict[str, Any]:
+        data = self._post("/v1/score", paciente, deadline_s)
+        if not isinstance(data, dict):
+            raise APIClientError("respuesta inválida")
+        return data
+
+    def score_batch(self, pacientes: List[Dict[str, Any]],
+                    deadline_s: Optional[float] = None) -> List[Dict[str, Any]]:
+        data = self._post("/v1/score/batch", {"pacientes": pacientes}, deadline_s)
+        res = data.get("resultados") if isinstance(data, dict) else None
+        if not isinstance(res, list) or len(res) != len(pacientes):
+            raise APIClientError("respuesta de lote inválida")
+        return res
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lat = sorted(self._latencies)
+            counts = dict(self._counts)
+
+        def pct(p: float) -> Optional[float]:
+            return round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 1) if lat else None
+
+        return {**counts, "breaker": self.breaker.state, "breaker_trips": self.breaker.trips,
+                "latency_ms_p50": pct(0.50), "latency_ms_p99": pct(0.99)}
+
+
+_CLIENT: Optional[RiskAPIClient] = None
+_LOCK = threading.Lock()
+
+
+def get_client() -> RiskAPIClient:
+    global _CLIENT
+    with _LOCK:
+        if _CLIENT is None:
+            _CLIENT = RiskAPIClient()
+        return _CLIENT
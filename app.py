@@ -56,7 +56,7 @@ import gspread
 from google.oauth2.service_account import Credentials
 from calculadora import calculadora
 from logger_bridge import registrar_evento_bridge
-from gsheets import append_row_safe, utc_now_str, service_account_email
+from gsheets import append_row_safe, utc_now_str, service_account_email, get_pool
 APP_VERSION = "v1.1"
 LOG_TAB = "Calculadora_Evaluaciones"
 from openai import OpenAI
@@ -88,11 +88,10 @@ def get_sheet():
     if not creds_json:
         raise RuntimeError("Falta el secret GOOGLE_CREDENTIALS en Replit")
 
-    info = json.loads(creds_json)
-    creds = Credentials.from_service_account_info(info, scopes=SCOPES)
-    gc = gspread.authorize(creds)
-    sh = gc.open_by_key(SHEET_KEY)
-    worksheet = sh.worksheet(WORKSHEET_TITLE)
+    # Cliente/pestaña compartidos por todo el proceso (gsheets.SheetsPool)
+    worksheet = get_pool().worksheet(WORKSHEET_TITLE, key=SHEET_KEY, create=False)
+    if worksheet is None:
+        raise gspread.WorksheetNotFound(WORKSHEET_TITLE)
     return worksheet
 
 def leer_datos():
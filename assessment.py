@@ -0,0 +1,128 @@
+# assessment.py — evaluación clínica memoizada por sesión
+# Assessment guarda las entradas clínicas y todo lo derivado (IMC, Caprini, factor, nivel,
+# IDs de recomendación). update() recalcula SÓLO los campos cuyas dependencias cambiaron;
+# si no cambió ninguna entrada devuelve el mismo objeto. calculadora.py lo guarda en
+# st.session_state["assessment"], así un click de emoji o un cambio de idioma no recalcula nada.
+
+from dataclasses import dataclass, fields
+from typing import Any, Callable, Dict, List, MutableMapping, Optional, Tuple
+
+from risk_core import (
+    RecKey,
+    caprini_categoria,
+    caprini_desde,
+    caprini_mask,
+    factor_riesgo_fn,
+    ids_por_clave,
+    imc,
+    nivel_por_factor,
+    rec_key,
+    textos_por_clave,
+)
+
+INPUTS = ("edad", "peso", "altura", "tabaquismo", "hta_txt", "diabetes_txt", "tiroides_txt",
+          "antecedentes")
+
+
+def _caprini(v: Dict[str, Any]) -> Tuple[int, Tuple[Tuple[str, int], ...]]:
+    score, det = caprini_desde(list(v["antecedentes"]))
+    return score, tuple(det.items())
+
+
+# Campo derivado → (dependencias, cálculo). En orden topológico.
+DERIVED: Tuple[Tuple[str, Tuple[str, ...], Callable[[Dict[str, Any]], Any]], ...] = (
+    ("bmi", ("peso", "altura"), lambda v: imc(v["peso"], v["altura"])),
+    ("caprini_mask", ("antecedentes",), lambda v: caprini_mask(v["antecedentes"])),
+    ("caprini", ("antecedentes",), _caprini),
+    ("caprini_categoria", ("caprini",), lambda v: caprini_categoria(v["caprini"][0])),
+    ("factor_riesgo", ("edad", "bmi", "tabaquismo", "caprini"),
+     lambda v: factor_riesgo_fn(v["edad"], v["bmi"], v["tabaquismo"], v["caprini"][0])),
+    ("nivel_riesgo", ("factor_riesgo",), lambda v: nivel_por_factor(v["factor_riesgo"])),
+    ("rec_key", ("bmi", "edad", "tabaquismo", "hta_txt", "diabetes_txt", "tiroides_txt",
+                 "antecedentes", "nivel_riesgo"),
+     lambda v: rec_key(IMC=v["bmi"], edad=v["edad"], tabaquismo=v["tabaquismo"],
+                       hta_txt=v["hta_txt"], diabetes_txt=v["diabetes_txt"],
+                       tiroides_txt=v["tiroides_txt"], antecedentes=list(v["antecedentes"]),
+                       riesgo=v["nivel_riesgo"])),
+)
+
+
+@dataclass(frozen=True, slots=True)
+class Assessment:
+    # Entradas
+    edad: Any
+    peso: Any
+    altura: Any
+    tabaquismo: str
+    hta_txt: str
+    diabetes_txt: str
+    tiroides_txt: str
+    antecedentes: Tuple[str, ...]
+    # Derivados
+    bmi: float
+    caprini_mask: int
+    caprini: Tuple[int, Tuple[Tuple[str, int], ...]]  # (score, detalle)
+    caprini_categoria: str
+    factor_riesgo: float
+    nivel_riesgo: str
+    rec_key: RecKey
+
+    @classmethod
+    def build(cls, **inputs: Any) -> "Assessment":
+        v = _normalize(inputs)
+        for name, _deps, fn in DERIVED:
+            v[name] = fn(v)
+        return cls(**v)
+
+    def update(self, **inputs: Any) -> "Assessment":
+        """Nuevo Assessment con las entradas dadas; recalcula sólo lo que depende de un cambio."""
+        v = {f.name: getattr(self, f.name) for f in fields(self)}
+        changed = set()
+        for k, val in _normalize(inputs).items():
+            if v[k] != val:
+                v[k] = val
+                changed.add(k)
+        if not changed:
+            return self
+        for name, deps, fn in DERIVED:
+            if changed.intersection(deps):
+                new = fn(v)
+                if new != v[name]:
+                    v[name] = new
+                    changed.add(name)
+        return Assessment(**v)
+
+    @property
+    def caprini_score(self) -> int:
+        return self.caprini[0]
+
+    @property
+    def caprini_detalle(self) -> Dict[str, int]:
+        return dict(self.caprini[1])
+
+    @property
+    def recomendacion_ids(self) -> Tuple[str, ...]:
+        return ids_por_clave(self.rec_key)
+
+    def recomendaciones(self, lang: str = "ES", catalog_lang: Optional[str] = None) -> List[str]:
+        """Textos de recomendación (LRU por clave discreta + idioma en risk_core)."""
+        return list(textos_por_clave(self.rec_key, lang, catalog_lang))
+
+
+def _normalize(inputs: Dict[str, Any]) -> Dict[str, Any]:
+    unknown = set(inputs) - set(INPUTS)
+    if unknown:
+        raise TypeError(f"Assessment: entradas desconocidas {sorted(unknown)}")
+    out = dict(inputs)
+    if "antecedentes" in out:
+        out["antecedentes"] = tuple(out["antecedentes"] or ())
+    return out
+
+
+def session_assessment(state: MutableMapping[str, Any], key: str = "assessment", **inputs: Any) -> Assessment:
+    """Assessment de la sesión actualizado con 'inputs' (todas las entradas de INPUTS)."""
+    prev = state.get(key)
+    a = prev.update(**inputs) if isinstance(prev, Assessment) else Assessment.build(**inputs)
+    if a is not prev:
+        state[key] = a
+    return a
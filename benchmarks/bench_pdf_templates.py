@@ -0,0 +1,108 @@
+# benchmarks/bench_pdf_templates.py — antes/después de la capa estática (pdf_templates)
+# Renderiza los mismos informes (cohorte sintética, idiomas rotando) en cuatro modos:
+#   baseline        todo dibujado en cada informe, streams ASCII85 (comportamiento anterior)
+#   form            capa estática como form XObject por documento, streams ASCII85
+#   inline          capa estática copiada al stream de la página, streams ASCII85
+#   inline_bin      capa estática inline + streams binarios (default: PDF_TEMPLATES=1, PDF_ASCII85=0)
+# Los modos se intercalan por ronda para que el ruido de la máquina afecte a todos igual.
+#
+#   python benchmarks/bench_pdf_templates.py -n 200 --rounds 3 --json pdf_templates.json
+#
+# Reporta por generador y modo: CPU ms/informe (process_time), latencia p50/p99 y bytes.
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pipeline import _pdf_datos  # noqa: E402
+from bench_sheets_logging import _summary  # noqa: E402
+
+MODES = (("baseline", "off", 1), ("form", "form", 1), ("inline", "inline", 1), ("inline_bin", "inline", 0))
+
+
+def _cases(n: int, seed: int) -> List[Tuple[Dict[str, Any], str]]:
+    from cohort import cohorte
+    from risk_core import evaluar, recomendaciones_txt
+    out = []
+    for i, p in enumerate(cohorte(n, seed)):
+        r = evaluar(edad=p["edad"], peso=p["peso"], altura=p["altura"], tabaquismo=p["tabaquismo"],
+                    hipertension=p["hipertension"], diabetes=p["diabetes"], tiroides=p["tiroides"],
+                    caprini_mask=p["caprini_mask"])
+        lang = ("ES", "EN", "PT")[i % 3]
+        recs = recomendaciones_txt(IMC=r["bmi"], edad=p["edad"], tabaquismo=p["tabaquismo"],
+                                   hta_txt=p["hipertension"], diabetes_txt=p["diabetes"],
+                                   tiroides_txt=p["tiroides"], caprini_score=r["caprini_score"],
+                                   antecedentes=p["antecedentes"], riesgo=r["nivel_riesgo"], lang=lang)
+        out.append((_pdf_datos(p, r, recs), lang))
+    return out
+
+
+def _run(render: Callable[[Dict[str, Any], str], bytes], cases, rounds: int) -> Dict[str, Any]:
+    import pdf_templates
+    from reportlab import rl_config
+
+    acc: Dict[str, Dict[str, List[float]]] = {m: {"ms": [], "cpu": [], "bytes": []} for m, _, _ in MODES}
+    for _ in range(rounds):
+        for mode, tpl_mode, a85 in MODES:
+            pdf_templates.MODE, rl_config.useA85 = tpl_mode, a85
+            render(*cases[0])  # calentar (graba las capas del modo)
+            for datos, lang in cases:
+                c0, t0 = time.process_time(), time.perf_counter()
+                pdf = render(datos, lang)
+                acc[mode]["ms"].append((time.perf_counter() - t0) * 1000.0)
+                acc[mode]["cpu"].append((time.process_time() - c0) * 1000.0)
+                acc[mode]["bytes"].append(len(pdf))
+    res: Dict[str, Any] = {}
+    for mode, a in acc.items():
+        res[mode] = {
+            "cpu_ms_mean": round(sum(a["cpu"]) / len(a["cpu"]), 3),
+            "latency": _summary(a["ms"]),
+            "bytes_mean": round(sum(a["bytes"]) / len(a["bytes"])),
+        }
+    base = res["baseline"]
+    for mode in res:
+        res[mode]["cpu_vs_baseline"] = round(res[mode]["cpu_ms_mean"] / base["cpu_ms_mean"], 3)
+        res[mode]["bytes_vs_baseline"] = round(res[mode]["bytes_mean"] / base["bytes_mean"], 3)
+    return res
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark de la capa estática de los PDF")
+    ap.add_argument("-n", type=int, default=150, help="informes por modo y ronda")
+    ap.add_argument("--rounds", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=20251)
+    ap.add_argument("--json", default="", help="guardar resultados en este archivo")
+    args = ap.parse_args()
+
+    cases = _cases(args.n, args.seed)
+    results: Dict[str, Any] = {"config": vars(args), "generators": {}}
+
+    from pdf_generator_v3_1 import generar_pdf_v3_1
+    results["generators"]["generar_pdf_v3_1"] = _run(
+        lambda d, lang: generar_pdf_v3_1(d, full=True, lang=lang.lower(), verification_uuid="0" * 36)[0],
+        cases, args.rounds)
+    try:
+        from calculadora import generar_pdf
+    except Exception as e:  # sin streamlit / dependencias de la app
+        results["generators"]["generar_pdf"] = {"skipped": f"{type(e).__name__}: {e}"}
+    else:
+        results["generators"]["generar_pdf"] = _run(
+            lambda d, lang: generar_pdf(d, full=True, lang=lang), cases, args.rounds)
+
+    out = json.dumps(results, indent=2, ensure_ascii=False)
+    print(out)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            fh.write(out)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
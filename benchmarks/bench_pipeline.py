@@ -0,0 +1,348 @@
+# benchmarks/bench_pipeline.py — benchmark de punta a punta sobre una cohorte sintética
+# Pasa la misma cohorte reproducible (benchmarks/cohort.py) por cada etapa del camino real:
+#   score_scalar   risk_core.evaluar por paciente
+#   score_batch    risk_batch.score_batch por lotes de --chunk filas
+#   recs           risk_core.recomendaciones_txt (idioma rotando ES/EN/PT/FR, caches en frío)
+#   pdf_v3_1       pdf_generator_v3_1.generar_pdf_v3_1 (informe final)
+#   pdf_legacy     calculadora.generar_pdf (se omite si calculadora no se puede importar)
+#   redact         redact_phi.redact_dict del payload de logging
+#   logging        events (InteropEvent + FeedbackEvent por sesión) → outbox → sheets_writer
+#                  → backend local en memoria; incluye el tiempo de drenaje
+#
+#   python benchmarks/bench_pipeline.py -n 20000 --pdf-n 300 --json out.json
+#   python benchmarks/bench_pipeline.py --stages score_scalar,recs --compare out.json
+#
+# Por etapa: items, tiempo total, items/s, p50/p95/p99 por ítem (o por lote) y pico de RSS
+# (resource.getrusage: es el máximo del proceso, así que crece monótono entre etapas;
+# rss_delta_mb es cuánto lo subió esa etapa).
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_sheets_logging import _summary  # noqa: E402
+
+STAGES = ("score_scalar", "score_batch", "recs", "pdf_v3_1", "pdf_legacy", "redact", "logging")
+LANGS = ("ES", "EN", "PT", "FR")
+
+
+def _rss_mb() -> float:
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(r / (1024.0 * 1024.0) if sys.platform == "darwin" else r / 1024.0, 1)  # macOS: bytes
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip()
+    except Exception:
+        return ""
+
+
+class Stage:
+    """Mide una etapa: latencia por ítem (ms), total y RSS antes/después."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.ms: List[float] = []
+        self.items = 0
+        self.extra: Dict[str, Any] = {}
+
+    def run(self, fn: Callable[[], int]) -> Dict[str, Any]:
+        rss0 = _rss_mb()
+        t0 = time.perf_counter()
+        self.items = fn()
+        dt = time.perf_counter() - t0
+        rss1 = _rss_mb()
+        out = {
+            "items": self.items,
+            "total_s": round(dt, 3),
+            "items_per_s": round(self.items / max(1e-9, dt), 1),
+            "latency": _summary(self.ms),
+            "rss_peak_mb": rss1,
+            "rss_delta_mb": round(rss1 - rss0, 1),
+        }
+        out.update(self.extra)
+        return out
+
+    def timed(self, fn: Callable[..., Any], *a: Any, **kw: Any) -> Any:
+        t0 = time.perf_counter()
+        try:
+            return fn(*a, **kw)
+        finally:
+            self.ms.append((time.perf_counter() - t0) * 1000.0)
+
+
+def _pdf_datos(p: Dict[str, Any], r: Dict[str, Any], recs: List[str]) -> Dict[str, Any]:
+    """Payload con la forma de final_data en calculadora.py."""
+    return {
+        "rep_id": f"ESTH-{p['id']}",
+        "paciente": {"nombre": p["nombre"], "edad": p["edad"], "altura_cm": p["altura"],
+                     "peso_kg": p["peso"]},
+        "bmi": r["bmi"],
+        "caprini_score": r["caprini_score"],
+        "caprini_categoria": r["caprini_categoria"],
+        "factor_riesgo": r["factor_riesgo"],
+        "nivel_riesgo": r["nivel_riesgo"],
+        "recomendaciones": recs,
+        "conclusion": "Optimizar salud general y reevaluar antes de planificar procedimientos combinados.",
+    }
+
+
+def _log_payload(p: Dict[str, Any], r: Dict[str, Any]) -> Dict[str, Any]:
+    """Payload con PHI como el que llega a safe_log / registro antes de redactar."""
+    return {
+        "timestamp": "2025-01-01 00:00:00", "app_version": "V3.1", "idioma_ui": "ES",
+        "nombre": p["nombre"], "email": p["email"], "telefono": p["telefono"],
+        "edad": p["edad"], "peso": p["peso"], "altura": p["altura"], "imc": r["bmi"],
+        "tabaquismo": p["tabaquismo"], "hipertension": p["hipertension"],
+        "diabetes": p["diabetes"], "tiroides": p["tiroides"],
+        "caprini_score": r["caprini_score"], "antecedentes": ";".join(p["antecedentes"]),
+        "risk_level": r["nivel_riesgo"], "session_id": p["id"],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark por etapas sobre una cohorte sintética")
+    ap.add_argument("-n", type=int, default=10000, help="pacientes (scoring, recs, redacción, logging)")
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--pdf-n", type=int, default=200, help="pacientes para las etapas de PDF")
+    ap.add_argument("--log-n", type=int, default=2000, help="sesiones para la etapa de logging")
+    ap.add_argument("--chunk", type=int, default=4096, help="filas por lote en score_batch")
+    ap.add_argument("--stages", default=",".join(STAGES), help="etapas separadas por coma")
+    ap.add_argument("--redact-mode", default="hash", choices=("hash", "mask", "remove"))
+    ap.add_argument("--json", default="", help="guardar resultados en este archivo")
+    ap.add_argument("--compare", default="", help="JSON de una corrida anterior para comparar")
+    args = ap.parse_args(argv)
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        ap.error(f"etapas desconocidas: {sorted(unknown)} (válidas: {', '.join(STAGES)})")
+
+    # Logging contra el backend local: configurar antes de importar gsheets/outbox
+    tmp = tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.environ["SHEETS_BACKEND"] = "memory"
+    os.environ["SHEETS_OUTBOX_PATH"] = os.path.join(tmp, "outbox.db")
+    os.environ.setdefault("SHEETS_WRITE_QUOTA_PER_MIN", "600000")
+    os.environ.setdefault("SHEETS_WRITE_BURST", "10000")
+    os.environ.setdefault("SHEETS_FLUSH_MS", "50")
+
+    from cohort import SEED, cohorte
+    from risk_core import evaluar, ids_por_clave, recomendaciones_txt, textos_por_clave
+
+    seed = SEED if args.seed is None else args.seed
+    rss_base = _rss_mb()
+    t0 = time.perf_counter()
+    pacientes = list(cohorte(args.n, seed))
+    gen_s = time.perf_counter() - t0
+    scored = [evaluar(edad=p["edad"], peso=p["peso"], altura=p["altura"], tabaquismo=p["tabaquismo"],
+                      hipertension=p["hipertension"], diabetes=p["diabetes"], tiroides=p["tiroides"],
+                      caprini_mask=p["caprini_mask"]) for p in pacientes]
+    results: Dict[str, Any] = {
+        "meta": {"git_rev": _git_rev(), "python": platform.python_version(),
+                 "platform": platform.platform(), "cpus": os.cpu_count(), "seed": seed, "n": args.n,
+                 "pdf_n": args.pdf_n, "log_n": args.log_n, "cohort_gen_s": round(gen_s, 3),
+                 "rss_base_mb": rss_base, "started_at": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "stages": {},
+    }
+
+    def out(name: str, res: Dict[str, Any]) -> None:
+        results["stages"][name] = res
+        lat = res.get("latency", {})
+        print(f"  {name:<13} {res.get('items', 0):>7} items  {res.get('items_per_s', 0):>10,.1f}/s  "
+              f"p50 {lat.get('p50_ms', 0):>8.3f} ms  p99 {lat.get('p99_ms', 0):>8.3f} ms  "
+              f"RSS {res.get('rss_peak_mb', 0):>7.1f} MB", file=sys.stderr)
+
+    print(f"⏱️ cohorte seed={seed} n={args.n} ({gen_s:.2f} s)", file=sys.stderr)
+
+    # ---------- Scoring ----------
+    if "score_scalar" in stages:
+        st_ = Stage("score_scalar")
+
+        def _scalar() -> int:
+            for p in pacientes:
+                st_.timed(evaluar, edad=p["edad"], peso=p["peso"], altura=p["altura"],
+                          tabaquismo=p["tabaquismo"], hipertension=p["hipertension"],
+                          diabetes=p["diabetes"], tiroides=p["tiroides"], caprini_mask=p["caprini_mask"])
+            return len(pacientes)
+        out("score_scalar", st_.run(_scalar))
+
+    if "score_batch" in stages:
+        from risk_batch import score_batch
+        st_ = Stage("score_batch")
+
+        def _batch() -> int:
+            for i in range(0, len(pacientes), args.chunk):
+                part = pacientes[i:i + args.chunk]
+                st_.timed(score_batch, [p["edad"] for p in part], [p["tabaquismo"] for p in part],
+                          peso=[p["peso"] for p in part], altura_cm=[p["altura"] for p in part],
+                          caprini_mask=[p["caprini_mask"] for p in part])
+            return len(pacientes)
+        st_.extra["latency_unit"] = f"lote de {args.chunk}"
+        out("score_batch", st_.run(_batch))
+
+    # ---------- Recomendaciones ----------
+    if "recs" in stages:
+        ids_por_clave.cache_clear()
+        textos_por_clave.cache_clear()
+        st_ = Stage("recs")
+
+        def _recs() -> int:
+            for i, (p, r) in enumerate(zip(pacientes, scored)):
+                st_.timed(recomendaciones_txt, IMC=r["bmi"], edad=p["edad"], tabaquismo=p["tabaquismo"],
+                          hta_txt=p["hipertension"], diabetes_txt=p["diabetes"],
+                          tiroides_txt=p["tiroides"], caprini_score=r["caprini_score"],
+                          antecedentes=p["antecedentes"], riesgo=r["nivel_riesgo"],
+                          lang=LANGS[i % len(LANGS)])
+            return len(pacientes)
+        res = st_.run(_recs)
+        ci = textos_por_clave.cache_info()
+        res["cache"] = {"hits": ci.hits, "misses": ci.misses, "size": ci.currsize}
+        out("recs", res)
+
+    # ---------- PDF ----------
+    pdf_cases = []
+    if "pdf_v3_1" in stages or "pdf_legacy" in stages:
+        for i, (p, r) in enumerate(zip(pacientes[:args.pdf_n], scored)):
+            lang = LANGS[i % 3]  # los PDFs cubren ES/EN/PT
+            recs = recomendaciones_txt(IMC=r["bmi"], edad=p["edad"], tabaquismo=p["tabaquismo"],
+                                       hta_txt=p["hipertension"], diabetes_txt=p["diabetes"],
+                                       tiroides_txt=p["tiroides"], caprini_score=r["caprini_score"],
+                                       antecedentes=p["antecedentes"], riesgo=r["nivel_riesgo"],
+                                       lang=lang)
+            pdf_cases.append((_pdf_datos(p, r, recs), lang))
+
+    if "pdf_v3_1" in stages:
+        try:
+            from pdf_generator_v3_1 import generar_pdf_v3_1
+        except Exception as e:
+            results["stages"]["pdf_v3_1"] = {"skipped": f"{type(e).__name__}: {e}"}
+            print(f"  ⚠️ pdf_v3_1 omitida: {e}", file=sys.stderr)
+        else:
+            st_ = Stage("pdf_v3_1")
+            sizes: List[int] = []
+
+            def _pdf3() -> int:
+                for datos, lang in pdf_cases:
+                    pdf, _uuid = st_.timed(generar_pdf_v3_1, datos, full=True, lang=lang.lower())
+                    sizes.append(len(pdf))
+                return len(pdf_cases)
+            res = st_.run(_pdf3)
+            res["bytes_mean"] = round(sum(sizes) / max(1, len(sizes)))
+            out("pdf_v3_1", res)
+
+    if "pdf_legacy" in stages:
+        try:
+            from calculadora import generar_pdf
+        except Exception as e:  # sin streamlit / dependencias de la app
+            results["stages"]["pdf_legacy"] = {"skipped": f"{type(e).__name__}: {e}"}
+            print(f"  ⚠️ pdf_legacy omitida: {type(e).__name__}: {e}", file=sys.stderr)
+        else:
+            st_ = Stage("pdf_legacy")
+            sizes = []
+
+            def _pdf_legacy() -> int:
+                for datos, lang in pdf_cases:
+                    sizes.append(len(st_.timed(generar_pdf, datos, full=True, lang=lang)))
+                return len(pdf_cases)
+            res = st_.run(_pdf_legacy)
+            res["bytes_mean"] = round(sum(sizes) / max(1, len(sizes)))
+            out("pdf_legacy", res)
+
+    # ---------- Redacción PHI ----------
+    if "redact" in stages:
+        from redact_phi import redact_dict
+        payloads = [_log_payload(p, r) for p, r in zip(pacientes, scored)]
+        st_ = Stage("redact")
+
+        def _redact() -> int:
+            for d in payloads:
+                st_.timed(redact_dict, d, args.redact_mode)
+            return len(payloads)
+        res = st_.run(_redact)
+        res["mode"] = args.redact_mode
+        out("redact", res)
+
+    # ---------- Logging (events → outbox → writer → backend local) ----------
+    if "logging" in stages:
+        try:
+            import events
+            import gsheets
+            import sheets_writer
+            from redact_phi import redact_dict
+            from sheets_backend import memory_backend
+        except Exception as e:  # sin gspread / google-auth
+            results["stages"]["logging"] = {"skipped": f"{type(e).__name__}: {e}"}
+            print(f"  ⚠️ logging omitida: {type(e).__name__}: {e}", file=sys.stderr)
+            stages.remove("logging")
+
+    if "logging" in stages:
+        backend = memory_backend()
+        gsheets.get_pool().use_backend(backend)
+        sesiones = list(zip(pacientes, scored))[:args.log_n]
+        st_ = Stage("logging")
+
+        def _session(p: Dict[str, Any], r: Dict[str, Any]) -> None:
+            with events.batch():  # una corrida de Streamlit: un lote multi-pestaña
+                events.emit(events.InteropEvent(
+                    json.dumps(redact_dict(_log_payload(p, r)), ensure_ascii=False),
+                    json.dumps({"nivel": r["nivel_riesgo"]}), "calculadora", "resultado"))
+                events.emit(events.FeedbackEvent("step1", "😊", "ok"))
+
+        def _logging() -> int:
+            for p, r in sesiones:
+                st_.timed(_session, p, r)
+            t_drain = time.perf_counter()
+            st_.extra["drained"] = sheets_writer.get_writer().flush(300.0)
+            st_.extra["drain_s"] = round(time.perf_counter() - t_drain, 3)
+            return len(sesiones)
+        res = st_.run(_logging)
+        bstats = backend.stats()
+        res["rows_delivered"] = bstats.get("rows_written", 0)
+        res["rows_per_s_end_to_end"] = round(res["rows_delivered"] / max(1e-9, res["total_s"]), 1)
+        res["latency_unit"] = "sesión (emit + enqueue)"
+        out("logging", res)
+
+    results["meta"]["rss_peak_mb"] = _rss_mb()
+
+    if args.compare:
+        try:
+            with open(args.compare, encoding="utf-8") as fh:
+                prev = json.load(fh).get("stages", {})
+        except Exception as e:
+            print(f"⚠️ no se pudo leer {args.compare}: {e}", file=sys.stderr)
+            prev = {}
+        cmp: Dict[str, Any] = {}
+        for name, res in results["stages"].items():
+            old = prev.get(name) or {}
+            if "items_per_s" not in res or not old.get("items_per_s"):
+                continue
+            cmp[name] = {
+                "items_per_s_ratio": round(res["items_per_s"] / old["items_per_s"], 3),
+                "p99_ms_ratio": round(res["latency"]["p99_ms"] / old["latency"]["p99_ms"], 3)
+                if old.get("latency", {}).get("p99_ms") else None,
+                "rss_peak_mb_diff": round(res["rss_peak_mb"] - old.get("rss_peak_mb", 0.0), 1),
+            }
+        results["compare"] = {"baseline": args.compare, "stages": cmp}
+
+    text = json.dumps(results, indent=2, ensure_ascii=False, default=str)
+    print(text)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            fh.write(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,98 @@
+# benchmarks/bench_qr.py — QR de verificación: PNG (qrcode → PIL → PNG → ImageReader) vs vectorial
+# Dos mediciones, modos intercalados por ronda:
+#   qr_only   sólo el dibujo del QR en un canvas de una página + save() (aísla el QR)
+#   report    generar_pdf_v3_1 completo (cohorte sintética, idiomas rotando)
+# Cada verification_uuid es distinto, como en producción (el QR nunca se repite).
+#
+#   python benchmarks/bench_qr.py -n 300 --rounds 3 --json qr.json
+#
+# Reporta por medición y modo: CPU ms (process_time), latencia p50/p99 y bytes del PDF.
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+import uuid
+from typing import Any, Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pdf_templates import _cases  # noqa: E402
+from bench_sheets_logging import _summary  # noqa: E402
+
+MODES = ("png", "vector")
+
+
+def _qr_only(url: str) -> bytes:
+    import pdf_generator_v3_1 as g
+    from reportlab.pdfgen import canvas
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=g.A4)
+    g._draw_qr(c, url, g.PAGE_W - g.MR - g.QR_SIZE, g.PAGE_H - g.MT - g.QR_SIZE, g.QR_SIZE)
+    c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
+def _run(render: Callable[[int], bytes], n: int, rounds: int) -> Dict[str, Any]:
+    import pdf_generator_v3_1 as g
+
+    acc: Dict[str, Dict[str, List[float]]] = {m: {"ms": [], "cpu": [], "bytes": []} for m in MODES}
+    for _ in range(rounds):
+        for mode in MODES:
+            g.QR_MODE = mode
+            render(0)  # calentar
+            for i in range(n):
+                c0, t0 = time.process_time(), time.perf_counter()
+                pdf = render(i)
+                acc[mode]["ms"].append((time.perf_counter() - t0) * 1000.0)
+                acc[mode]["cpu"].append((time.process_time() - c0) * 1000.0)
+                acc[mode]["bytes"].append(len(pdf))
+    res: Dict[str, Any] = {}
+    for mode, a in acc.items():
+        res[mode] = {
+            "cpu_ms_mean": round(sum(a["cpu"]) / len(a["cpu"]), 3),
+            "latency": _summary(a["ms"]),
+            "bytes_mean": round(sum(a["bytes"]) / len(a["bytes"])),
+        }
+    base = res["png"]
+    for mode in res:
+        res[mode]["cpu_vs_png"] = round(res[mode]["cpu_ms_mean"] / base["cpu_ms_mean"], 3)
+        res[mode]["bytes_vs_png"] = round(res[mode]["bytes_mean"] / base["bytes_mean"], 3)
+    return res
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark del QR de verificación (PNG vs vectorial)")
+    ap.add_argument("-n", type=int, default=300, help="renders por modo y ronda")
+    ap.add_argument("--rounds", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=20251)
+    ap.add_argument("--json", default="", help="guardar resultados en este archivo")
+    args = ap.parse_args()
+
+    from pdf_generator_v3_1 import generar_pdf_v3_1
+
+    uuids = [str(uuid.UUID(int=(args.seed << 64) + i)) for i in range(args.n)]
+    cases = _cases(args.n, args.seed)
+    results: Dict[str, Any] = {"config": vars(args), "results": {}}
+    results["results"]["qr_only"] = _run(
+        lambda i: _qr_only(f"https://app.aestheticsafe.com/verify?id={uuids[i]}"), args.n, args.rounds)
+    results["results"]["report"] = _run(
+        lambda i: generar_pdf_v3_1(cases[i][0], full=True, lang=cases[i][1].lower(),
+                                   verification_uuid=uuids[i])[0],
+        args.n, args.rounds)
+
+    out = json.dumps(results, indent=2, ensure_ascii=False)
+    print(out)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            fh.write(out)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,155 @@
+# benchmarks/bench_sheets_logging.py — carga sintética sobre el camino real de logging a Sheets
+# Corre miles de sesiones (hilos) a través de registro / feedback_bridge / gsheets.append_row_safe
+# contra el backend local de sheets_backend, con latencia, errores y 429 inyectados.
+#
+#   python benchmarks/bench_sheets_logging.py --sessions 2000 --threads 32 \
+#       --latency-ms 120 --jitter-ms 80 --error-rate 0.02 --throttle-rate 0.01
+#
+# Reporta: latencia por llamada desde la "sesión" (p50/p95/p99/max), throughput de
+# filas entregadas al backend, tiempo de drenaje del outbox y estado final de la cuota.
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _pct(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(p / 100.0 * (len(values) - 1)))))
+    return values[k]
+
+
+def _summary(ms: List[float]) -> Dict[str, float]:
+    return {
+        "n": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 3) if ms else 0.0,
+        "p50_ms": round(_pct(ms, 50), 3),
+        "p95_ms": round(_pct(ms, 95), 3),
+        "p99_ms": round(_pct(ms, 99), 3),
+        "max_ms": round(max(ms), 3) if ms else 0.0,
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark del logging a Google Sheets con backend local")
+    ap.add_argument("--sessions", type=int, default=1000)
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--backend", default="memory", help="memory | file:<dir>")
+    ap.add_argument("--latency-ms", type=float, default=100.0)
+    ap.add_argument("--jitter-ms", type=float, default=50.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--throttle-rate", type=float, default=0.0)
+    ap.add_argument("--retry-after-s", type=float, default=0.5)
+    ap.add_argument("--quota-per-min", type=float, default=60000.0,
+                    help="cuota de escritura simulada (la real de Google es 60)")
+    ap.add_argument("--direct", action="store_true",
+                    help="además medir append_row_safe (escritura directa) por sesión")
+    ap.add_argument("--drain-timeout", type=float, default=300.0)
+    ap.add_argument("--json", default="", help="guardar resultados en este archivo")
+    args = ap.parse_args()
+
+    # Configuración antes de importar: el pool, la cuota y el outbox la leen al cargar
+    tmp = tempfile.mkdtemp(prefix="bench_sheets_")
+    os.environ["SHEETS_BACKEND"] = args.backend
+    os.environ["SHEETS_OUTBOX_PATH"] = os.path.join(tmp, "outbox.db")
+    os.environ["SHEETS_WRITE_QUOTA_PER_MIN"] = str(args.quota_per_min)
+    os.environ["SHEETS_WRITE_BURST"] = str(max(10.0, args.quota_per_min / 60.0))
+    os.environ["SHEETS_FLUSH_MS"] = os.getenv("SHEETS_FLUSH_MS", "200")
+
+    from sheets_backend import FaultConfig, file_backend, memory_backend
+    import gsheets
+    import registro
+    import feedback_bridge
+    import sheets_writer
+
+    faults = FaultConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                         error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                         retry_after_s=args.retry_after_s, seed=1234)
+    if args.backend.startswith("file:"):
+        backend = file_backend(args.backend[5:] or os.path.join(tmp, "sheets"), faults)
+    else:
+        backend = memory_backend(faults)
+    gsheets.get_pool().use_backend(backend)
+
+    lat: Dict[str, List[float]] = {"registro_funnel": [], "registro_interop": [],
+                                   "feedback": [], "append_row_safe": []}
+    lat_lock = threading.Lock()
+    next_session = iter(range(args.sessions))
+    next_lock = threading.Lock()
+
+    def timed(name: str, fn, *a, **kw) -> None:
+        t0 = time.perf_counter()
+        try:
+            fn(*a, **kw)
+        finally:
+            dt = (time.perf_counter() - t0) * 1000.0
+            with lat_lock:
+                lat[name].append(dt)
+
+    def session_worker() -> None:
+        while True:
+            with next_lock:
+                i = next(next_session, None)
+            if i is None:
+                return
+            sid = uuid.uuid4().hex[:12]
+            timed("registro_interop", registro.registrar_evento_interop,
+                  {"edad": 30 + i % 40}, {"score": i % 9}, "bench", "es", True,
+                  sid, "bench-agent", "AR", "calculadora", "resultado")
+            timed("registro_funnel", registro.registrar_evento_funnel,
+                  session_id=sid, stage="funnel", substage="pdf", country="AR")
+            for step in ("step1", "step2"):
+                timed("feedback", feedback_bridge.registrar_feedback,
+                      sid, "bench-agent", "AR", "", "😊", "ok", step)
+            if args.direct:
+                timed("append_row_safe", gsheets.append_row_safe,
+                      [gsheets.utc_now_str(), sid, "direct"], gsheets.EVALUACIONES_TAB)
+
+    t_start = time.perf_counter()
+    threads = [threading.Thread(target=session_worker) for _ in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    t_enqueued = time.perf_counter()
+
+    drained = sheets_writer.get_writer().flush(args.drain_timeout)
+    t_end = time.perf_counter()
+
+    stats = sheets_writer.writer_stats()
+    bstats = backend.stats()
+    results = {
+        "config": vars(args),
+        "sessions_per_s": round(args.sessions / max(1e-9, t_enqueued - t_start), 1),
+        "enqueue_phase_s": round(t_enqueued - t_start, 3),
+        "drain_phase_s": round(t_end - t_enqueued, 3),
+        "drained": drained,
+        "rows_delivered": bstats["rows_written"],
+        "rows_per_s_end_to_end": round(bstats["rows_written"] / max(1e-9, t_end - t_start), 1),
+        "latency": {k: _summary(v) for k, v in lat.items() if v},
+        "backend": bstats,
+        "outbox": {k: v for k, v in stats.items() if k not in ("quota", "schema_drift")},
+        "quota": stats.get("quota", {}),
+    }
+    out = json.dumps(results, indent=2, ensure_ascii=False, default=str)
+    print(out)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            fh.write(out)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,124 @@
+# benchmarks/cohort.py — cohorte sintética reproducible para benchmarks y pruebas de carga
+# Misma semilla → mismos pacientes (random.Random de la stdlib: estable entre versiones).
+# Distribuciones aproximadas de una consulta de cirugía estética, no de una población real:
+#   edad      normal(40, 12) truncada a [18, 75]
+#   altura    normal(165, 8) cm, [145, 195]
+#   IMC       lognormal (mediana 25.5), [16, 50]; el peso sale de IMC × altura²
+#   tabaquismo No 78% · 1–7/sem 15% · >7/sem 7%
+#   HTA / diabetes crecen con la edad (y diabetes con IMC ≥ 30); tiroides 88/9/3%
+#   Caprini   cada factor con prevalencia según su peso; cirugía mayor XOR menor
+# Los campos usan los valores canónicos de la calculadora y los nombres que acepta
+# risk_batch (id, edad, peso, altura, tabaquismo, hipertension, diabetes, tiroides,
+# antecedentes), así el CSV sirve directo como entrada del CLI:
+#
+#   python benchmarks/cohort.py -n 100000 --seed 7 -o /tmp/cohorte.csv
+#   python risk_batch.py /tmp/cohorte.csv -o /tmp/scores.csv
+
+import argparse
+import csv
+import math
+import os
+import random
+import sys
+from typing import Any, Dict, Iterator, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from risk_core import CAPRINI_CATALOGO, caprini_ids, caprini_mask  # noqa: E402
+
+SEED = 20251
+TABAQUISMO = (("No", 0.78), ("Sí (1–7 por semana)", 0.15), ("Más de 7 por semana", 0.07))
+TIROIDES = (("Normal", 0.88), ("Hipotiroidismo", 0.09), ("Hipertiroidismo", 0.03))
+# Prevalencia por peso Caprini (los factores de más puntos son más raros)
+PREVALENCIA = {1: 0.06, 2: 0.03, 3: 0.03, 5: 0.005}
+P_CIRUGIA_MAYOR = 0.55  # el resto declara cirugía menor
+CSV_FIELDS = ["id", "nombre", "email", "telefono", "edad", "peso", "altura", "tabaquismo",
+              "hipertension", "diabetes", "tiroides", "antecedentes", "caprini_mask"]
+
+
+def _truncnorm(rnd: random.Random, mu: float, sd: float, lo: float, hi: float) -> float:
+    while True:
+        v = rnd.gauss(mu, sd)
+        if lo <= v <= hi:
+            return v
+
+
+def _choice(rnd: random.Random, opts) -> str:
+    u, acc = rnd.random(), 0.0
+    for val, p in opts:
+        acc += p
+        if u < acc:
+            return val
+    return opts[-1][0]
+
+
+def paciente(rnd: random.Random, i: int) -> Dict[str, Any]:
+    edad = int(round(_truncnorm(rnd, 40, 12, 18, 75)))
+    altura = round(_truncnorm(rnd, 165, 8, 145, 195), 1)
+    bmi = min(50.0, max(16.0, rnd.lognormvariate(math.log(25.5), 0.18)))
+    peso = round(bmi * (altura / 100.0) ** 2, 1)
+    hta = rnd.random() < 0.05 + 0.004 * (edad - 18)
+    diab = rnd.random() < 0.03 + 0.002 * (edad - 18) + (0.05 if bmi >= 30 else 0.0)
+
+    labels: List[str] = []
+    for f in CAPRINI_CATALOGO:
+        if f.id in ("cirugia_mayor", "cirugia_menor"):
+            continue
+        if rnd.random() < PREVALENCIA.get(f.peso, 0.02):
+            labels.append(f.label)
+    cir = "cirugia_mayor" if rnd.random() < P_CIRUGIA_MAYOR else "cirugia_menor"
+    labels.append(next(f.label for f in CAPRINI_CATALOGO if f.id == cir))
+
+    return {
+        "id": f"SYN-{i:07d}",
+        "nombre": f"Paciente Sintético {i}",
+        "email": f"paciente{i}@example.org",
+        "telefono": f"+54 11 5{i % 10000000:07d}",
+        "edad": edad,
+        "peso": peso,
+        "altura": altura,
+        "tabaquismo": _choice(rnd, TABAQUISMO),
+        "hipertension": "Sí" if hta else "No",
+        "diabetes": "Sí" if diab else "No",
+        "tiroides": _choice(rnd, TIROIDES),
+        "antecedentes": labels,
+        "caprini_mask": caprini_mask(labels),
+    }
+
+
+def cohorte(n: int, seed: int = SEED, start: int = 0) -> Iterator[Dict[str, Any]]:
+    """n pacientes sintéticos; 'start' desplaza los IDs (la secuencia depende sólo de seed)."""
+    rnd = random.Random(seed)
+    for i in range(start, start + n):
+        yield paciente(rnd, i)
+
+
+def write_csv(path: str, n: int, seed: int = SEED) -> int:
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        w = csv.DictWriter(fh, fieldnames=CSV_FIELDS)
+        w.writeheader()
+        for p in cohorte(n, seed):
+            w.writerow({**p, "antecedentes": caprini_ids(p["caprini_mask"])})
+    return n
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Genera una cohorte sintética reproducible (CSV)")
+    ap.add_argument("-n", type=int, default=10000)
+    ap.add_argument("--seed", type=int, default=SEED)
+    ap.add_argument("-o", "--output", default="-", help="archivo CSV ('-' = stdout)")
+    args = ap.parse_args(argv)
+    if args.output == "-":
+        w = csv.DictWriter(sys.stdout, fieldnames=CSV_FIELDS)
+        w.writeheader()
+        for p in cohorte(args.n, args.seed):
+            w.writerow({**p, "antecedentes": caprini_ids(p["caprini_mask"])})
+    else:
+        write_csv(args.output, args.n, args.seed)
+        print(f"✅ {args.n} pacientes → {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -47,6 +47,27 @@ try:
 except ImportError:
     generar_pdf_v3_1 = None
 
+# Cache del PDF final por huella de contenido (reruns, descarga y email = mismos bytes)
+from pdf_cache import final_key as pdf_final_key, fingerprint as pdf_fingerprint, get_cache as pdf_cache, pdf_final_v3_1
+
+# Pre-render del PDF final en segundo plano (pool de procesos)
+try:
+    from pdf_prerender import prerender as pdf_prerender, result as pdf_prerender_result
+except Exception:
+    pdf_prerender = None  # type: ignore
+
+    def pdf_prerender_result(datos: Dict[str, Any], **kwargs: Any) -> Tuple[bytes, str]:  # type: ignore
+        return pdf_final_v3_1(datos, **kwargs)
+
+# What-if de peso (NumPy)
+try:
+    from risk_whatif import resumen as whatif_resumen, whatif
+except Exception:
+    whatif = None  # type: ignore
+
+    def whatif_resumen(*args: Any, **kwargs: Any) -> List[str]:  # type: ignore
+        return []
+
 # PHI/PII Redaction Layer (for public logs, NOT for Google Sheets)
 try:
     from redact_phi import redact_dict, mask_email, hash_identifier
@@ -141,6 +162,49 @@ except Exception:
     FUNNEL_PROGRESS_TAB = "V3_Funnel_Progress"
     INTEROPERABILITY_TAB = "V3_Interoperability_Log"
 
+try:
+    from sheets_writer import idempotency_key
+except Exception:
+    def idempotency_key(sess_ref: str, step: str, payload: Any = None) -> Optional[bytes]:
+        return None
+
+# Pipeline de eventos (events.py): un lote multi-pestaña por corrida del script
+try:
+    from events import (
+        EvaluationEvent,
+        FeedbackEvent,
+        InteropEvent,
+        SessionContext,
+        StepEvent,
+        batch as event_batch,
+        emit as emit_event,
+        route as event_route,
+    )
+except Exception:
+    # Fallbacks si no hay gsheets/outbox: el logging queda deshabilitado sin romper la UI
+    class _NoEvent:
+        def __init__(self, *args: Any, **kwargs: Any) -> None:
+            pass
+
+    StepEvent = EvaluationEvent = FeedbackEvent = InteropEvent = _NoEvent  # type: ignore
+    SessionContext = Any  # type: ignore
+
+    def emit_event(event: Any, on_written: Any = None) -> bool:
+        return False
+
+    class event_batch:  # type: ignore[no-redef]
+        def __enter__(self) -> "event_batch":
+            return self
+
+        def __exit__(self, *exc: Any) -> None:
+            return None
+
+        def __call__(self, fn: Any) -> Any:
+            return fn
+
+    def event_route(*args: Any, **kwargs: Any) -> Any:
+        return lambda fn: fn
+
 # API Client for centralized risk calculation
 try:
     from risk_calculation import calcular_riesgo_api
@@ -217,22 +281,8 @@ def can_release_report(state: Mapping[Any, Any]) -> bool:
 # FIN helpers gating
 
 
-# === i18n para bullets de RECOMENDACIONES (ES/EN/PT) ===
-_RECS_I18N = {
-    "bariatric_eval": {
-        "ES": "Evaluar cirugía bariátrica si corresponde.",
-        "EN": "Consider bariatric surgery if appropriate.",
-        "PT": "Considerar cirurgia bariátrica se apropriado.",
-    },
-    "limit_duration": {
-        "ES":
-        "Limitar cirugías a máximo 5 h; combinaciones hasta 4 h (según criterio).",
-        "EN":
-        "Limit surgeries to a maximum of 5 h; combinations up to 4 h (per clinical judgement).",
-        "PT":
-        "Limitar cirurgias a no máximo de 5 h; combinações até 4 h (a critério clínico).",
-    },
-}
+# === i18n para bullets de RECOMENDACIONES (ES/EN/PT) — catálogo en risk_core ===
+from risk_core import RECS_I18N as _RECS_I18N
 
 
 def _lang() -> str:
@@ -284,58 +334,21 @@ def log_to_funnel_progress(
     sequence_name, wa_template
     """
     import streamlit as st
-    from datetime import datetime, timezone
-    from gsheets import append_row_safe, FUNNEL_PROGRESS_TAB
-    
+
     # Dedupe logic
     has_comment = bool(comment and comment.strip())
     log_key = f"funnel_logged_{satisfaction_step}_{emoji}_{'comment' if has_comment else 'emoji'}"
-    
+
     if st.session_state.get(log_key):
         return True, None  # Already logged, skip
-    
-    timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-    session_id = st.session_state.get("sess_ref", "")
-    user_email = st.session_state.get("email", "")
-    
-    # Build row matching V3_FUNNEL_PROGRESS_HEADERS
-    idioma_ui = st.session_state.get("idioma", "ES")
-    logo_faded = st.session_state.get("logo_faded", False)
-    
-    row = [
-        timestamp,  # Timestamp
-        emoji if satisfaction_step == "step1" else "",  # satisfaction_step1
-        comment if satisfaction_step == "step1" else "",  # satisfaction_step1_comment
-        emoji if satisfaction_step == "step2" else "",  # satisfaction_step2
-        comment if satisfaction_step == "step2" else "",  # satisfaction_step2_comment
-        session_id,  # session_id
-        "",  # user_agent (optional)
-        "",  # country (optional)
-        user_email,  # doctor_email
-        "feedback",  # stage
-        satisfaction_step,  # substage
-        timestamp,  # last_contact_at
-        "",  # next_contact_at
-        "",  # contact_attempts
-        "",  # sequence_name
-        "",  # wa_template
-        "V3.1",  # app_version
-        idioma_ui,  # idioma_ui
-        str(logo_faded),  # logo_fade_triggered
-        ""  # scroll_events
-    ]
-    
+
     try:
-        success, error = append_row_safe(
-            row=row,
-            tab=FUNNEL_PROGRESS_TAB,
-            tab_gid=None
-        )
-        
-        if success:
-            st.session_state[log_key] = True
-        
-        return success, error
+        # Fila armada por events._feedback_row (V3_FUNNEL_PROGRESS_HEADERS) al cerrar la corrida;
+        # el flag de dedupe se marca recién cuando el lote quedó escrito
+        success = emit_event(FeedbackEvent(satisfaction_step, emoji, comment or ""),
+                             on_written=lambda: st.session_state.__setitem__(log_key, True))
+
+        return success, None if success else "sheets_queue_full"
     except Exception as e:
         return False, str(e)
 
@@ -351,39 +364,11 @@ def log_to_interoperability(
     Columns: Timestamp | Request_Data | Response_Data | App_Version | Browser_Lang | 
              Idioma_Detected | Session_ID | User_Agent | Country | Stage | Substage
     """
-    import streamlit as st
-    from datetime import datetime, timezone
-    from gsheets import append_row_safe, INTEROPERABILITY_TAB
-    
-    timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-    session_id = st.session_state.get("sess_ref", "")
-    idioma_detected = st.session_state.get("idioma_autodetected", False)
-    browser_lang = st.session_state.get("browser_lang", st.session_state.get("idioma", "ES"))
-    user_agent = st.session_state.get("user_agent", "")
-    country = st.session_state.get("country", "")
-    
-    row = [
-        timestamp,  # Timestamp
-        request_data,  # Request_Data (JSON string)
-        response_data,  # Response_Data (JSON string)
-        "V3.1",  # App_Version
-        browser_lang,  # Browser_Lang
-        str(idioma_detected),  # Idioma_Detected
-        session_id,  # Session_ID
-        user_agent,  # User_Agent
-        country,  # Country
-        stage,  # Stage
-        substage  # Substage
-    ]
-    
     try:
-        success_result, error = append_row_safe(
-            row=row,
-            tab=INTEROPERABILITY_TAB,
-            tab_gid=None
-        )
-        
-        return success_result, error
+        # Fila armada por events._interop_row con el contexto de sesión del lote
+        success_result = emit_event(InteropEvent(request_data, response_data, stage, substage))
+
+        return success_result, None if success_result else "sheets_queue_full"
     except Exception as e:
         return False, str(e)
 
@@ -422,7 +407,7 @@ def _completar_campos_gsheet(fila_resumen):
     # Clínicos
     caprini_score_val = st.session_state.get("caprini_score_val", "")
     caprini_cat_val = st.session_state.get("caprini_cat_val", "")
-    caprini_factores = "; ".join(st.session_state.get("caprini_selected", []))
+    caprini_factores = caprini_ids(st.session_state.get("caprini_mask", 0))
     factor_riesgo_val = st.session_state.get("factor_riesgo_val", "")
     nivel_riesgo_val = st.session_state.get("nivel_riesgo_val", "")
 
@@ -533,8 +518,23 @@ def log_step_once(step: str, payload: dict | None = None, **extras):
         return False
 
     _ensure_session_ref()
-    p = payload or {}
-    idioma = st.session_state.get("idioma", "ES")
+    # _mark_logged corre cuando el lote quedó escrito (outbox o Sheets), no al bufferizar
+    ok = emit_event(StepEvent(step, dict(payload or {}), dict(extras)),
+                    on_written=lambda: _mark_logged(step))
+    if not ok:
+        # No rompemos la UX por logging; solo avisamos permiso faltante
+        # st.info(f"Compartí la hoja con: **{service_account_email()}**")
+        pass
+
+    return ok
+
+
+@event_route("step", LOG_TAB)
+def _step_row(ev: Any, ctx: Any) -> Tuple[List[Any], Optional[bytes]]:
+    """Fila de log_step_once (A..Q) con el contexto de sesión del lote."""
+    p = ev.payload
+    extras = ev.extras
+    step = ev.step
 
     email = (p.get("email") or extras.get("email") or "").strip()
     telefono = (p.get("telefono") or extras.get("telefono") or "").strip()
@@ -550,11 +550,11 @@ def log_step_once(step: str, payload: dict | None = None, **extras):
     conversion = 1 if step in ("share_done", "pdf_final") else 0
 
     fila = [
-        utc_now_str(),  # A  timestamp_utc
-        st.session_state.get("sess_ref", ""),  # B  session_ref
+        ev.at.strftime("%Y-%m-%d %H:%M:%S UTC"),  # A  timestamp_utc
+        ctx.sess_ref,  # B  session_ref
         step,  # C  step
         conversion,  # D  conversion 0/1
-        idioma,  # E  idioma
+        ctx.idioma,  # E  idioma
         APP_VERSION,  # F  app_version
         email,
         telefono,
@@ -568,16 +568,7 @@ def log_step_once(step: str, payload: dict | None = None, **extras):
         extras.get("share_ref", ""),  # P  share_ref (si aplica)
         extras.get("pdf_ref", ""),  # Q  pdf_ref (si aplica)
     ]
-
-    ok, _svc = append_row_safe(fila, tab=LOG_TAB)
-    if ok:
-        _mark_logged(step)
-    else:
-        # No rompemos la UX por logging; solo avisamos permiso faltante
-        # st.info(f"Compartí la hoja con: **{service_account_email()}**")
-        pass
-
-    return ok
+    return fila, idempotency_key(ctx.sess_ref, step, {**p, **extras})
 
 
 # ===================== Idiomas (ES/EN/PT/FR) =====================
@@ -733,23 +724,14 @@ def _ws():
     if not USE_SHEETS:
         return None
     try:
-        import gspread  # type: ignore
+        from gsheets import get_pool  # type: ignore
     except Exception:
         return None
-    creds = _load_creds()
-    if creds is None:
-        return None
     try:
-        gc = gspread.authorize(creds)
-        ss = gc.open_by_key(SHEET_KEY)  # type: ignore[arg-type]
-        try:
-            ws_title = str(WORKSHEET or st.session_state.get("sheet_title")
-                           or os.environ.get("SHEET_SHEETNAME") or "events")
-            ws = ss.worksheet(ws_title)
-        except Exception:
-            ws_title = str(WORKSHEET or "events")
-            ws = ss.add_worksheet(title=ws_title, rows=2000, cols=40)
-        return ws
+        # Reutiliza el cliente autorizado del proceso (gsheets.SheetsPool)
+        ws_title = str(WORKSHEET or st.session_state.get("sheet_title")
+                       or os.environ.get("SHEET_SHEETNAME") or "events")
+        return get_pool().worksheet(ws_title, key=str(SHEET_KEY), cols=40)
     except Exception:
         return None
 
@@ -789,50 +771,56 @@ HEADERS = [
     "verification_uuid",
 ]
 
+# Header esperado de LOG_TAB (HEADERS + extras al final); se verifica una vez al abrir la pestaña
+try:
+    from sheets_schema import register_schema
+    register_schema(LOG_TAB, HEADERS + ["medico", "codigo_verificador", "caprini_mask"])
+except Exception:
+    pass
+
 _ALLOWED_CHANNELS = {
     "pago_intento", "pago_ok", "pago_email", "share_click", "share_ok",
     "share_email", "download", "descarga"
 }
 
 
-def _dump_outbox_to_csv(rows: List[List[str]]):
-    try:
-        path = pathlib.Path("share/events_fallback.csv")
-        path.parent.mkdir(parents=True, exist_ok=True)
-        new = not path.exists()
-        with path.open("a", newline="", encoding="utf-8") as f:
-            w = csv.writer(f)
-            if new:
-                w.writerow(HEADERS)
-            for r in rows:
-                w.writerow(r)
-    except Exception:
-        pass
-
-
 def _append_row_extended(payload: dict, canal: str, **kw) -> bool:
     if canal not in _ALLOWED_CHANNELS:
         return False
 
+    # La fila se arma al cerrar la corrida (_evaluacion_row) y viaja en el lote de events.
+    # Outbox durable: si Sheets falla queda pendiente; sin outbox, escritura directa.
+    emit_event(EvaluationEvent(canal, dict(payload or {}), dict(kw)))
+    return True
+
+
+@event_route("evaluacion", LOG_TAB)
+def _evaluacion_row(ev: Any, ctx: Any) -> Tuple[List[Any], Optional[bytes]]:
+    """Fila extendida (HEADERS + medico, codigo_verificador, caprini_mask) desde el snapshot de sesión."""
+    payload = ev.payload
+    canal = ev.canal
+    kw = ev.extras
+    ss = ctx.state
+
     # ---- defaults robustos desde session_state ----
-    perfil = (payload.get("perfil") or st.session_state.get("perfil")
-              or st.session_state.get("perfil_ui")
-              or st.session_state.get("profile") or "app")
+    perfil = (payload.get("perfil") or ss.get("perfil")
+              or ss.get("perfil_ui")
+              or ss.get("profile") or "app")
 
-    paid_code = (st.session_state.get("paid_code") or "").strip()
+    paid_code = (ss.get("paid_code") or "").strip()
     try:
         code_ok = bool(re.fullmatch(r"[A-Za-z0-9]{6,}", paid_code))
     except Exception:
         code_ok = len(paid_code) >= 6  # fallback si no hay regex
 
     pago_confirmado = bool(
-        st.session_state.get("mp_confirmado")
-        or (st.session_state.get("pay_ok") and code_ok)
-        or st.session_state.get("zelle_ok"))
+        ss.get("mp_confirmado")
+        or (ss.get("pay_ok") and code_ok)
+        or ss.get("zelle_ok"))
     pago_estado = "Sí" if pago_confirmado else "No"
 
-    monto = (kw.get("pago_monto_usd") or st.session_state.get("pago_monto_usd")
-             or st.session_state.get("mp_amount") or "")
+    monto = (kw.get("pago_monto_usd") or ss.get("pago_monto_usd")
+             or ss.get("mp_amount") or "")
     try:
         pago_monto_usd = f"{float(monto):.2f}" if str(
             monto).strip() != "" else ("0" if not pago_confirmado else "")
@@ -840,21 +828,20 @@ def _append_row_extended(payload: dict, canal: str, **kw) -> bool:
         pago_monto_usd = ("0" if not pago_confirmado else str(monto))
 
     pago_ref = (kw.get("pago_ref") or paid_code
-                or st.session_state.get("pdf_id")
-                or st.session_state.get("sess_ref") or "")
+                or ss.get("pdf_id")
+                or ss.get("sess_ref") or "")
 
-    medico = (st.session_state.get("medico")
-              or st.session_state.get("medico_input")
+    medico = (ss.get("medico")
+              or ss.get("medico_input")
               or payload.get("medico", "")).strip()
 
-    codigo_verificador = (st.session_state.get("codigo_verificador")
-                          or st.session_state.get("pdf_id") or paid_code
+    codigo_verificador = (ss.get("codigo_verificador")
+                          or ss.get("pdf_id") or paid_code
                           or pago_ref or "")
 
     base = {
         "timestamp":
-        payload.get("timestamp",
-                    datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")),
+        payload.get("timestamp", ev.ts),
         "canal":
         canal,
         "email":
@@ -909,272 +896,58 @@ def _append_row_extended(payload: dict, canal: str, **kw) -> bool:
         "share_via":
         kw.get(
             "share_via",
-            ("whatsapp" if st.session_state.get("shared_whatsapp") else "")),
+            ("whatsapp" if ss.get("shared_whatsapp") else "")),
         "share_ref":
-        kw.get("share_ref", (st.session_state.get("share_ref")
+        kw.get("share_ref", (ss.get("share_ref")
                              or payload.get("telefono", ""))),
         "wa_destino":
-        kw.get("wa_destino", (st.session_state.get("wa_destino")
-                              or st.session_state.get("share_ref")
+        kw.get("wa_destino", (ss.get("wa_destino")
+                              or ss.get("share_ref")
                               or payload.get("telefono", ""))),
         "tdc_positivo":
         kw.get("tdc_positivo",
-               ("Sí" if st.session_state.get("tdc_positive") else "No")),
+               ("Sí" if ss.get("tdc_positive") else "No")),
         "verification_uuid":
-        st.session_state.get("verification_uuid", ""),
+        ss.get("verification_uuid", ""),
     }
 
-    # fila ordenada según HEADERS + extras al final (medico, codigo_verificador)
-    row = [base.get(h, "") for h in HEADERS] + [medico, codigo_verificador]
+    # fila ordenada según HEADERS + extras al final (medico, codigo_verificador, caprini_mask)
+    row = [base.get(h, "") for h in HEADERS] + [
+        medico, codigo_verificador,
+        payload.get("caprini_mask", ss.get("caprini_mask", ""))
+    ]
 
-    ok, _svc = append_row_safe(row, tab=LOG_TAB)
-    if not ok:
-        _dump_outbox_to_csv([row])
-    return True
+    return row, idempotency_key(ctx.sess_ref, canal, {**payload, **kw})
 
 
 # ===================== Lógica de riesgo =====================
-# Texto paciente-amigable en cada ítem
-CAPRINI_1P = {
-    "Realizaré cirugía menor (<45 min)",
-    "Várices visibles",
-    "Enfermedad inflamatoria intestinal (diagnosticada)",
-    "Piernas hinchadas (edema actual)",
-    "Antecedente de neumonía reciente (último mes) o infección seria",
-    "Antecedente de infarto de miocardio",
-    "Insuficiencia cardíaca (diagnosticada)",
-    "Reposo en cama o movilidad limitada (<72 h; férula removible)",
-    "Anticonceptivos / Terapia hormonal (ACO/HRT)",
-    "Embarazo / puerperio (<1 mes)",
-    "Antecedentes obstétricos (mortinato/≥3 abortos/RCIU/toxemia)",
-}
-CAPRINI_2P = {
-    "Cáncer actual o previo (no piel no melanoma)",
-    "Realizaré cirugía mayor (>45 min)",
-    "Yeso o molde no removible en el último mes",
-    "Actualmente tiene catéter venoso central / PICC / Port",
-    "En reposo en cama ≥72 h",
-}
-CAPRINI_3P_GROUP = {
-    # 🔧 corregido typo: “tombosis” → “trombosis”
-    "Historia personal de trombosis venosa profunda/embolismo pulmonar",
-    "Antecedente familiar de trombosis o accidente cerebrovascular (ACV)",
-    "Trombofilia (test positivo de hipercoagulabilidad)",
-}
-CAPRINI_5P = {
-    "Antecedente de artroplastia electiva de cadera/rodilla",
-    "Antecedente de fractura de cadera/pelvis/pierna",
-    "Antecedente de trauma mayor",
-    "Lesión medular con parálisis",
-    "Accidente cerebrovascular (ACV) reciente",
-}
-CAPRINI_TODOS = sorted(CAPRINI_1P | CAPRINI_2P | CAPRINI_3P_GROUP | CAPRINI_5P)
-
-
-def caprini_desde(labels: List[str]) -> Tuple[int, Dict[str, int]]:
-    sel = set(labels)
-    detalle: Dict[str, int] = {}
-    score = 0
-    for f in CAPRINI_1P:
-        if f in sel:
-            detalle[f] = 1
-            score += 1
-    for f in CAPRINI_2P:
-        if f in sel:
-            detalle[f] = 2
-            score += 2
-    for f in CAPRINI_5P:
-        if f in sel:
-            detalle[f] = 5
-            score += 5
-    if any(f in sel for f in CAPRINI_3P_GROUP):
-        detalle["Grupo trombofilia / DVT / antecedente"] = 3
-        score += 3
-    return score, detalle
-
-
-def caprini_categoria(score: int) -> str:
-    if score <= 2:
-        return "Bajo (0–2)"
-    if score <= 8:
-        return "Intermedio (3–8)"
-    return "Alto (>8)"
-
-
-def factor_riesgo_fn(edad: int, bmi: float, tabaquismo: str,
-                     caprini_score: int) -> float:
-    f = 1.0 if edad < 18 else 1.0 + (edad / 100.0)**3.5
-    if bmi >= 30:
-        f += 0.4
-    elif bmi >= 25:
-        f += 0.2
-    if tabaquismo == "Sí (1–7 por semana)":
-        f += 0.1
-    elif tabaquismo in ("Más de 7 por semana", ">7 por semana"):
-        f += 0.3
-    if caprini_score >= 5:
-        f += 0.245
-    return round(f, 3)
-
-
-def nivel_por_factor(f: float) -> str:
-    if f >= 1.4:
-        return "Moderado" if f < 1.6 else "Alto"
-    if f >= 1.2:
-        return "Moderado"
-    return "Bajo"
+# Scoring y recomendaciones puros en risk_core.py (sin Streamlit); acá sólo se reexportan
+# y se inyectan los idiomas de la sesión.
+from risk_core import (  # noqa: E402
+    CAPRINI_1P,
+    CAPRINI_2P,
+    CAPRINI_3P_GROUP,
+    CAPRINI_5P,
+    CAPRINI_TODOS,
+    caprini_categoria,
+    caprini_desde,
+    caprini_ids,
+    caprini_mask,
+    factor_riesgo_fn,
+    nivel_por_factor,
+)
+from risk_core import recomendaciones_txt as _recomendaciones_txt  # noqa: E402
+from assessment import session_assessment  # noqa: E402
 
 
 # ===================== Recomendaciones (AppSheet + Longevity®) =====================
 
 
-def recomendaciones_txt(*, IMC: float, edad: int, tabaquismo: str,
-                        hta_txt: str, diabetes_txt: str, tiroides_txt: str,
-                        caprini_score: int, antecedentes: List[str],
-                        riesgo: str) -> List[str]:
-    recs: List[str] = []
-
-    # Peso / IMC
-    if IMC < 19.5:
-        recs += [
-            tr(
-                "Incrementa tu peso de manera saludable para alcanzar un IMC adecuado.",
-                "Increase your weight in a healthy way to reach a suitable BMI.",
-                "Aumente seu peso de forma saudável para atingir um IMC adequado."
-            ),
-            tr(
-                "Considera un plan de alimentación rico en nutrientes y actividad física para ganar masa muscular.",
-                "Consider a nutrient-dense meal plan and physical activity to gain lean mass.",
-                "Considere um plano alimentar rico em nutrientes e atividade física para ganhar massa magra."
-            ),
-        ]
-    elif IMC > 25:
-        recs += [
-            tr("Trabaja en reducir tu peso para alcanzar un IMC saludable.",
-               "Work on reducing your weight to reach a healthy BMI.",
-               "Trabalhe para reduzir seu peso e atingir um IMC saudável."),
-            tr(
-                "Sigue una dieta balanceada y realiza actividad física regular.",
-                "Follow a balanced diet and perform regular physical activity.",
-                "Siga uma dieta equilibrada e pratique atividade física regularmente."
-            ),
-        ]
-    else:
-        recs += [
-            tr(
-                "Mantén tu peso actual con dieta balanceada y actividad física regular.",
-                "Maintain your current weight with a balanced diet and regular physical activity.",
-                "Mantenha seu peso atual com dieta equilibrada e atividade física regular."
-            )
-        ]
-
-    # Factores puntuales
-    if (tabaquismo or "") != "No":
-        recs.append(
-            tr(
-                "Deja de fumar para reducir riesgos quirúrgicos y mejorar tu salud general. Consulta con un especialista si necesitas apoyo.",
-                "Quit smoking to reduce surgical risks and improve your overall health. Seek specialist support if needed.",
-                "Pare de fumar para reduzir riscos cirúrgicos e melhorar sua saúde geral. Procure apoio especializado se necessário."
-            ))
-    if (hta_txt or "") != "No":
-        recs.append(
-            tr(
-                "Controla tu presión arterial regularmente y lleva un registro para tu médico.",
-                "Monitor your blood pressure regularly and keep a log for your physician.",
-                "Controle sua pressão arterial regularmente e mantenha um registro para seu médico."
-            ))
-    if (diabetes_txt or "") != "No":
-        recs.append(
-            tr(
-                "Mantén control estricto de glucosa y sigue indicaciones de tu endocrinólogo.",
-                "Keep strict glucose control and follow your endocrinologist’s recommendations.",
-                "Mantenha controle estrito da glicose e siga as recomendações do seu endocrinologista."
-            ))
-    if edad >= 50:
-        recs.append(
-            tr(
-                "Programa chequeos preventivos regulares acordes a tu edad.",
-                "Schedule age-appropriate preventive checkups regularly.",
-                "Agende exames preventivos regulares apropriados para sua idade."
-            ))
-
-    # Caprini / sugerencia por riesgo
-    if riesgo == "Bajo":
-        recs.append(
-            tr(
-                "Puedes considerar cirugía hasta 6 h; combinaciones hasta 5 h (según criterio).",
-                "You may consider surgery up to 6 h; combined procedures up to 5 h (as clinically indicated).",
-                "Você pode considerar cirurgia de até 6 h; combinações até 5 h (conforme indicação clínica)."
-            ))
-    elif riesgo == "Moderado":
-        recs.append(_t("limit_duration"))  # ya usa tu i18n por clave
-    else:
-        recs.append(
-            tr(
-                "Riesgo alto: solo cirugías simples hasta 3 h. Combinaciones no recomendadas.",
-                "High risk: simple procedures only up to 3 h. Combined procedures not recommended.",
-                "Alto risco: apenas procedimentos simples de até 3 h. Combinações não recomendadas."
-            ))
-
-    # Condiciones adicionales tipo AppSheet
-    if IMC < 18.5:
-        recs.append(
-            tr(
-                "Aumentar de peso con nutricionista; descartar trastorno alimentario si aplica.",
-                "Increase weight with a nutritionist; rule out eating disorder if applicable.",
-                "Aumentar o peso com nutricionista; descartar transtorno alimentar se aplicável."
-            ))
-
-    if any(a for a in (antecedentes or [])
-           if ("coagulación" in a.lower() or "trombo" in a.lower()
-               or "dvt" in a.lower())):
-        recs.append(
-            tr(
-                "Consultar con Hematología para evaluación de trastornos de coagulación.",
-                "Suggest a Hematology consult for evaluation of coagulation disorders.",
-                "Sugira consulta com Hematologia para avaliação de distúrbios de coagulação."
-            ))
-
-    if (tiroides_txt or "") != "Normal":
-        recs.append(
-            tr(
-                "Consultar con Endocrinología y monitorear hormonas tiroideas.",
-                "Refer to Endocrinology and monitor thyroid hormones.",
-                "Consulte um endocrinologista e monitore hormônios da tireoide."
-            ))
-
-    if IMC > 31:
-        recs.append(_t("bariatric_eval"))  # ya usa tu catálogo i18n
-
-    # Cardiovascular ampliado
-    if (IMC > 28) or (edad >= 45) or ((hta_txt or "") != "No"):
-        recs.append(
-            tr("Ergometría según criterio médico.",
-               "Exercise stress test as clinically indicated.",
-               "Teste ergométrico conforme critério médico."))
-
-    # Criterios ampliados de evaluación cardiovascular
-    fam_trombo = any("Antecedente familiar de trombosis" == a
-                     for a in (antecedentes or []))
-    if (edad >= 50) or ((hta_txt or "") != "No") or fam_trombo:
-        recs.append(
-            tr(
-                "Doppler de carótidas y score cálcico coronario (CAC).",
-                "Carotid Doppler and coronary artery calcium (CAC) score.",
-                "Doppler de carótidas e escore de cálcio coronário (CAC)."
-            ))
-        recs.append(
-            tr(
-                "Presurometría 24 h y Eco-estrés (ejercicio y reposo) según criterio médico.",
-                "24-hour ambulatory BP monitoring and stress echocardiography (exercise and rest) as clinically indicated.",
-                "Pressurometria 24 h e Eco-estresse (exercício e repouso) conforme critério médico."
-            ))
-
-    recs.append(
-        tr("Estas sugerencias no sustituyen el criterio médico.",
-           "These suggestions do not replace medical judgment.",
-           "Estas sugestões não substituem o julgamento clínico."))
-    return recs
+def recomendaciones_txt(**kwargs: Any) -> List[str]:
+    """Igual que risk_core.recomendaciones_txt con los idiomas de la sesión (pdf_lang / idioma)."""
+    kwargs.setdefault("lang", st.session_state.get("pdf_lang", "ES"))
+    kwargs.setdefault("catalog_lang", _lang())
+    return _recomendaciones_txt(**kwargs)
 
 
 # ===================== PDF (ReportLab – canvas, con logo robusto) =====================
@@ -1236,6 +1009,255 @@ def _psico_texto_empatico(resultado: str) -> str:
     return f"Resultado del screening: {r}"
 
 
+# ===== Textos del PDF (a nivel de módulo: se arman una vez, no en cada generar_pdf) =====
+PDF_TXT = {
+    "ES": {
+        "title":
+        "Informe de Evaluación y Recomendaciones Personalizadas",
+        "issued_by":
+        "Emitido por: AestheticSafe®",
+        "patient":
+        "Datos del Paciente",
+        "name":
+        "Nombre",
+        "age":
+        "Edad",
+        "height":
+        "Altura",
+        "weight":
+        "Peso",
+        "bmi":
+        "IMC",
+        "caprini":
+        "Caprini",
+        "factor":
+        "Factor",
+        "level":
+        "Nivel",
+        "recs":
+        "Recomendaciones",
+        "recs_preview_note":
+        "Las recomendaciones completas estarán disponibles en el informe final.",
+        "psych":
+        "Evaluación Psicológica",
+        "psych_label":
+        "Screening psicológico",
+        "conclusion":
+        "Conclusión",
+        "disclaimer":
+        "Descargo de responsabilidad",
+        "disclaimer_body":
+        ("Este informe fue generado automáticamente por AestheticSafe®. "
+         "La información es orientativa y debe ser validada por un profesional médico antes de tomar decisiones. "
+         "No sustituye el juicio clínico."),
+        "code":
+        "Código verificador",
+        "date":
+        "Fecha",
+        "id":
+        "ID",
+    },
+    "EN": {
+        "title":
+        "Evaluation Report and Personalized Recommendations",
+        "issued_by":
+        "Issued by: AestheticSafe®",
+        "patient":
+        "Patient Data",
+        "name":
+        "Name",
+        "age":
+        "Age",
+        "height":
+        "Height",
+        "weight":
+        "Weight",
+        "bmi":
+        "BMI",
+        "caprini":
+        "Caprini",
+        "factor":
+        "Factor",
+        "level":
+        "Level",
+        "recs":
+        "Recommendations",
+        "recs_preview_note":
+        "Full recommendations will be available in the final report.",
+        "psych":
+        "Psychological Evaluation",
+        "psych_label":
+        "Psych screening",
+        "conclusion":
+        "Conclusion",
+        "disclaimer":
+        "Disclaimer",
+        "disclaimer_body":
+        ("This report was automatically generated by AestheticSafe®. "
+         "The information is for guidance only and must be reviewed by a qualified physician before making any decisions. "
+         "It does not replace clinical judgment."),
+        "code":
+        "Verification code",
+        "date":
+        "Date",
+        "id":
+        "ID",
+    },
+    "PT": {
+        "title":
+        "Relatório de Avaliação e Recomendações Personalizadas",
+        "issued_by":
+        "Emitido por: AestheticSafe®",
+        "patient":
+        "Dados do Paciente",
+        "name":
+        "Nome",
+        "age":
+        "Idade",
+        "height":
+        "Altura",
+        "weight":
+        "Peso",
+        "bmi":
+        "IMC",
+        "caprini":
+        "Caprini",
+        "factor":
+        "Fator",
+        "level":
+        "Nível",
+        "recs":
+        "Recomendações",
+        "recs_preview_note":
+        "As recomendações completas estarão disponíveis no relatório final.",
+        "psych":
+        "Avaliação Psicológica",
+        "psych_label":
+        "Triagem psicológica",
+        "conclusion":
+        "Conclusão",
+        "disclaimer":
+        "Aviso legal",
+        "disclaimer_body":
+        ("Este relatório foi gerado automaticamente pelo AestheticSafe®. "
+         "As informações são orientativas e devem ser validadas por um médico antes de qualquer decisão. "
+         "Não substitui o julgamento clínico."),
+        "code":
+        "Código verificador",
+        "date":
+        "Data",
+        "id":
+        "ID",
+    },
+}
+
+
+# Traducción de Caprini y nivel de riesgo
+CAPRINI_CAT = {
+    "EN": {
+        "Bajo (0–2)": "Low (0–2)",
+        "Intermedio (3–8)": "Intermediate (3–8)",
+        "Alto (>8)": "High (>8)",
+    },
+    "PT": {
+        "Bajo (0–2)": "Baixo (0–2)",
+        "Intermedio (3–8)": "Intermediário (3–8)",
+        "Alto (>8)": "Alto (>8)",
+    }
+}
+
+NIVEL_RIESGO_TXT = {
+    "EN": {
+        "Bajo": "Low",
+        "Moderado": "Moderate",
+        "Alto": "High"
+    },
+    "PT": {
+        "Bajo": "Baixo",
+        "Moderado": "Moderado",
+        "Alto": "Alto"
+    }
+}
+
+
+# Traducción de recomendaciones (texto ES → EN/PT) para PDF en EN o PT
+TRAD_RECS = {
+    "Trabaja en reducir tu peso para alcanzar un IMC saludable.": {
+        "EN": "Work on reducing your weight to reach a healthy BMI.",
+        "PT": "Trabalhe para reduzir seu peso e atingir um IMC saudável."
+    },
+    "Sigue una dieta balanceada y realiza actividad física regular.": {
+        "EN":
+        "Maintain a balanced diet and engage in regular physical activity.",
+        "PT":
+        "Mantenha uma dieta equilibrada e pratique atividade física regularmente."
+    },
+    "Mantén tu peso actual con dieta balanceada y actividad física regular.":
+    {
+        "EN":
+        "Maintain your current weight with a balanced diet and regular physical activity.",
+        "PT":
+        "Mantenha seu peso atual com uma dieta equilibrada e atividade física regular."
+    },
+    "Estas sugerencias no sustituyen el criterio médico.": {
+        "EN": "These suggestions do not replace medical judgment.",
+        "PT": "Estas sugestões não substituem o julgamento médico."
+    },
+    # --- Nuevas traducciones ---
+    "Deja de fumar para reducir riesgos quirúrgicos y mejorar tu salud general. Consulta con un especialista si necesitas apoyo.":
+    {
+        "EN":
+        "Quit smoking to reduce surgical risks and improve your overall health. Consult a specialist if you need support.",
+        "PT":
+        "Pare de fumar para reduzir riscos cirúrgicos e melhorar sua saúde geral. Consulte um especialista se precisar de apoio."
+    },
+    "Controla tu presión arterial regularmente y lleva un registro para tu médico.":
+    {
+        "EN":
+        "Monitor your blood pressure regularly and keep a log for your doctor.",
+        "PT":
+        "Controle sua pressão arterial regularmente e mantenha um registro para seu médico."
+    },
+    "Mantén control estricto de glucosa y sigue indicaciones de tu endocrinólogo.":
+    {
+        "EN":
+        "Keep strict glucose control and follow your endocrinologist's instructions.",
+        "PT":
+        "Mantenha controle estrito da glicose e siga as orientações do seu endocrinologista."
+    },
+    "Riesgo alto: solo cirugías simples hasta 3 h. Combinaciones no recomendadas.":
+    {
+        "EN":
+        "High risk: simple procedures only up to 3 h. Combined procedures not recommended.",
+        "PT":
+        "Alto risco: apenas procedimentos simples de até 3 h. Combinações não recomendadas."
+    },
+    "Consultar con Endocrinología y monitorear hormonas tiroideas.": {
+        "EN": "Consult with Endocrinology and monitor thyroid hormones.",
+        "PT":
+        "Consulte um endocrinologista e monitore hormônios da tireoide."
+    },
+    "Ergometría según criterio médico.": {
+        "EN": "Exercise stress test as clinically indicated.",
+        "PT": "Teste ergométrico conforme critério médico."
+    },
+    "Doppler de carótidas y score cálcico coronario (CAC).":
+    {
+        "EN":
+        "Carotid Doppler and coronary artery calcium (CAC) score.",
+        "PT":
+        "Doppler de carótidas e escore de cálcio coronário (CAC)."
+    },
+    "Presurometría 24 h y Eco-estrés (ejercicio y reposo) según criterio médico.":
+    {
+        "EN":
+        "24-hour ambulatory BP monitoring and stress echocardiography (exercise and rest) as clinically indicated.",
+        "PT":
+        "Pressurometria 24 h e Eco-estresse (exercício e repouso) conforme critério médico."
+    },
+}
+
+
 def generar_pdf(datos: dict,
                 *,
                 preview: bool = False,
@@ -1245,148 +1267,6 @@ def generar_pdf(datos: dict,
     Genera el PDF (preview o final).
     Idioma: usa 'lang' si se pasa; si no, toma automáticamente st.session_state['idioma'] (UI).
     """
-    # ===== i18n =====
-    PDF_TXT = {
-        "ES": {
-            "title":
-            "Informe de Evaluación y Recomendaciones Personalizadas",
-            "issued_by":
-            "Emitido por: AestheticSafe®",
-            "patient":
-            "Datos del Paciente",
-            "name":
-            "Nombre",
-            "age":
-            "Edad",
-            "height":
-            "Altura",
-            "weight":
-            "Peso",
-            "bmi":
-            "IMC",
-            "caprini":
-            "Caprini",
-            "factor":
-            "Factor",
-            "level":
-            "Nivel",
-            "recs":
-            "Recomendaciones",
-            "recs_preview_note":
-            "Las recomendaciones completas estarán disponibles en el informe final.",
-            "psych":
-            "Evaluación Psicológica",
-            "psych_label":
-            "Screening psicológico",
-            "conclusion":
-            "Conclusión",
-            "disclaimer":
-            "Descargo de responsabilidad",
-            "disclaimer_body":
-            ("Este informe fue generado automáticamente por AestheticSafe®. "
-             "La información es orientativa y debe ser validada por un profesional médico antes de tomar decisiones. "
-             "No sustituye el juicio clínico."),
-            "code":
-            "Código verificador",
-            "date":
-            "Fecha",
-            "id":
-            "ID",
-        },
-        "EN": {
-            "title":
-            "Evaluation Report and Personalized Recommendations",
-            "issued_by":
-            "Issued by: AestheticSafe®",
-            "patient":
-            "Patient Data",
-            "name":
-            "Name",
-            "age":
-            "Age",
-            "height":
-            "Height",
-            "weight":
-            "Weight",
-            "bmi":
-            "BMI",
-            "caprini":
-            "Caprini",
-            "factor":
-            "Factor",
-            "level":
-            "Level",
-            "recs":
-            "Recommendations",
-            "recs_preview_note":
-            "Full recommendations will be available in the final report.",
-            "psych":
-            "Psychological Evaluation",
-            "psych_label":
-            "Psych screening",
-            "conclusion":
-            "Conclusion",
-            "disclaimer":
-            "Disclaimer",
-            "disclaimer_body":
-            ("This report was automatically generated by AestheticSafe®. "
-             "The information is for guidance only and must be reviewed by a qualified physician before making any decisions. "
-             "It does not replace clinical judgment."),
-            "code":
-            "Verification code",
-            "date":
-            "Date",
-            "id":
-            "ID",
-        },
-        "PT": {
-            "title":
-            "Relatório de Avaliação e Recomendações Personalizadas",
-            "issued_by":
-            "Emitido por: AestheticSafe®",
-            "patient":
-            "Dados do Paciente",
-            "name":
-            "Nome",
-            "age":
-            "Idade",
-            "height":
-            "Altura",
-            "weight":
-            "Peso",
-            "bmi":
-            "IMC",
-            "caprini":
-            "Caprini",
-            "factor":
-            "Fator",
-            "level":
-            "Nível",
-            "recs":
-            "Recomendações",
-            "recs_preview_note":
-            "As recomendações completas estarão disponíveis no relatório final.",
-            "psych":
-            "Avaliação Psicológica",
-            "psych_label":
-            "Triagem psicológica",
-            "conclusion":
-            "Conclusão",
-            "disclaimer":
-            "Aviso legal",
-            "disclaimer_body":
-            ("Este relatório foi gerado automaticamente pelo AestheticSafe®. "
-             "As informações são orientativas e devem ser validadas por um médico antes de qualquer decisão. "
-             "Não substitui o julgamento clínico."),
-            "code":
-            "Código verificador",
-            "date":
-            "Data",
-            "id":
-            "ID",
-        },
-    }
-
     # ===== Imports locales =====
     try:
         from io import BytesIO
@@ -1394,6 +1274,7 @@ def generar_pdf(datos: dict,
         from reportlab.lib.pagesizes import A4
         from reportlab.lib.units import cm
         from datetime import timezone as _tz
+        from pdf_templates import layer as tpl_layer, place as tpl_place
     except Exception:
         import json as _json
         lcode = (lang
@@ -1446,32 +1327,6 @@ def generar_pdf(datos: dict,
         recs = []
 
     # ===== Traducción de Caprini, Riesgo, Psicología y Conclusión =====
-    CAPRINI_CAT = {
-        "EN": {
-            "Bajo (0–2)": "Low (0–2)",
-            "Intermedio (3–8)": "Intermediate (3–8)",
-            "Alto (>8)": "High (>8)",
-        },
-        "PT": {
-            "Bajo (0–2)": "Baixo (0–2)",
-            "Intermedio (3–8)": "Intermediário (3–8)",
-            "Alto (>8)": "Alto (>8)",
-        }
-    }
-
-    NIVEL_RIESGO_TXT = {
-        "EN": {
-            "Bajo": "Low",
-            "Moderado": "Moderate",
-            "Alto": "High"
-        },
-        "PT": {
-            "Bajo": "Baixo",
-            "Moderado": "Moderado",
-            "Alto": "Alto"
-        }
-    }
-
     if lcode in ("EN", "PT"):
         cap_cat = CAPRINI_CAT.get(lcode, {}).get(cap_cat, cap_cat)
         nivel = NIVEL_RIESGO_TXT.get(lcode, {}).get(nivel, nivel)
@@ -1494,83 +1349,7 @@ def generar_pdf(datos: dict,
     elif lcode == "PT" and "Optimizar salud general" in conclusion:
         conclusion = "Otimizar a saúde geral e reavaliar antes de planejar procedimentos combinados."
 
-    # ===== Traducción de recomendaciones si PDF es EN o PT =====
-    TRAD_RECS = {
-        "Trabaja en reducir tu peso para alcanzar un IMC saludable.": {
-            "EN": "Work on reducing your weight to reach a healthy BMI.",
-            "PT": "Trabalhe para reduzir seu peso e atingir um IMC saudável."
-        },
-        "Sigue una dieta balanceada y realiza actividad física regular.": {
-            "EN":
-            "Maintain a balanced diet and engage in regular physical activity.",
-            "PT":
-            "Mantenha uma dieta equilibrada e pratique atividade física regularmente."
-        },
-        "Mantén tu peso actual con dieta balanceada y actividad física regular.":
-        {
-            "EN":
-            "Maintain your current weight with a balanced diet and regular physical activity.",
-            "PT":
-            "Mantenha seu peso atual com uma dieta equilibrada e atividade física regular."
-        },
-        "Estas sugerencias no sustituyen el criterio médico.": {
-            "EN": "These suggestions do not replace medical judgment.",
-            "PT": "Estas sugestões não substituem o julgamento médico."
-        },
-        # --- Nuevas traducciones ---
-        "Deja de fumar para reducir riesgos quirúrgicos y mejorar tu salud general. Consulta con un especialista si necesitas apoyo.":
-        {
-            "EN":
-            "Quit smoking to reduce surgical risks and improve your overall health. Consult a specialist if you need support.",
-            "PT":
-            "Pare de fumar para reduzir riscos cirúrgicos e melhorar sua saúde geral. Consulte um especialista se precisar de apoio."
-        },
-        "Controla tu presión arterial regularmente y lleva un registro para tu médico.":
-        {
-            "EN":
-            "Monitor your blood pressure regularly and keep a log for your doctor.",
-            "PT":
-            "Controle sua pressão arterial regularmente e mantenha um registro para seu médico."
-        },
-        "Mantén control estricto de glucosa y sigue indicaciones de tu endocrinólogo.":
-        {
-            "EN":
-            "Keep strict glucose control and follow your endocrinologist's instructions.",
-            "PT":
-            "Mantenha controle estrito da glicose e siga as orientações do seu endocrinologista."
-        },
-        "Riesgo alto: solo cirugías simples hasta 3 h. Combinaciones no recomendadas.":
-        {
-            "EN":
-            "High risk: simple procedures only up to 3 h. Combined procedures not recommended.",
-            "PT":
-            "Alto risco: apenas procedimentos simples de até 3 h. Combinações não recomendadas."
-        },
-        "Consultar con Endocrinología y monitorear hormonas tiroideas.": {
-            "EN": "Consult with Endocrinology and monitor thyroid hormones.",
-            "PT":
-            "Consulte um endocrinologista e monitore hormônios da tireoide."
-        },
-        "Ergometría según criterio médico.": {
-            "EN": "Exercise stress test as clinically indicated.",
-            "PT": "Teste ergométrico conforme critério médico."
-        },
-        "Doppler de carótidas y score cálcico coronario (CAC).":
-        {
-            "EN":
-            "Carotid Doppler and coronary artery calcium (CAC) score.",
-            "PT":
-            "Doppler de carótidas e escore de cálcio coronário (CAC)."
-        },
-        "Presurometría 24 h y Eco-estrés (ejercicio y reposo) según criterio médico.":
-        {
-            "EN":
-            "24-hour ambulatory BP monitoring and stress echocardiography (exercise and rest) as clinically indicated.",
-            "PT":
-            "Pressurometria 24 h e Eco-estresse (exercício e repouso) conforme critério médico."
-        },
-    }
-
+    # ===== Traducción de recomendaciones si PDF es EN o PT (TRAD_RECS a nivel de módulo) =====
     if lcode in ("EN", "PT"):
         recs = [TRAD_RECS.get(r, {}).get(lcode, r) for r in recs]
 
@@ -1604,14 +1383,6 @@ def generar_pdf(datos: dict,
             out.append(" ".join(line))
         return out
 
-    def H1(txt):
-        """Título principal con margen superior y inferior extra para no superponer encabezado."""
-        nonlocal y
-        y -= 10  # margen superior extra
-        c.setFont("Helvetica-Bold", 16)
-        c.drawCentredString(W / 2, y, txt)
-        y -= (_LINE + 4)  # margen inferior extra
-
     def H2(txt):
         """Subtítulo/sección con separación clara."""
         nonlocal y
@@ -1646,20 +1417,48 @@ def generar_pdf(datos: dict,
         c.drawString(ML, y, f"{label}: {value}")
         y -= _LINE
 
-    # ===== Cabecera =====
-    y -= 18
-    H1(T["title"])
+    # ===== Capas estáticas (pdf_templates): se graban una vez por proceso e idioma =====
+    def _static_page(cv, y0):
+        """Título, 'emitido por', título de Paciente y pie: posiciones fijas."""
+        yy = y0 - 18 - 10
+        cv.setFont("Helvetica-Bold", 16)
+        cv.drawCentredString(W / 2, yy, T["title"])
+        yy -= (_LINE + 4) + 6
+        cv.setFont("Helvetica", 10.5)
+        for ln in wrap_lines(T["issued_by"], _WRAP):
+            cv.drawString(ML, yy, ln)
+            yy -= _LINE
+        yy -= 10
+        cv.setFont("Helvetica-Bold", 12)
+        cv.drawString(ML, yy, T["patient"])
+        cv.setFont("Helvetica", 8)
+        cv.drawString(
+            ML, MB + 10,
+            "Bukret Pesce SB SRL · Arenales 2521 Piso 9, Buenos Aires · +54 9 11 3121-1468 · info@aestheticsafe.com"
+        )
+        return yy - (_LINE - 1)
+
+    def _static_disclaimer(cv, y0):
+        """Título y texto del descargo desde y0 hacia abajo."""
+        yy = y0 - 10
+        cv.setFont("Helvetica-Bold", 12)
+        cv.drawString(ML, yy, T["disclaimer"])
+        yy -= (_LINE - 1)
+        cv.setFont("Helvetica", 10.5)
+        for ln in wrap_lines(T["disclaimer_body"], _WRAP):
+            cv.drawString(ML, yy, ln)
+            yy -= _LINE
+        return yy
+
+    # ===== Cabecera (+ pie) =====
+    y = tpl_place(c, tpl_layer(("legacy", lcode, "page"), _static_page, H - MT))
     c.setFont("Helvetica", 9.5)
     c.drawRightString(
         W - MR, H - MT + 2,
         f'{T["date"]}: {_dt.now(_tz.utc).strftime("%Y-%m-%d %H:%M UTC")}')
     c.drawString(ML, H - MT + 2, f'{T["id"]}: {rep_id}')
-    y -= 6
-    c.setFont("Helvetica", 10)
-    P(T["issued_by"])
 
-    # ===== Paciente =====
-    H2(T["patient"])
+    # ===== Paciente (título en la capa estática) =====
     KV(T["name"], nombre)
     if edad != "": KV(T["age"], str(edad))
     if altura_cm != "": KV(f'{T["height"]} (cm)', str(altura_cm))
@@ -1689,20 +1488,14 @@ def generar_pdf(datos: dict,
         H2(T["conclusion"])
         P(conclusion)
 
-    # ===== Descargo =====
-    H2(T["disclaimer"])
-    P(T["disclaimer_body"])
+    # ===== Descargo (capa estática en y) =====
+    y = tpl_place(c, tpl_layer(("legacy", lcode, "disclaimer"), _static_disclaimer, H - MT), y)
     # ===== Código verificador =====
     y -= 6
     c.setFont("Helvetica", 9.5)
     c.drawString(ML, y, f'{T["code"]}: {ver_code}')
 
-    # ===== Pie de página (una sola línea) =====
-    c.setFont("Helvetica", 8)
-    c.drawString(
-        ML, MB + 10,
-        "Bukret Pesce SB SRL · Arenales 2521 Piso 9, Buenos Aires · +54 9 11 3121-1468 · info@aestheticsafe.com"
-    )
+    # ===== Pie de página: en la capa estática =====
 
     # ===== Cierre del PDF (evita NoneType en Streamlit) =====
     c.showPage()
@@ -1986,6 +1779,7 @@ def pdf_lang_selector():
         "pdf_lang_ui", st.session_state["pdf_lang"])
 
 
+@event_batch()  # todos los eventos de la corrida salen en un solo lote (también con st.rerun)
 def calculadora():
     # --- init estados persistentes ---
     st.session_state.setdefault("mail_sent", False)
@@ -2773,12 +2567,25 @@ def calculadora():
 
     # --- Cálculo Caprini (¡no mover de acá!) ---
 
-    cap_score, cap_det = caprini_desde(antecedentes_todos)
-    cap_cat = caprini_categoria(cap_score)
+    # Evaluación memoizada en la sesión: sólo se recalcula lo que depende de una entrada
+    # clínica que cambió (un click de emoji o un cambio de idioma no recalcula nada)
+    assessment = session_assessment(st.session_state,
+                                    edad=edad,
+                                    peso=peso,
+                                    altura=altura,
+                                    tabaquismo=tabaquismo,
+                                    hta_txt=hta_txt,
+                                    diabetes_txt=diabetes_txt,
+                                    tiroides_txt=tiroides_txt,
+                                    antecedentes=antecedentes_todos)
+    # La selección se guarda como un entero (un bit por factor del catálogo de risk_core)
+    st.session_state["caprini_mask"] = assessment.caprini_mask
+    cap_score, cap_det = assessment.caprini_score, assessment.caprini_detalle
+    cap_cat = assessment.caprini_categoria
     
     # Cálculo simple para preview (sin llamada a API, solo visual)
-    f = factor_riesgo_fn(edad, bmi, tabaquismo, cap_score)
-    nivel = nivel_por_factor(f)
+    f = assessment.factor_riesgo
+    nivel = assessment.nivel_riesgo
 
     # === Helper for Yes/No labels ===
     def yn_labels(lang: str | None) -> tuple[str, str]:
@@ -2792,6 +2599,20 @@ def calculadora():
         lang = (st.session_state.get("idioma", "ES") or "ES").upper()
         return {"ES": es, "EN": en, "PT": pt, "FR": fr or es}.get(lang, en)
 
+    # === What-if: cuántos kg cambian el nivel (grilla vectorizada, < 1 ms) ===
+    w_peso = None
+    if whatif is not None:
+        try:
+            w_peso = whatif(edad, peso, altura, tabaquismo, assessment.caprini_score)
+            with st.expander(i18n_label("🔎 ¿Cuánto peso cambia tu nivel de riesgo?",
+                                        "🔎 How much weight changes your risk level?",
+                                        "🔎 Quanto peso muda seu nível de risco?",
+                                        "🔎 Combien de poids change votre niveau de risque ?")):
+                for line in whatif_resumen(w_peso, _lang()):
+                    st.markdown(f"- {line}")
+        except Exception:
+            w_peso = None
+
     # === Centralized gating logic (removed local function to avoid shadowing) ===
 
     # === Screening Psicológico (i18n) ===
@@ -3546,9 +3367,7 @@ def calculadora():
             )
             st.error(error_msg)
 
-    # --- Cálculo Caprini (usa variables ya definidas arriba) ---
-    cap_score, cap_det = caprini_desde(antecedentes_todos)
-    cap_cat = caprini_categoria(cap_score)
+    # --- Caprini: ya calculado en 'assessment' (arriba) ---
     
     # === CENTRALIZADO: Llamada a API para cálculo de riesgo ===
     if API_CLIENT_AVAILABLE:
@@ -3572,7 +3391,8 @@ def calculadora():
                 nivel = api_resultado['nivel_riesgo']
                 api_bmi_cat = api_resultado.get('bmi_categoria', '')
                 
-                safe_log("API evaluation success", bmi=bmi, nivel=nivel, factor=f)
+                safe_log("API evaluation success", bmi=bmi, nivel=nivel, factor=f,
+                         origen=api_resultado.get('origen', ''))
             else:
                 raise ValueError("API retornó None o respuesta inválida")
             
@@ -3580,20 +3400,20 @@ def calculadora():
             st.warning(f"⚠️ API no disponible: {e}")
             st.info("🔄 Usando cálculo local como fallback...")
             # Fallback: Cálculo local
-            f = factor_riesgo_fn(edad, bmi, tabaquismo, cap_score)
-            nivel = nivel_por_factor(f)
+            f = assessment.factor_riesgo
+            nivel = assessment.nivel_riesgo
             safe_log("API error, using local fallback", error=str(e))
         except Exception as e:
             st.error(f"❌ Error inesperado: {e}")
             # Fallback: Cálculo local
-            f = factor_riesgo_fn(edad, bmi, tabaquismo, cap_score)
-            nivel = nivel_por_factor(f)
+            f = assessment.factor_riesgo
+            nivel = assessment.nivel_riesgo
             safe_log("Unexpected error, using local fallback", error=str(e))
     else:
         # API no disponible, usar cálculo local
         st.info("ℹ️ API cliente no disponible, usando cálculo local")
-        f = factor_riesgo_fn(edad, bmi, tabaquismo, cap_score)
-        nivel = nivel_por_factor(f)
+        f = assessment.factor_riesgo
+        nivel = assessment.nivel_riesgo
 
     payload = {
         "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
@@ -3612,8 +3432,9 @@ def calculadora():
         "tabaquismo": tabaquismo,
         "caprini_score": cap_score,
         "caprini_categoria": cap_cat,
-        "caprini_factores":
-        "; ".join([f"{k}(+{v})" for k, v in cap_det.items()]),
+        # IDs estables + máscara en vez de los textos largos en español
+        "caprini_factores": caprini_ids(assessment.caprini_mask),
+        "caprini_mask": assessment.caprini_mask,
         "antecedentes": "; ".join(antecedentes_todos),
         "factor_riesgo": f,
         "nivel_riesgo": nivel,
@@ -4007,6 +3828,63 @@ def calculadora():
     st.session_state["medico"] = medico_val
     st.session_state["medico_ui"] = medico_val
 
+    # Recomendaciones y PDF FINAL
+    if nivel == assessment.nivel_riesgo and bmi == assessment.bmi:
+        recs = assessment.recomendaciones(st.session_state.get("pdf_lang", "ES"), _lang())
+    else:  # la API devolvió otros números: recomendaciones sobre esos
+        recs = recomendaciones_txt(IMC=bmi,
+                                   edad=edad,
+                                   tabaquismo=tabaquismo,
+                                   hta_txt=hta_txt,
+                                   diabetes_txt=diabetes_txt,
+                                   tiroides_txt=tiroides_txt,
+                                   caprini_score=cap_score,
+                                   antecedentes=antecedentes_todos,
+                                   riesgo=nivel)
+    final_data = {
+        "rep_id":
+        f"ESTH-{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}",
+        "paciente": {
+            "nombre": nombre or "—",
+            "edad": edad,
+            "altura_cm": altura,
+            "peso_kg": peso
+        },
+        "bmi": bmi,
+        "caprini_score": cap_score,
+        "caprini_categoria": cap_cat,
+        "factor_riesgo": f,
+        "nivel_riesgo": nivel,
+        "bdd_evaluacion": st.session_state.get("bdd_respuestas", ""),
+        "bdd_resultado": st.session_state.get("bdd_resultado", ""),
+        "recomendaciones": recs,
+        "whatif": (whatif_resumen(w_peso, str(st.session_state.get("pdf_lang", "ES")).upper())
+                   if w_peso is not None else []),
+        "conclusion":
+        "Optimizar salud general y reevaluar antes de planificar procedimientos combinados.",
+        "psico_resultado": st.session_state.get("psico_resultado", ""),
+    }
+    # --- cacheo de Caprini en session_state para logging/gsheets ---
+    st.session_state["caprini_score"] = str(cap_score)
+    st.session_state["caprini_categoria"] = cap_cat
+    st.session_state.setdefault("caprini_factores_txt",
+                                st.session_state.get("caprini_detalle", ""))
+    st.session_state["factor_riesgo_val"] = str(f)
+    st.session_state["nivel_riesgo_val"] = nivel
+    # ---------------------------------------------------------------
+
+    # Pre-render del PDF final en el pool de procesos: arranca mientras el paciente está en
+    # el gate de pago/WhatsApp; si cambian los datos se cancela el trabajo anterior
+    sess_ref = _ensure_session_ref()
+    pdf_key = pdf_final_key(final_data, scope=sess_ref) if generar_pdf_v3_1 else ""
+    prev_uuid = (st.session_state.get("verification_uuid")
+                 if pdf_key and st.session_state.get("pdf_final_key") == pdf_key else None)
+    if generar_pdf_v3_1 and pdf_prerender is not None:
+        try:
+            pdf_prerender(final_data, scope=sess_ref, verification_uuid=prev_uuid)
+        except Exception as e:
+            safe_log("pdf_prerender no disponible", error=str(e))
+
     # Requisitos mínimos
     # ===== Permiso para FINAL =====
     paid_code = (st.session_state.get("paid_code") or "").strip()
@@ -4042,52 +3920,18 @@ def calculadora():
             ))
         st.stop()
 
-    # Recomendaciones y PDF FINAL
-    recs = recomendaciones_txt(IMC=bmi,
-                               edad=edad,
-                               tabaquismo=tabaquismo,
-                               hta_txt=hta_txt,
-                               diabetes_txt=diabetes_txt,
-                               tiroides_txt=tiroides_txt,
-                               caprini_score=cap_score,
-                               antecedentes=antecedentes_todos,
-                               riesgo=nivel)
-    final_data = {
-        "rep_id":
-        f"ESTH-{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}",
-        "paciente": {
-            "nombre": nombre or "—",
-            "edad": edad,
-            "altura_cm": altura,
-            "peso_kg": peso
-        },
-        "bmi": bmi,
-        "caprini_score": cap_score,
-        "caprini_categoria": cap_cat,
-        "factor_riesgo": f,
-        "nivel_riesgo": nivel,
-        "bdd_evaluacion": st.session_state.get("bdd_respuestas", ""),
-        "bdd_resultado": st.session_state.get("bdd_resultado", ""),
-        "recomendaciones": recs,
-        "conclusion":
-        "Optimizar salud general y reevaluar antes de planificar procedimientos combinados.",
-        "psico_resultado": st.session_state.get("psico_resultado", ""),
-    }
-    # --- cacheo de Caprini en session_state para logging/gsheets ---
-    st.session_state["caprini_score"] = str(cap_score)
-    st.session_state["caprini_categoria"] = cap_cat
-    st.session_state.setdefault("caprini_factores_txt",
-                                st.session_state.get("caprini_detalle", ""))
-    st.session_state["factor_riesgo_val"] = str(f)
-    st.session_state["nivel_riesgo_val"] = nivel
-    # ---------------------------------------------------------------
-
     # Use new v3.1 PDF generator if available, otherwise fall back to legacy
+    # Un render por informe: los reruns con los mismos datos reusan bytes y verification_uuid
+    # (normalmente ya pre-renderizado; si no, espera el trabajo en curso o renderiza acá)
     if generar_pdf_v3_1:
-        pdf_final, verification_uuid = generar_pdf_v3_1(final_data, preview=False, full=True)
+        pdf_final, verification_uuid = pdf_prerender_result(final_data, scope=sess_ref,
+                                                            verification_uuid=prev_uuid)
+        st.session_state["pdf_final_key"] = pdf_key
         st.session_state["verification_uuid"] = verification_uuid
     else:
-        pdf_final = generar_pdf(final_data, preview=False, full=True)
+        pdf_final, _ = pdf_cache().get_or_render(
+            pdf_fingerprint(final_data, _lang(), "legacy", sess_ref),
+            lambda: (generar_pdf(final_data, preview=False, full=True), None))
         verification_uuid = None
         st.session_state["verification_uuid"] = None
     pdf_id = f"PDF-{payload['timestamp']}-{payload['email']}"
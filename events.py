@@ -0,0 +1,324 @@
+# events.py — API única de eventos para el logging a Google Sheets
+# Cada punto de logging (calculadora, registro, bridges) emite un evento tipado.
+# Durante una corrida del script (rerun de Streamlit) los eventos se acumulan en un
+# buffer por hilo, cada uno con el contexto de sesión tal como estaba al emitirse; al
+# terminar, cada evento se convierte en fila(s) según la tabla de ruteo y todo el lote
+# multi-pestaña entra al outbox en una sola transacción (sheets_writer.enqueue_rows).
+# Fuera de un batch (on_click, scripts) emit() escribe en el momento.
+# Los callbacks on_written de emit() corren recién cuando el lote quedó escrito (outbox o
+# Sheets): ahí van los flags de dedupe de la sesión, no al bufferizar.
+
+import functools
+import threading
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from gsheets import FUNNEL_PROGRESS_TAB, INTEROPERABILITY_TAB, append_rows_multi
+from sheets_writer import enqueue_rows, idempotency_key
+
+APP_VERSION_V3 = "V3.1"
+
+
+# ---------- Contexto de sesión (enriquecimiento) ----------
+@dataclass(frozen=True)
+class SessionContext:
+    """Snapshot de st.session_state tomado en emit() (el builder no lee la sesión al flush)."""
+    sess_ref: str = ""
+    idioma: str = "ES"
+    email: str = ""
+    browser_lang: str = ""
+    idioma_autodetected: bool = False
+    user_agent: str = ""
+    country: str = ""
+    logo_faded: bool = False
+    state: Mapping[str, Any] = field(default_factory=lambda: MappingProxyType({}))
+
+    @classmethod
+    def from_state(cls, state: Any = None) -> "SessionContext":
+        if state is None:
+            try:
+                import streamlit as st
+                state = st.session_state
+            except Exception:
+                state = {}
+        try:
+            snap = dict(state.to_dict()) if hasattr(state, "to_dict") else dict(state)
+        except Exception:
+            snap = {}
+        idioma = snap.get("idioma", "ES") or "ES"
+        return cls(
+            sess_ref=str(snap.get("sess_ref", "") or ""),
+            idioma=idioma,
+            email=str(snap.get("email", "") or ""),
+            browser_lang=snap.get("browser_lang", idioma),
+            idioma_autodetected=bool(snap.get("idioma_autodetected", False)),
+            user_agent=str(snap.get("user_agent", "") or ""),
+            country=str(snap.get("country", "") or ""),
+            logo_faded=bool(snap.get("logo_faded", False)),
+            state=MappingProxyType(snap),
+        )
+
+
+# ---------- Eventos tipados ----------
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@dataclass(frozen=True)
+class Event:
+    at: datetime = field(default_factory=_utc_now, kw_only=True)  # momento del emit
+    ctx: Optional[SessionContext] = field(default=None, kw_only=True, compare=False, repr=False)
+    kind = "event"
+
+    @property
+    def ts(self) -> str:
+        return self.at.strftime("%Y-%m-%d %H:%M:%S")
+
+
+@dataclass(frozen=True)
+class StepEvent(Event):
+    """Paso del embudo en LOG_TAB (log_step_once)."""
+    step: str
+    payload: Mapping[str, Any] = field(default_factory=dict)
+    extras: Mapping[str, Any] = field(default_factory=dict)
+    kind = "step"
+
+
+@dataclass(frozen=True)
+class EvaluationEvent(Event):
+    """Fila extendida de evaluación en LOG_TAB (_append_row_extended)."""
+    canal: str
+    payload: Mapping[str, Any] = field(default_factory=dict)
+    extras: Mapping[str, Any] = field(default_factory=dict)
+    kind = "evaluacion"
+
+
+@dataclass(frozen=True)
+class FeedbackEvent(Event):
+    """Emoji/comentario de satisfacción en V3_Funnel_Progress."""
+    step: str
+    emoji: str
+    comment: str = ""
+    kind = "feedback"
+
+
+@dataclass(frozen=True)
+class InteropEvent(Event):
+    """Evento técnico en V3_Interoperability_Log."""
+    request_data: str
+    response_data: str
+    stage: str = ""
+    substage: str = ""
+    kind = "interop"
+
+
+@dataclass(frozen=True)
+class RowEvent(Event):
+    """Fila ya armada para una pestaña concreta (registro y bridges con layout propio)."""
+    row: Tuple[Any, ...]
+    tab: str
+    tab_gid: Optional[int] = None
+    value_input_option: str = "RAW"
+    idem_key: Optional[bytes] = None
+    kind = "row"
+
+
+# ---------- Tabla de ruteo ----------
+Builder = Callable[[Any, SessionContext], Tuple[List[Any], Optional[bytes]]]
+
+
+class Route(NamedTuple):
+    tab: str
+    build: Builder
+    tab_gid: Optional[int] = None
+    value_input_option: str = "RAW"
+
+
+ROUTES: Dict[str, List[Route]] = {}
+
+
+def route(kind: str, tab: str, tab_gid: Optional[int] = None,
+          value_input_option: str = "RAW") -> Callable[[Builder], Builder]:
+    """Decorador: registra 'build(event, ctx) -> (row, idem_key)' para el tipo 'kind' en 'tab'."""
+    def deco(fn: Builder) -> Builder:
+        routes = ROUTES.setdefault(kind, [])
+        routes[:] = [r for r in routes if r.tab != tab]  # re-import (Streamlit): reemplaza
+        routes.append(Route(tab, fn, tab_gid, value_input_option))
+        return fn
+    return deco
+
+
+@route("feedback", FUNNEL_PROGRESS_TAB)
+def _feedback_row(ev: FeedbackEvent, ctx: SessionContext) -> Tuple[List[Any], Optional[bytes]]:
+    comment = ev.comment.strip()
+    row = [
+        ev.ts,  # Timestamp
+        ev.emoji if ev.step == "step1" else "",  # satisfaction_step1
+        ev.comment if ev.step == "step1" else "",  # satisfaction_step1_comment
+        ev.emoji if ev.step == "step2" else "",  # satisfaction_step2
+        ev.comment if ev.step == "step2" else "",  # satisfaction_step2_comment
+        ctx.sess_ref,  # session_id
+        "",  # user_agent (optional)
+        "",  # country (optional)
+        ctx.email,  # doctor_email
+        "feedback",  # stage
+        ev.step,  # substage
+        ev.ts,  # last_contact_at
+        "",  # next_contact_at
+        "",  # contact_attempts
+        "",  # sequence_name
+        "",  # wa_template
+        APP_VERSION_V3,  # app_version
+        ctx.idioma,  # idioma_ui
+        str(ctx.logo_faded),  # logo_fade_triggered
+        "",  # scroll_events
+    ]
+    return row, idempotency_key(ctx.sess_ref, f"funnel_{ev.step}_{ev.emoji}", {"comment": comment})
+
+
+@route("interop", INTEROPERABILITY_TAB)
+def _interop_row(ev: InteropEvent, ctx: SessionContext) -> Tuple[List[Any], Optional[bytes]]:
+    row = [
+        ev.ts,  # Timestamp
+        ev.request_data,  # Request_Data (JSON string)
+        ev.response_data,  # Response_Data (JSON string)
+        APP_VERSION_V3,  # App_Version
+        ctx.browser_lang,  # Browser_Lang
+        str(ctx.idioma_autodetected),  # Idioma_Detected
+        ctx.sess_ref,  # Session_ID
+        ctx.user_agent,  # User_Agent
+        ctx.country,  # Country
+        ev.stage,  # Stage
+        ev.substage,  # Substage
+    ]
+    return row, idempotency_key(ctx.sess_ref, f"interop_{ev.stage}_{ev.substage}",
+                                {"request": ev.request_data, "response": ev.response_data})
+
+
+def _build(ev: Event, ctx: SessionContext) -> List[Tuple[Any, ...]]:
+    """Evento → items (row, tab, tab_gid, value_input_option, idem_key) según ROUTES."""
+    if isinstance(ev, RowEvent):
+        return [(list(ev.row), ev.tab, ev.tab_gid, ev.value_input_option, ev.idem_key)]
+    items: List[Tuple[Any, ...]] = []
+    for r in ROUTES.get(ev.kind, []):
+        row, idem = r.build(ev, ctx)
+        items.append((row, r.tab, r.tab_gid, r.value_input_option, idem))
+    return items
+
+
+# ---------- Buffer por corrida ----------
+_local = threading.local()
+
+
+def _write(events: List[Event], state: Any = None) -> bool:
+    if not events:
+        return True
+    fallback: Optional[SessionContext] = None  # eventos sin snapshot (construidos a mano)
+    items: List[Tuple[Any, ...]] = []
+    for ev in events:
+        ctx = ev.ctx
+        if ctx is None:
+            if fallback is None:
+                fallback = SessionContext.from_state(state)
+            ctx = fallback
+        try:
+            items.extend(_build(ev, ctx))
+        except Exception:
+            pass  # un builder roto no tira el resto del lote
+    if not items:
+        return True
+    if enqueue_rows(items):
+        return True
+    # Outbox local no disponible: escritura directa, todo el lote en una sola llamada.
+    # wait_s=0: un solo intento si hay token de cuota; el hilo de la UI nunca espera a Google.
+    groups: Dict[Tuple[str, Optional[int], str], List[Any]] = {}
+    for row, tab, gid, vio, _idem in items:
+        groups.setdefault((tab, gid, vio), []).append(row)
+    return append_rows_multi([(rows, tab, gid, vio) for (tab, gid, vio), rows in groups.items()],
+                             wait_s=0)[0]
+
+
+def _run_callbacks(callbacks: List[Callable[[], Any]]) -> None:
+    for cb in callbacks:
+        try:
+            cb()
+        except Exception:
+            pass
+
+
+def emit(event: Event, on_written: Optional[Callable[[], Any]] = None) -> bool:
+    """
+    Registra un evento con el contexto de sesión de este momento. Dentro de un batch se
+    acumula (True = aceptado, todavía no escrito); fuera se escribe ya. on_written corre
+    sólo cuando el evento quedó escrito.
+    """
+    if event.ctx is None and not isinstance(event, RowEvent):  # RowEvent ya trae su fila
+        event = replace(event, ctx=SessionContext.from_state())
+    buf = getattr(_local, "buffer", None)
+    if buf is not None:
+        buf.append(event)
+        if on_written is not None:
+            _local.on_written.append(on_written)
+        return True
+    try:
+        ok = _write([event])
+    except Exception:
+        ok = False
+    if ok and on_written is not None:
+        _run_callbacks([on_written])
+    return ok
+
+
+def pending() -> int:
+    buf = getattr(_local, "buffer", None)
+    return len(buf) if buf is not None else 0
+
+
+def flush() -> bool:
+    """Escribe lo acumulado en el batch actual (si lo hay) y vacía el buffer."""
+    buf = getattr(_local, "buffer", None)
+    if not buf:
+        return True
+    events = list(buf)
+    callbacks = list(_local.on_written)
+    buf.clear()
+    _local.on_written.clear()
+    try:
+        ok = _write(events)
+    except Exception:
+        ok = False
+    if ok:
+        _run_callbacks(callbacks)
+    return ok
+
+
+class batch:
+    """
+    Context manager / decorador: acumula los eventos de una corrida y los escribe al salir
+    (también si el script corta con st.rerun() / st.stop(), que lanzan excepción).
+    Anidado: sólo el más externo escribe.
+    """
+
+    def __enter__(self) -> "batch":
+        self._outer = getattr(_local, "buffer", None) is None
+        if self._outer:
+            _local.buffer = []
+            _local.on_written = []
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        if self._outer:
+            try:
+                flush()
+            finally:
+                _local.buffer = None
+                _local.on_written = []
+
+    def __call__(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with batch():
+                return fn(*args, **kwargs)
+        return wrapper
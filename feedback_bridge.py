@@ -1,5 +1,7 @@
 # feedback_bridge.py
-from gsheets import append_row_safe, utc_now_str
+from gsheets import utc_now_str
+from events import RowEvent, emit
+from sheets_writer import idempotency_key
 
 def registrar_feedback(
     session_id,
@@ -23,12 +25,11 @@ def registrar_feedback(
             step            # step1, step2…
         ]
 
-        ok, svc = append_row_safe(
-            payload,
+        return emit(RowEvent(
+            tuple(payload),
             tab="Final_Progress",
-            tab_gid=404698208  # VALIDAMOS MAÑANA
-        )
-
-        return ok
+            tab_gid=404698208,  # VALIDAMOS MAÑANA
+            idem_key=idempotency_key(session_id, f"feedback_{step}", payload[1:]),
+        ))
     except:
         return False
@@ -1,5 +1,7 @@
 # funnel_bridge.py
-from gsheets import append_row_safe, utc_now_str
+from gsheets import utc_now_str
+from events import RowEvent, emit
+from sheets_writer import idempotency_key
 import streamlit as st
 
 def registrar_funnel(
@@ -21,13 +23,12 @@ def registrar_funnel(
             user_agent,               # user_agent
         ]
 
-        ok, svc = append_row_safe(
-            payload,
+        return emit(RowEvent(
+            tuple(payload),
             tab="V3_Funnel_Progress",
-            tab_gid=404698208   # LO VALIDAMOS MAÑANA
-        )
-
-        return ok
+            tab_gid=404698208,  # LO VALIDAMOS MAÑANA
+            idem_key=idempotency_key(session_id, f"funnel_{stage}", payload[1:]),
+        ))
 
     except Exception:
         return False
@@ -1,7 +1,8 @@
 # gsheets.py — utilidades robustas para Google Sheets (descarta eventos cortos)
 import json
+import math
 import os
-import time
+import threading
 from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional, Tuple
 
@@ -9,6 +10,11 @@ import gspread
 import streamlit as st
 from google.oauth2.service_account import Credentials
 
+from sheets_backend import LocalBackend, backend_from_env
+from sheets_partition import base_tab, resolve_tab
+from sheets_quota import get_scheduler
+from sheets_schema import TabSchema, get_registry, register_schema
+
 # === TU SPREADSHEET ===
 SHEET_KEY = "12PC1-vv-RIPDDs0O07Xg0ZoAFH7H6npJSnDDpUtPkJQ"
 
@@ -76,51 +82,194 @@ def _load_credentials() -> Tuple[Optional[Credentials], Optional[str]]:
     creds = Credentials.from_service_account_info(info, scopes=SCOPES)
     return creds, info.get("client_email")
 
-def _open_sheet_and_tab(tab_title: str = LOG_TAB_TITLE, tab_gid: Optional[int] = LOG_TAB_GID) -> Tuple[Optional[gspread.Worksheet], Optional[str]]:
-    creds, svc_email = _load_credentials()
-    if not creds:
-        return None, svc_email
-    gc = gspread.authorize(creds)
-    sh = gc.open_by_key(SHEET_KEY)
-
-    ws: Optional[gspread.Worksheet] = None
-    if tab_gid:
+# Headers declarados: se verifican al abrir la pestaña (sheets_schema) y se inicializan si está vacía
+register_schema(INTEROPERABILITY_TAB, INTEROPERABILITY_HEADERS)
+register_schema(FUNNEL_PROGRESS_TAB, FUNNEL_PROGRESS_HEADERS)
+register_schema(EVALUACIONES_TAB, EVALUACIONES_HEADERS)
+_SCHEMAS = get_registry()
+
+
+class SheetsPool:
+    """
+    Conexión compartida a Google Sheets para todo el proceso.
+    Mantiene las credenciales, el cliente autorizado, los spreadsheets abiertos
+    y los objetos Worksheet por pestaña; el token se refresca en el lugar.
+    Thread-safe: todas las sesiones de Streamlit comparten la misma instancia.
+    Con SHEETS_BACKEND (sheets_backend) usa un backend local en lugar de Google.
+    """
+
+    def __init__(self, backend: Optional[LocalBackend] = None) -> None:
+        self._lock = threading.RLock()
+        self._backend = backend if backend is not None else backend_from_env()
+        self._creds: Optional[Credentials] = None
+        self._svc_email: Optional[str] = None
+        self._creds_loaded = False
+        self._client: Optional[gspread.Client] = None
+        self._spreadsheets: Dict[str, gspread.Spreadsheet] = {}
+        self._worksheets: Dict[Tuple[str, str], gspread.Worksheet] = {}
+
+    def use_backend(self, backend: Optional[LocalBackend]) -> None:
+        """Cambia de backend (None = Google Sheets) y descarta lo cacheado."""
+        with self._lock:
+            self._backend = backend
+            self._client = None
+            self._spreadsheets.clear()
+            self._worksheets.clear()
+            _SCHEMAS.invalidate_all()
+
+    def _ensure_creds(self) -> Optional[Credentials]:
+        if not self._creds_loaded:
+            self._creds, self._svc_email = _load_credentials()
+            # Si todavía no hay credenciales se vuelve a intentar en la próxima llamada
+            self._creds_loaded = self._creds is not None
+        return self._creds
+
+    def _refresh_if_needed(self) -> None:
+        # Refresca el access token del mismo objeto Credentials que usa el cliente,
+        # así no hace falta re-autorizar ni reabrir spreadsheets/pestañas.
+        creds = self._creds
+        if creds is None or creds.valid:
+            return
         try:
-            ws = sh.get_worksheet_by_id(tab_gid)
+            from google.auth.transport.requests import Request
+            creds.refresh(Request())
         except Exception:
-            ws = None
-    if ws is None:
-        try:
-            ws = sh.worksheet(tab_title)
-        except gspread.WorksheetNotFound:
-            ws = sh.add_worksheet(title=tab_title, rows=2000, cols=50)
-            
-            # Initialize headers for new feedback sheets - write directly to row 1
-            if tab_title == INTEROPERABILITY_TAB:
+            pass  # el AuthorizedSession de gspread reintentará el refresh
+
+    def service_email(self) -> Optional[str]:
+        with self._lock:
+            if self._backend is not None:
+                return self._backend.service_email
+            self._ensure_creds()
+            return self._svc_email
+
+    def client(self) -> Optional[gspread.Client]:
+        with self._lock:
+            if self._backend is not None:
+                if self._client is None:
+                    self._client = self._backend.client()
+                return self._client
+            creds = self._ensure_creds()
+            if creds is None:
+                return None
+            if self._client is None:
+                self._client = gspread.authorize(creds)
+            self._refresh_if_needed()
+            return self._client
+
+    def spreadsheet(self, key: str = SHEET_KEY) -> Optional[gspread.Spreadsheet]:
+        with self._lock:
+            gc = self.client()
+            if gc is None:
+                return None
+            sh = self._spreadsheets.get(key)
+            if sh is None:
+                sh = gc.open_by_key(key)
+                self._spreadsheets[key] = sh
+            return sh
+
+    def worksheet(
+        self,
+        tab_title: str,
+        tab_gid: Optional[int] = None,
+        *,
+        key: str = SHEET_KEY,
+        create: bool = True,
+        cols: int = 50,
+    ) -> Optional[gspread.Worksheet]:
+        """
+        Devuelve la pestaña cacheada; la primera vez la abre (por gid o título),
+        la crea si no existe y carga su header en el registro de esquemas. Luego: cero round trips.
+        """
+        cache_key = (key, tab_title)
+        with self._lock:
+            ws = self._worksheets.get(cache_key)
+            if ws is not None:
+                self._refresh_if_needed()
+                return ws
+
+            sh = self.spreadsheet(key)
+            if sh is None:
+                return None
+
+            if tab_gid:
                 try:
-                    ws.update(range_name="A1", values=[INTEROPERABILITY_HEADERS])
+                    ws = sh.get_worksheet_by_id(tab_gid)
                 except Exception:
-                    pass  # If headers fail, append_row_safe will handle empty headers
-            elif tab_title == FUNNEL_PROGRESS_TAB:
+                    ws = None
+            if ws is None:
                 try:
-                    ws.update(range_name="A1", values=[FUNNEL_PROGRESS_HEADERS])
-                except Exception:
-                    pass
-    
-    # Ensure existing sheets have headers
-    if ws and tab_title in (INTEROPERABILITY_TAB, FUNNEL_PROGRESS_TAB):
-        try:
-            headers = ws.row_values(1)
-            if not headers or all(not h for h in headers):
-                # Sheet exists but has no headers - write directly to row 1
-                if tab_title == INTEROPERABILITY_TAB:
-                    ws.update(range_name="A1", values=[INTEROPERABILITY_HEADERS])
-                elif tab_title == FUNNEL_PROGRESS_TAB:
-                    ws.update(range_name="A1", values=[FUNNEL_PROGRESS_HEADERS])
-        except Exception:
-            pass  # Continue even if header check/init fails
-            
-    return ws, svc_email
+                    ws = sh.worksheet(tab_title)
+                except gspread.WorksheetNotFound:
+                    if not create:
+                        return None
+                    ws = sh.add_worksheet(title=tab_title, rows=2000, cols=cols)
+
+            # Una sola lectura de headers por proceso (no por escritura): init / re-sync / drift
+            try:
+                _SCHEMAS.load(ws, tab_title, key)
+            except Exception:
+                pass  # Continue even if header check/init fails
+
+            self._worksheets[cache_key] = ws
+            return ws
+
+    def invalidate(self, tab_title: Optional[str] = None, key: str = SHEET_KEY) -> None:
+        """Olvida una pestaña (o todo el spreadsheet) para reabrirla en el próximo uso."""
+        with self._lock:
+            if tab_title is None:
+                self._spreadsheets.pop(key, None)
+                for k in [k for k in self._worksheets if k[0] == key]:
+                    self._worksheets.pop(k, None)
+            else:
+                self._worksheets.pop((key, tab_title), None)
+            _SCHEMAS.invalidate(tab_title, key)
+
+
+_POOL = SheetsPool()
+
+
+def get_pool() -> SheetsPool:
+    return _POOL
+
+
+def _open_sheet_and_tab(tab_title: str = LOG_TAB_TITLE, tab_gid: Optional[int] = LOG_TAB_GID) -> Tuple[Optional[gspread.Worksheet], Optional[str]]:
+    ws = _POOL.worksheet(tab_title, tab_gid)
+    return ws, _POOL.service_email()
+
+# --- detección de "evento corto" (solo etiquetas técnicas) ---
+def _is_short_event(_row: Any) -> bool:
+    # Texto concatenado de la fila (soporta list o dict)
+    if isinstance(_row, dict):
+        parts = [str(v) for v in _row.values()]
+    else:
+        parts = ["" if v is None else str(v) for v in (_row or [])]
+    text = " ".join(parts).lower()
+
+    # Solo filtramos eventos técnicos explícitos
+    tags = ("session_open", "share_click", "share_done")
+    return any(t in text for t in tags)
+
+
+def _schema(ws: gspread.Worksheet, tab: str) -> TabSchema:
+    """Header cacheado de la pestaña (sin round trip salvo TTL vencido)."""
+    return _SCHEMAS.get(ws, tab, SHEET_KEY)
+
+
+# Motivo de falla de los envíos por lote (3er valor de append_rows_safe / append_rows_multi)
+FAIL_THROTTLE = "throttle"  # 429 o sin token de cuota: reintentar tras la pausa, sin contar intento
+FAIL_ERROR = "error"        # error común: backoff por fila (outbox.mark_failed)
+FAIL_AMBIGUOUS = "ambiguous"  # timeout/5xx del envío mismo: pudo haber entrado, no reenviar
+
+
+def _may_have_landed(exc: Exception) -> bool:
+    """True si el error es ambiguo: el append pudo haberse aplicado (timeout de lectura, 5xx)."""
+    if "timeout" in type(exc).__name__.lower():
+        return True
+    resp = getattr(exc, "response", None)
+    status = getattr(resp, "status_code", None)
+    return isinstance(status, int) and status >= 500
+
 
 def append_row_safe(row: List[Any], tab: str = LOG_TAB_TITLE, tab_gid: Optional[int] = LOG_TAB_GID) -> Tuple[bool, Optional[str]]:
     """
@@ -129,58 +278,170 @@ def append_row_safe(row: List[Any], tab: str = LOG_TAB_TITLE, tab_gid: Optional[
     - Si llega una lista: se recortan vacíos a la izquierda y se ajusta al largo del header.
     Además: si el destino es la pestaña principal y la fila parece un EVENTO corto,
     se descarta silenciosamente (para que sólo queden filas de calculadora.py).
+    Nunca duerme en el hilo que llama: sin token de cuota (sheets_quota) o ante un error
+    reintentable, la fila se deja en el outbox y la envía el worker de sheets_writer.
+    Las pestañas particionadas (sheets_partition) se escriben en la partición del mes.
+    Si el append mismo falla de forma ambigua (timeout/5xx: pudo haber entrado), la fila se
+    guarda en el outbox como 'dead' con su clave de idempotencia para revisarla, no se reenvía.
     """
 
-    for attempt in range(3):
-        try:
-            ws, svc = _open_sheet_and_tab(tab, tab_gid)
-            if not ws:
-                return False, svc
-
-            headers = ws.row_values(1)     # encabezados existentes en la Sheet
-            n = len(headers)
-
-            # --- detección de "evento corto" (solo etiquetas técnicas) ---
-            def _is_short_event(_row: Any) -> bool:
-                # Texto concatenado de la fila (soporta list o dict)
-                if isinstance(_row, dict):
-                    parts = [str(v) for v in _row.values()]
-                else:
-                    parts = ["" if v is None else str(v) for v in (_row or [])]
-                text = " ".join(parts).lower()
-
-                # Solo filtramos eventos técnicos explícitos
-                tags = ("session_open", "share_click", "share_done")
-                return any(t in text for t in tags)
-
-
-            # Si estamos escribiendo en la pestaña grande y la fila luce "evento", NO escribir
-            if tab == LOG_TAB_TITLE and _is_short_event(row):
-                return True, svc  # éxito falso: no insertamos nada
-
-            # --- normalización de valores para escritura ---
-            if isinstance(row, dict):
-                values = [row.get(h, "") for h in headers]
-            else:
-                values = list(row) if row is not None else []
-                # Quitar vacíos a la izquierda (evita corrimientos)
-                while values and (values[0] is None or str(values[0]).strip() == ""):
-                    values.pop(0)
-                # Ajustar al largo del header
-                if len(values) < n:
-                    values.extend([""] * (n - len(values)))
-                elif len(values) > n:
-                    values = values[:n]
-
-            ws.append_row(values)
+    svc: Optional[str] = None
+    sched = get_scheduler()
+    tab, tab_gid = resolve_tab(tab, tab_gid)
+    sending = False
+    try:
+        ws, svc = _open_sheet_and_tab(tab, tab_gid)
+        if not ws:
+            return False, svc
+
+        # Si estamos escribiendo en la pestaña grande y la fila luce "evento", NO escribir
+        if base_tab(tab) == LOG_TAB_TITLE and _is_short_event(row):
+            return True, svc  # éxito falso: no insertamos nada
+
+        if sched.try_acquire():
+            fitted = _schema(ws, tab).fit(row)
+            sending = True
+            ws.append_row(fitted)
+            sending = False
+            sched.on_success()
             return True, svc
 
-        except Exception:
-            if attempt < 2:
-                time.sleep(1.5 + attempt * 0.5)  # backoff
+    except Exception as e:
+        if not sched.on_error(e):
+            _POOL.invalidate(tab)  # pestaña borrada/renombrada: reabrir en el reintento
+        if sending and _may_have_landed(e):
+            # Reintentar podría duplicar la fila: queda guardada para revisión, no se reenvía
+            from sheets_writer import idempotency_key, park_row
+            park_row(row, tab, tab_gid, idem_key=idempotency_key("append_row_safe", tab, row),
+                     error=f"{type(e).__name__}: {e}")
+            return False, svc
+
+    # Cuota agotada o error transitorio: lo agenda el worker (import local: sheets_writer importa gsheets)
+    from sheets_writer import enqueue_row
+    return enqueue_row(row, tab, tab_gid), svc
+
+
+def append_rows_safe(
+    rows: List[Any],
+    tab: str = LOG_TAB_TITLE,
+    tab_gid: Optional[int] = LOG_TAB_GID,
+    value_input_option: str = "RAW",
+    wait_s: float = 30.0,
+) -> Tuple[bool, Optional[str], Optional[str]]:
+    """
+    Igual que append_row_safe pero para un lote: un solo append_rows por pestaña.
+    Un único intento: espera hasta 'wait_s' un token de cuota (sólo lo llama el worker
+    de sheets_writer, nunca el hilo de la UI); los reintentos quedan a cargo del outbox.
+    Devuelve (ok, service_email, motivo): motivo None si ok, si no FAIL_*.
+    """
+    svc: Optional[str] = None
+    sched = get_scheduler()
+    tab, tab_gid = resolve_tab(tab, tab_gid)  # una partición ya resuelta vuelve igual
+    sending = False
+    try:
+        ws, svc = _open_sheet_and_tab(tab, tab_gid)
+        if not ws:
+            return False, svc, FAIL_ERROR
+
+        if base_tab(tab) == LOG_TAB_TITLE:
+            rows = [r for r in rows if not _is_short_event(r)]
+        if not rows:
+            return True, svc, None
+
+        if not sched.acquire(wait_s):
+            return False, svc, FAIL_THROTTLE
+        sch = _schema(ws, tab)
+        fitted = [sch.fit(r) for r in rows]
+        sending = True
+        ws.append_rows(fitted, value_input_option=value_input_option)
+        sending = False
+        sched.on_success()
+        return True, svc, None
+    except Exception as e:
+        if sched.on_error(e):
+            return False, svc, FAIL_THROTTLE
+        _POOL.invalidate(tab)
+        return False, svc, FAIL_AMBIGUOUS if sending and _may_have_landed(e) else FAIL_ERROR
+
+def _cell(value: Any, user_entered: bool) -> Dict[str, Any]:
+    """Valor de celda para AppendCellsRequest (equivalente a RAW / USER_ENTERED de values.append)."""
+    if value is None or value == "":
+        return {}
+    if isinstance(value, bool):
+        return {"userEnteredValue": {"boolValue": value}}
+    if isinstance(value, int) or (isinstance(value, float) and math.isfinite(value)):
+        return {"userEnteredValue": {"numberValue": value}}
+    text = str(value)  # NaN/inf no son JSON válido: irían a rechazar todo el batchUpdate
+    if user_entered:
+        if text.startswith("="):
+            return {"userEnteredValue": {"formulaValue": text}}
+        if text.upper() in ("TRUE", "FALSE"):
+            return {"userEnteredValue": {"boolValue": text.upper() == "TRUE"}}
+        try:
+            num = float(text)
+            if math.isfinite(num):
+                return {"userEnteredValue": {"numberValue": num}}
+        except ValueError:
+            pass
+    return {"userEnteredValue": {"stringValue": text}}
+
+
+def append_rows_multi(
+    batches: List[Tuple[List[Any], str, Optional[int], str]],
+    wait_s: float = 30.0,
+) -> Tuple[bool, Optional[str], Optional[str]]:
+    """
+    Agrega filas a varias pestañas de SHEET_KEY en UNA sola llamada a la API:
+    spreadsheets.batchUpdate con un AppendCellsRequest por pestaña (atómico: entra todo o nada).
+    batches: [(rows, tab, tab_gid, value_input_option), ...]. Igual que append_rows_safe:
+    un intento, un token de cuota y los reintentos quedan a cargo del outbox; mismo
+    (ok, service_email, motivo).
+    Las pestañas particionadas se resuelven a la partición del mes (las ya resueltas por
+    sheets_writer vuelven igual), como en append_row_safe.
+    Nota: USER_ENTERED se aproxima (números, booleanos y fórmulas); fechas quedan como texto.
+    """
+    svc: Optional[str] = _POOL.service_email()
+    sched = get_scheduler()
+    tabs: List[str] = []
+    sending = False
+    try:
+        sh = _POOL.spreadsheet(SHEET_KEY)
+        if sh is None:
+            return False, svc, FAIL_ERROR
+        requests_: List[Dict[str, Any]] = []
+        for rows, tab, tab_gid, vio in batches:
+            tab, tab_gid = resolve_tab(tab, tab_gid)
+            tabs.append(tab)
+            ws = _POOL.worksheet(tab, tab_gid)
+            if ws is None:
+                return False, svc, FAIL_ERROR
+            if base_tab(tab) == LOG_TAB_TITLE:
+                rows = [r for r in rows if not _is_short_event(r)]
+            if not rows:
                 continue
+            sch = _schema(ws, tab)
+            user_entered = vio == "USER_ENTERED"
+            requests_.append({"appendCells": {
+                "sheetId": ws.id,
+                "rows": [{"values": [_cell(v, user_entered) for v in sch.fit(r)]} for r in rows],
+                "fields": "userEnteredValue",
+            }})
+        if not requests_:
+            return True, svc, None
 
-    return False, svc
+        if not sched.acquire(wait_s):
+            return False, svc, FAIL_THROTTLE
+        sending = True
+        sh.batch_update({"requests": requests_})
+        sending = False
+        sched.on_success()
+        return True, svc, None
+    except Exception as e:
+        if sched.on_error(e):
+            return False, svc, FAIL_THROTTLE
+        for tab in tabs:
+            _POOL.invalidate(tab)
+        return False, svc, FAIL_AMBIGUOUS if sending and _may_have_landed(e) else FAIL_ERROR
 
 # Aliases de compatibilidad
 def append_row(row: List[Any], tab: Optional[str] = None, tab_gid: Optional[int] = None) -> Tuple[bool, Optional[str]]:
@@ -193,8 +454,7 @@ def utc_now_str() -> str:
     return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
 
 def service_account_email() -> Optional[str]:
-    _, svc = _load_credentials()
-    return svc or ""
+    return _POOL.service_email() or ""
 
 
 # ============ AestheticSafe 3.0 - Feedback Logging ============
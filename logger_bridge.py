@@ -2,7 +2,9 @@
 # Módulo PUENTE ultra-seguro que envía registros a Google Sheets
 # No modifica nada del proyecto ni requiere cambios internos
 
-from gsheets import append_row_safe, utc_now_str
+from gsheets import utc_now_str
+from events import RowEvent, emit
+from sheets_writer import idempotency_key
 import streamlit as st
 
 def registrar_evento_bridge(
@@ -15,7 +17,7 @@ def registrar_evento_bridge(
 ):
     """
     NO CRASHEA. Si algo falla → devuelve False sin romper la UI.
-    Es un puente aislado a append_row_safe().
+    Es un puente aislado a la cola write-behind (sheets_writer).
     """
 
     try:
@@ -33,13 +35,13 @@ def registrar_evento_bridge(
             substage                                      # Substage
         ]
 
-        ok, svc = append_row_safe(
-            payload,
+        # Evento de fila: sale en el lote de la corrida (events) por el outbox, deduplicado por sesión
+        return emit(RowEvent(
+            tuple(payload),
             tab="V3_Interoperability_Log",
-            tab_gid=831016227
-        )
-
-        return ok
+            tab_gid=831016227,
+            idem_key=idempotency_key(session_id, f"bridge_{stage}_{substage}", payload[1:]),
+        ))
 
     except Exception:
         return False
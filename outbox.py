@@ -0,0 +1,362 @@
+# outbox.py — outbox local durable (SQLite en modo WAL) para el logging a Google Sheets
+# Todo evento se escribe primero acá (commit local, ~ms) y después el worker de
+# sheets_writer lo drena a Sheets en lotes. Si Google falla, las filas quedan
+# 'pending' con backoff exponencial: una caída no pierde datos ni bloquea al usuario.
+#
+# Uso manual:
+#   python outbox.py stats
+#   python outbox.py import-csv share/events_fallback.csv --tab Calculadora_Evaluaciones
+#   python outbox.py requeue-dead
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+OUTBOX_PATH = os.getenv("SHEETS_OUTBOX_PATH", "share/sheets_outbox.db")
+
+BACKOFF_BASE_S = 2.0
+BACKOFF_MAX_S = 15 * 60.0
+MAX_ATTEMPTS = int(os.getenv("SHEETS_OUTBOX_MAX_ATTEMPTS", "12"))
+LEASE_S = 120.0  # si un worker muere con filas 'inflight', otro las retoma pasado este tiempo
+IDEM_TTL_S = float(os.getenv("SHEETS_IDEM_TTL_S", str(14 * 24 * 3600)))
+
+# Estados de entrega por fila
+PENDING, INFLIGHT, SENT, DEAD = "pending", "inflight", "sent", "dead"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id                 INTEGER PRIMARY KEY AUTOINCREMENT,
+    tab                TEXT    NOT NULL,
+    tab_gid            INTEGER,
+    value_input_option TEXT    NOT NULL DEFAULT 'RAW',
+    payload            TEXT    NOT NULL,
+    state              TEXT    NOT NULL DEFAULT 'pending',
+    attempts           INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at    REAL    NOT NULL DEFAULT 0,
+    created_at         REAL    NOT NULL,
+    sent_at            REAL,
+    last_error         TEXT,
+    claimed_by         TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_state_id ON outbox(state, id);
+CREATE TABLE IF NOT EXISTS idem (
+    key        BLOB    PRIMARY KEY,
+    expires_at INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Claves que cambian en cada intento y no forman parte de la identidad del evento
+_VOLATILE_KEYS = {"timestamp", "Timestamp", "timestamp_utc", "last_contact_at"}
+
+
+def idempotency_key(sess_ref: str, step: str, payload: Any = None) -> Optional[bytes]:
+    """
+    Clave de idempotencia de un evento: sess_ref + step + hash del payload.
+    16 bytes (blake2b) para que el índice sea compacto. Los timestamps se ignoran,
+    así un reintento o un rerun del mismo evento produce la misma clave.
+    Sin sess_ref devuelve None (no se deduplica: serían eventos de sesiones distintas).
+    """
+    if not sess_ref:
+        return None
+    if isinstance(payload, dict):
+        payload = {k: v for k, v in payload.items() if k not in _VOLATILE_KEYS}
+    body = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{sess_ref}\x1f{step}\x1f".encode("utf-8"))
+    h.update(body.encode("utf-8"))
+    return h.digest()
+
+
+@dataclass(frozen=True)
+class OutboxRow:
+    id: int
+    tab: str
+    tab_gid: Optional[int]
+    value_input_option: str
+    row: Any
+    attempts: int
+
+    @property
+    def key(self) -> Tuple[str, Optional[int], str]:
+        return (self.tab, self.tab_gid, self.value_input_option)
+
+
+class Outbox:
+    """
+    Cola persistente multi-hilo y multi-proceso.
+    - Una conexión SQLite por hilo (WAL + busy_timeout): sesiones concurrentes escriben sin lockear.
+    - claim() toma filas con BEGIN IMMEDIATE, así dos procesos nunca envían la misma fila.
+    - Orden por pestaña: si una fila de una pestaña está en backoff, las siguientes esperan.
+    """
+
+    def __init__(self, path: str = OUTBOX_PATH) -> None:
+        self.path = path
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._local = threading.local()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    # ---------- Escritura (hilo de la UI) ----------
+    def put(self, row: Any, tab: str, tab_gid: Optional[int] = None,
+            value_input_option: str = "RAW", idem_key: Optional[bytes] = None,
+            *, state: str = PENDING, error: Optional[str] = None) -> int:
+        """
+        Inserta la fila. Con idem_key, primero la registra en el índice de idempotencia
+        (misma transacción): si ya existe y no expiró, es un duplicado y devuelve 0.
+        state=DEAD + error: la fila queda guardada para revisión manual, sin envío automático
+        (p.ej. un append ambiguo que pudo haber entrado; ver requeue-dead).
+        """
+        if idem_key is None and state == PENDING:
+            return self.put_many([(row, tab, tab_gid, value_input_option)])
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if idem_key is not None:
+                conn.execute(
+                    "INSERT INTO idem (key, expires_at) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at "
+                    "WHERE idem.expires_at < ?", (idem_key, int(now + IDEM_TTL_S), int(now)))
+                if conn.execute("SELECT changes()").fetchone()[0] == 0:
+                    conn.execute("COMMIT")
+                    return 0
+            conn.execute(
+                "INSERT INTO outbox (tab, tab_gid, value_input_option, payload, state, last_error, "
+                "created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (tab, tab_gid, value_input_option,
+                 json.dumps(row, ensure_ascii=False, default=str), state,
+                 (error or "")[:500] or None, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return 1
+
+    def seen(self, idem_key: bytes) -> bool:
+        row = self._conn().execute(
+            "SELECT 1 FROM idem WHERE key = ? AND expires_at >= ?",
+            (idem_key, int(time.time()))).fetchone()
+        return row is not None
+
+    def put_many(self, items: Iterable[Tuple[Any, ...]]) -> int:
+        """
+        Inserta varias filas en una sola transacción. Cada item es
+        (row, tab, tab_gid, value_input_option) o el mismo con idem_key al final;
+        los duplicados vivos se saltean. Devuelve cuántas filas se insertaron.
+        """
+        now = time.time()
+        items = list(items)
+        if not items:
+            return 0
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            params = []
+            for row, tab, gid, vio, *rest in items:
+                idem_key = rest[0] if rest else None
+                if idem_key is not None:
+                    conn.execute(
+                        "INSERT INTO idem (key, expires_at) VALUES (?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at "
+                        "WHERE idem.expires_at < ?", (idem_key, int(now + IDEM_TTL_S), int(now)))
+                    if conn.execute("SELECT changes()").fetchone()[0] == 0:
+                        continue
+                params.append((tab, gid, vio, json.dumps(row, ensure_ascii=False, default=str), now))
+            if params:
+                conn.executemany(
+                    "INSERT INTO outbox (tab, tab_gid, value_input_option, payload, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)", params)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(params)
+
+    # ---------- Drenado (worker) ----------
+    def claim(self, limit: int, *, due_only: bool = True) -> List[OutboxRow]:
+        """Marca hasta 'limit' filas como 'inflight' para este worker y las devuelve en orden."""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Por pestaña (tab, gid, vio), la fila más vieja en backoff o en vuelo en otro worker
+            # (lease vigente) es una barrera: no se adelantan filas más nuevas de esa pestaña.
+            # Se calcula por pestaña y no sobre una ventana de ids, así muchas filas viejas en
+            # backoff de una pestaña no dejan sin turno a las demás.
+            cur = conn.execute(
+                "WITH barrier AS ("
+                " SELECT tab, tab_gid, value_input_option, MIN(id) AS bid FROM outbox"
+                " WHERE state IN (?, ?) AND next_attempt_at > ? AND (state = ? OR ?)"
+                " GROUP BY tab, tab_gid, value_input_option) "
+                "SELECT o.id, o.tab, o.tab_gid, o.value_input_option, o.payload, o.attempts "
+                "FROM outbox o LEFT JOIN barrier b ON b.tab = o.tab AND b.tab_gid IS o.tab_gid"
+                " AND b.value_input_option = o.value_input_option "
+                "WHERE o.state IN (?, ?) AND (b.bid IS NULL OR o.id < b.bid) "
+                "ORDER BY o.id LIMIT ?",
+                (PENDING, INFLIGHT, now, INFLIGHT, 1 if due_only else 0, PENDING, INFLIGHT, limit))
+            picked = [OutboxRow(rid, tab, gid, vio, json.loads(payload), attempts)
+                      for rid, tab, gid, vio, payload, attempts in cur.fetchall()]
+            if picked:
+                conn.executemany(
+                    "UPDATE outbox SET state = ?, claimed_by = ?, next_attempt_at = ? WHERE id = ?",
+                    [(INFLIGHT, self.worker_id, now + LEASE_S, r.id) for r in picked])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return picked
+
+    def mark_sent(self, ids: List[int]) -> None:
+        if ids:
+            self._conn().executemany(
+                "UPDATE outbox SET state = ?, sent_at = ?, last_error = NULL WHERE id = ?",
+                [(SENT, time.time(), i) for i in ids])
+
+    def mark_failed(self, ids: List[int], error: str = "") -> None:
+        """Suma un intento y reprograma con backoff exponencial (con jitter); al máximo, 'dead'."""
+        if not ids:
+            return
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                f"SELECT id, attempts FROM outbox WHERE id IN ({','.join('?' * len(ids))})",
+                ids).fetchall()
+            updates = []
+            for rid, attempts in rows:
+                attempts += 1
+                delay = min(BACKOFF_MAX_S, BACKOFF_BASE_S * (2 ** (attempts - 1)))
+                delay *= random.uniform(0.8, 1.2)
+                state = DEAD if attempts >= MAX_ATTEMPTS else PENDING
+                updates.append((state, attempts, now + delay, error[:500], rid))
+            conn.executemany(
+                "UPDATE outbox SET state = ?, attempts = ?, next_attempt_at = ?, last_error = ? "
+                "WHERE id = ?", updates)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def mark_dead(self, ids: List[int], error: str = "") -> None:
+        """Pasa filas reclamadas a 'dead' sin reintento (envío ambiguo: revisar y requeue-dead)."""
+        if ids:
+            self._conn().executemany(
+                "UPDATE outbox SET state = ?, last_error = ? WHERE id = ?",
+                [(DEAD, error[:500], i) for i in ids])
+
+    def release(self, ids: List[int], not_before: float = 0.0) -> None:
+        """Devuelve filas reclamadas a 'pending' sin contar intento (p.ej. detrás de un lote fallido)."""
+        if ids:
+            self._conn().executemany(
+                "UPDATE outbox SET state = ?, next_attempt_at = ? WHERE id = ?",
+                [(PENDING, not_before, i) for i in ids])
+
+    # ---------- Mantenimiento ----------
+    def stats(self) -> Dict[str, int]:
+        out = {PENDING: 0, INFLIGHT: 0, SENT: 0, DEAD: 0}
+        conn = self._conn()
+        for state, n in conn.execute(
+                "SELECT state, COUNT(*) FROM outbox GROUP BY state"):
+            out[state] = n
+        out["idem_keys"] = conn.execute("SELECT COUNT(*) FROM idem").fetchone()[0]
+        return out
+
+    def pending_count(self) -> int:
+        row = self._conn().execute(
+            "SELECT COUNT(*) FROM outbox WHERE state IN (?, ?)", (PENDING, INFLIGHT)).fetchone()
+        return int(row[0]) if row else 0
+
+    def purge_sent(self, older_than_s: float = 7 * 24 * 3600.0) -> int:
+        conn = self._conn()
+        cur = conn.execute(
+            "DELETE FROM outbox WHERE state = ? AND sent_at < ?", (SENT, time.time() - older_than_s))
+        # Evicción TTL del índice de idempotencia
+        conn.execute("DELETE FROM idem WHERE expires_at < ?", (int(time.time()),))
+        return cur.rowcount or 0
+
+    def requeue_dead(self) -> int:
+        cur = self._conn().execute(
+            "UPDATE outbox SET state = ?, attempts = 0, next_attempt_at = 0 WHERE state = ?",
+            (PENDING, DEAD))
+        return cur.rowcount or 0
+
+    def import_csv(self, path: str, tab: str, tab_gid: Optional[int] = None) -> int:
+        """
+        Carga filas de un CSV de respaldo (p.ej. share/events_fallback.csv) como pendientes.
+        Se importan como listas (posicionales), igual que se habrían escrito originalmente;
+        las líneas de encabezado repetidas se saltean.
+        """
+        n = 0
+        with open(path, newline="", encoding="utf-8") as fh:
+            for rec in csv.reader(fh):
+                if not rec or (rec[0] or "").strip().lower() == "timestamp":
+                    continue
+                # Las líneas repetidas del CSV (reintentos) se importan una sola vez
+                n += self.put(rec, tab, tab_gid, "RAW",
+                              idem_key=idempotency_key("csv", tab, rec))
+        return n
+
+
+_OUTBOX: Optional[Outbox] = None
+_OUTBOX_LOCK = threading.Lock()
+
+
+def get_outbox() -> Outbox:
+    global _OUTBOX
+    if _OUTBOX is None:
+        with _OUTBOX_LOCK:
+            if _OUTBOX is None:
+                _OUTBOX = Outbox()
+    return _OUTBOX
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Outbox local de eventos a Google Sheets")
+    parser.add_argument("--path", default=OUTBOX_PATH)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats")
+    sub.add_parser("requeue-dead")
+    imp = sub.add_parser("import-csv")
+    imp.add_argument("csv_path")
+    imp.add_argument("--tab", default="Calculadora_Evaluaciones")
+    imp.add_argument("--keep", action="store_true", help="no renombrar el CSV a .imported")
+    args = parser.parse_args(argv)
+
+    ob = Outbox(args.path)
+    if args.cmd == "stats":
+        print(json.dumps(ob.stats(), indent=2))
+    elif args.cmd == "requeue-dead":
+        print(f"Reencoladas: {ob.requeue_dead()}")
+    elif args.cmd == "import-csv":
+        n = ob.import_csv(args.csv_path, args.tab)
+        if not args.keep:
+            os.replace(args.csv_path, args.csv_path + ".imported")
+        print(f"Importadas {n} filas a '{args.tab}'")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,232 @@
+# pdf_cache.py — cache direccionada por contenido del PDF final
+# Clave = sha256 de (datos clínicos del informe, idioma, versión de plantilla, ámbito).
+# Se excluyen los campos volátiles (rep_id, timestamps, verification_uuid): un rerun de
+# Streamlit con los mismos datos obtiene los MISMOS bytes y el MISMO verification_uuid, así
+# la descarga y el email llevan el mismo informe.
+# - Memoria: LRU acotada por bytes (PDF_CACHE_MEM_MB). Lo que sale de memoria se vuelca a
+#   disco (PDF_CACHE_DIR, LRU por mtime acotada por PDF_CACHE_DISK_MB y PDF_CACHE_TTL_S).
+# - El disco guarda PDFs con PHI: directorio 0700 y archivos 0600; PDF_CACHE_DISK_MB=0 lo apaga.
+# - Un render por clave aunque dos hilos pidan el mismo informe a la vez.
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+MEM_BYTES = int(float(os.getenv("PDF_CACHE_MEM_MB", "32")) * 1024 * 1024)
+DISK_BYTES = int(float(os.getenv("PDF_CACHE_DISK_MB", "256")) * 1024 * 1024)
+DISK_TTL_S = float(os.getenv("PDF_CACHE_TTL_S", str(7 * 24 * 3600)))
+CACHE_DIR = os.getenv("PDF_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "aestheticsafe_pdf_cache")
+
+# Cambian en cada corrida aunque el informe sea el mismo
+_VOLATILE_KEYS = {"rep_id", "verification_uuid", "ver_code", "timestamp", "timestamp_utc",
+                  "generated_at", "fecha"}
+
+Entry = Tuple[bytes, Optional[str]]  # (pdf_bytes, verification_uuid)
+
+
+def _strip(v: Any) -> Any:
+    if isinstance(v, dict):
+        return {str(k): _strip(x) for k, x in v.items() if k not in _VOLATILE_KEYS}
+    if isinstance(v, (list, tuple)):
+        return [_strip(x) for x in v]
+    return v
+
+
+def fingerprint(datos: Dict[str, Any], lang: Optional[str] = None, template: str = "",
+                scope: str = "") -> str:
+    """Huella estable del informe: mismos datos + idioma + plantilla + ámbito → misma clave."""
+    canon = json.dumps({"d": _strip(datos), "l": (lang or "").lower(), "t": template, "s": scope},
+                       sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(canon.encode("utf-8")).hexdigest()
+
+
+class PDFCache:
+    def __init__(self, mem_bytes: int = MEM_BYTES, disk_dir: Optional[str] = CACHE_DIR,
+                 disk_bytes: int = DISK_BYTES, disk_ttl_s: float = DISK_TTL_S) -> None:
+        self.mem_bytes = mem_bytes
+        self.disk_dir = disk_dir if disk_dir and disk_bytes > 0 else None
+        self.disk_bytes = disk_bytes
+        self.disk_ttl_s = disk_ttl_s
+        self._mem: "OrderedDict[str, Entry]" = OrderedDict()
+        self._mem_size = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, threading.Lock] = {}
+        self.stats_ = {"hits_mem": 0, "hits_disk": 0, "misses": 0, "renders": 0,
+                       "spilled": 0, "evicted_disk": 0, "disk_errors": 0}
+        if self.disk_dir:
+            try:
+                os.makedirs(self.disk_dir, mode=0o700, exist_ok=True)
+            except OSError as e:
+                print(f"⚠️ [pdf_cache] sin cache en disco ({self.disk_dir}): {e}")
+                self.disk_dir = None
+
+    # ---------- memoria ----------
+    def _mem_put(self, key: str, entry: Entry) -> None:
+        """Inserta en la LRU; lo desalojado baja a disco (llamar con _lock tomado)."""
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._mem_size -= len(old[0])
+        self._mem[key] = entry
+        self._mem_size += len(entry[0])
+        while self._mem_size > self.mem_bytes and len(self._mem) > 1:
+            k, ev = self._mem.popitem(last=False)
+            self._mem_size -= len(ev[0])
+            if self._disk_put(k, ev):
+                self.stats_["spilled"] += 1
+
+    # ---------- disco ----------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir or "", key + ".pdfc")
+
+    def _disk_put(self, key: str, entry: Entry) -> bool:
+        if not self.disk_dir:
+            return False
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as fh:
+                fh.write((entry[1] or "").encode("ascii") + b"\n" + entry[0])
+            os.replace(tmp, path)  # atómico: un lector nunca ve un archivo a medias
+            self._disk_trim()
+            return True
+        except OSError:
+            self.stats_["disk_errors"] += 1
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return False
+
+    def _disk_get(self, key: str) -> Optional[Entry]:
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.disk_ttl_s:
+                os.unlink(path)
+                return None
+            with open(path, "rb") as fh:
+                raw = fh.read()
+            os.utime(path)  # LRU en disco por mtime
+        except OSError:
+            return None
+        vid, _, pdf = raw.partition(b"\n")
+        return (pdf, vid.decode("ascii") or None) if pdf else None
+
+    def _disk_trim(self) -> None:
+        try:
+            files = []
+            for name in os.listdir(self.disk_dir or ""):
+                if name.endswith(".pdfc"):
+                    st = os.stat(os.path.join(self.disk_dir or "", name))
+                    files.append((st.st_mtime, st.st_size, name))
+        except OSError:
+            return
+        total = sum(f[1] for f in files)
+        now = time.time()
+        for mtime, size, name in sorted(files):
+            if total <= self.disk_bytes and now - mtime <= self.disk_ttl_s:
+                break
+            try:
+                os.unlink(os.path.join(self.disk_dir or "", name))
+                total -= size
+                self.stats_["evicted_disk"] += 1
+            except OSError:
+                pass
+
+    # ---------- API ----------
+    def get(self, key: str) -> Optional[Entry]:
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                self._mem.move_to_end(key)
+                self.stats_["hits_mem"] += 1
+                return hit
+        hit = self._disk_get(key)
+        if hit is not None:
+            with self._lock:
+                self.stats_["hits_disk"] += 1
+                self._mem_put(key, hit)  # vuelve a memoria (lo frío de memoria baja a disco)
+        return hit
+
+    def put(self, key: str, pdf: bytes, verification_uuid: Optional[str] = None) -> None:
+        with self._lock:
+            self._mem_put(key, (pdf, verification_uuid))
+
+    def get_or_render(self, key: str, render: Callable[[], Entry]) -> Entry:
+        """Devuelve el informe de 'key'; si no está, render() una sola vez (aun con hilos)."""
+        hit = self.get(key)
+        if hit is not None:
+            return hit
+        with self._lock:
+            klock = self._inflight.setdefault(key, threading.Lock())
+        with klock:
+            try:
+                hit = self.get(key)  # otro hilo pudo terminarlo mientras esperábamos
+                if hit is not None:
+                    return hit
+                with self._lock:
+                    self.stats_["misses"] += 1
+                pdf, vid = render()
+                with self._lock:
+                    self.stats_["renders"] += 1
+                self.put(key, pdf, vid)
+                return pdf, vid
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            self._mem_size = 0
+        if self.disk_dir:
+            for name in os.listdir(self.disk_dir):
+                if name.endswith(".pdfc"):
+                    try:
+                        os.unlink(os.path.join(self.disk_dir, name))
+                    except OSError:
+                        pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats_, "mem_items": len(self._mem), "mem_bytes": self._mem_size,
+                    "disk": bool(self.disk_dir)}
+
+
+_CACHE: Optional[PDFCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_cache() -> PDFCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = PDFCache()
+        return _CACHE
+
+
+def final_key(datos: Dict[str, Any], lang: Optional[str] = None, scope: str = "") -> str:
+    """Clave del informe final v3.1 (incluye TEMPLATE_VERSION del generador)."""
+    from pdf_generator_v3_1 import TEMPLATE_VERSION
+    return fingerprint(datos, lang or "es", f"v3_1:{TEMPLATE_VERSION}", scope)
+
+
+def pdf_final_v3_1(datos: Dict[str, Any], *, lang: Optional[str] = None, scope: str = "",
+                   verification_uuid: Optional[str] = None) -> Tuple[bytes, str]:
+    """
+    generar_pdf_v3_1(full=True) servido desde la cache: (pdf_bytes, verification_uuid).
+    verification_uuid: si hay que volver a renderizar (cache desalojada), reusar ese ID.
+    """
+    from pdf_generator_v3_1 import generar_pdf_v3_1
+    pdf, vid = get_cache().get_or_render(
+        final_key(datos, lang, scope),
+        lambda: generar_pdf_v3_1(datos, preview=False, full=True, lang=lang,
+                                 verification_uuid=verification_uuid))
+    return pdf, vid or ""
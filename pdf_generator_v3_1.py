@@ -12,10 +12,13 @@ from reportlab.lib.colors import HexColor
 from reportlab.lib.utils import ImageReader
 from datetime import datetime, timezone
 import uuid
+import os
 import qrcode
 from PIL import Image
 import io
 
+from pdf_templates import layer as tpl_layer, place as tpl_place
+
 # Color scheme (AestheticSafe official palette)
 COLOR_LOW = HexColor("#38c694")      # Green - Low risk (official)
 COLOR_MODERATE = HexColor("#fcb960")  # Yellow - Moderate risk (official)
@@ -25,6 +28,17 @@ COLOR_TEXT = HexColor("#333333")      # Dark gray text
 COLOR_TEXT_LIGHT = HexColor("#777777")  # Light gray for footer
 COLOR_TITLE = HexColor("#000000")     # Black for main titles
 
+# Bump whenever the rendered layout changes: it is part of the pdf_cache fingerprint
+TEMPLATE_VERSION = "3.1.1"
+
+# Page geometry (A4, margins)
+PAGE_W, PAGE_H = A4
+ML, MR, MT, MB = 2.5 * cm, 2.5 * cm, 2.0 * cm, 2.0 * cm
+QR_SIZE = 2.2 * cm
+
+# QR drawing: "vector" = filled rectangles on the canvas (default); "png" = qrcode → PIL → PNG → ImageReader
+QR_MODE = os.getenv("PDF_QR", "vector").strip().lower()
+
 # ==========================================================
 # 🌍 Multilingual Translation System
 # ==========================================================
@@ -60,6 +74,7 @@ TRANSLATIONS = {
         ),
         "footer": "© AestheticSafe® 2025 — Buenos Aires, Argentina — info@aestheticsafe.com",
         "verification_code": "Verification Code",
+        "whatif_title": "Weight sensitivity (what-if)",
     },
     "es": {
         "title": "Informe de Riesgo AestheticSafe",
@@ -91,6 +106,7 @@ TRANSLATIONS = {
         ),
         "footer": "© AestheticSafe® 2025 — Buenos Aires, Argentina — info@aestheticsafe.com",
         "verification_code": "Código de Verificación",
+        "whatif_title": "Sensibilidad al peso (¿y si...?)",
     },
     "pt": {
         "title": "Relatório de Risco AestheticSafe",
@@ -122,6 +138,7 @@ TRANSLATIONS = {
         ),
         "footer": "© AestheticSafe® 2025 — Buenos Aires, Argentina — info@aestheticsafe.com",
         "verification_code": "Código de Verificação",
+        "whatif_title": "Sensibilidade ao peso (e se...?)",
     },
     "ar": {
         "title": "تقرير المخاطر من AestheticSafe",
@@ -153,6 +170,7 @@ TRANSLATIONS = {
         ),
         "footer": "© AestheticSafe® 2025 — بوينس آيرس، الأرجنتين — info@aestheticsafe.com",
         "verification_code": "رمز التحقق",
+        "whatif_title": "حساسية الوزن (ماذا لو)",
     },
 }
 
@@ -203,24 +221,174 @@ def draw_horizontal_bar(c, x, y, width, value, min_val, max_val, risk_level):
     c.circle(marker_x, y - bar_height/2, 4, fill=1, stroke=0)
 
 
-def generar_pdf_v3_1(datos: dict, *, preview: bool = False, full: bool = False, lang: str | None = None) -> tuple[bytes, str]:
+# ==========================================================
+# Verification QR
+# ==========================================================
+
+def _qr_matrix(data: str) -> list:
+    """Module matrix (True = dark) including the 1-module quiet zone, same encoding as before."""
+    qr = qrcode.QRCode(version=1, box_size=10, border=1)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def _qr_rects(matrix: list) -> list:
+    """
+    Dark modules as (col, row, w, h) rectangles: horizontal runs per row, merged downwards
+    while the next row has exactly the same run. ~4x fewer path ops than one square per module.
+    """
+    rects = []
+    open_runs = {}  # (col0, col1) -> first row
+    for r, row in enumerate(list(matrix) + [[]]):
+        runs = set()
+        col = 0
+        while col < len(row):
+            if row[col]:
+                start = col
+                while col < len(row) and row[col]:
+                    col += 1
+                runs.add((start, col))
+            else:
+                col += 1
+        for run in [k for k in open_runs if k not in runs]:
+            r0 = open_runs.pop(run)
+            rects.append((run[0], r0, run[1] - run[0], r - r0))
+        for run in runs:
+            open_runs.setdefault(run, r)
+    return rects
+
+
+def _draw_qr(c, data: str, x: float, y: float, size: float) -> None:
+    """Draw the QR for 'data' with its lower-left corner at (x, y)."""
+    if QR_MODE == "png":
+        qr = qrcode.QRCode(version=1, box_size=10, border=1)
+        qr.add_data(data)
+        qr.make(fit=True)
+        qr_img = qr.make_image(fill_color="black", back_color="white")
+        qr_buffer = io.BytesIO()
+        qr_img.save(qr_buffer, format='PNG')
+        qr_buffer.seek(0)
+        c.drawImage(ImageReader(qr_buffer), x, y, width=size, height=size)
+        return
+    matrix = _qr_matrix(data)
+    m = size / len(matrix)
+    top = y + size
+    c.saveState()
+    c.setFillColor(HexColor("#FFFFFF"))  # quiet zone stays white even over a tinted background
+    c.rect(x, y, size, size, stroke=0, fill=1)
+    c.setFillColor(HexColor("#000000"))
+    p = c.beginPath()
+    for col, row, w, h in _qr_rects(matrix):
+        p.rect(x + col * m, top - (row + h) * m, w * m, h * m)
+    c.drawPath(p, stroke=0, fill=1)  # one filled path: no seams between adjacent rectangles
+    c.restoreState()
+
+
+# ==========================================================
+# Static layers (pdf_templates): everything that does not depend on the patient
+# ==========================================================
+
+def _draw_static_page(c, lang: str, y0: float) -> float:
+    """QR label, header, fixed section headings and footer (absolute positions)."""
+    W, H = PAGE_W, PAGE_H
+    c.setFont("Helvetica", 7)
+    c.setFillColor(HexColor("#666666"))
+    c.drawCentredString(W - MR - QR_SIZE / 2, H - MT - QR_SIZE - 10, "Scan to verify")
+
+    y = y0 - 15
+    c.setFillColor(COLOR_TITLE)
+    c.setFont("Helvetica-Bold", 18)
+    c.drawString(ML, y, translate_label("title", lang))
+    c.setFont("Helvetica", 10)
+    c.setFillColor(HexColor("#666666"))
+    c.drawRightString(W - MR, y, translate_label("version", lang))
+    y -= 18
+    c.setFillColor(HexColor("#666666"))
+    c.setFont("Helvetica", 13)
+    c.drawString(ML, y, translate_label("subtitle", lang))
+    y -= 25
+    c.setStrokeColor(COLOR_GRAY)
+    c.setLineWidth(0.5)
+    c.line(ML, y, W - MR, y)
+    y -= 20
+
+    # Section headings at fixed positions (patient lines in between are dynamic)
+    c.setFillColor(COLOR_TEXT)
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(ML, y, translate_label("patient_info", lang))
+    y -= 15 + 12 + 25
+    c.setFillColor(COLOR_TEXT)
+    c.setFont("Helvetica-Bold", 11)
+    c.drawString(ML, y, translate_label("clinical_metrics", lang))
+
+    # Footer (two lines, centered)
+    c.setFont("Helvetica", 8)
+    c.setFillColor(HexColor("#555555"))
+    c.drawCentredString(W / 2, MB + 20, "Generated automatically by AestheticSafe® v3.1")
+    c.drawCentredString(W / 2, MB + 10, "Bukret Pesce SB SRL — © AestheticSafe® 2025 — Buenos Aires, Argentina — info@aestheticsafe.com")
+    return y - 20
+
+
+def _draw_disclaimer(c, lang: str, y: float) -> float:
+    """Separator + disclaimer title + wrapped text, from y downwards."""
+    c.setStrokeColor(COLOR_GRAY)
+    c.setLineWidth(0.5)
+    c.line(ML, y, PAGE_W - MR, y)
+    y -= 15
+    
+    c.setFont("Helvetica-Bold", 9)
+    c.setFillColor(COLOR_TEXT)
+    c.drawString(ML, y, translate_label("disclaimer_title", lang))
+    y -= 12
+    
+    c.setFont("Helvetica", 8)
+    c.setFillColor(HexColor("#666666"))
+    disclaimer = translate_label("disclaimer_text", lang)
+    
+    # Wrap disclaimer text
+    words = disclaimer.split()
+    line = []
+    max_width = 100
+    for word in words:
+        test = " ".join(line + [word])
+        if len(test) <= max_width:
+            line.append(word)
+        else:
+            c.drawString(ML, y, " ".join(line))
+            y -= 10
+            line = [word]
+    if line:
+        c.drawString(ML, y, " ".join(line))
+    return y
+
+
+def _static_layer(name: str, lang: str):
+    draw = _draw_static_page if name == "page" else _draw_disclaimer
+    return tpl_layer(("v3_1", TEMPLATE_VERSION, name, lang),
+                     lambda c, y0: draw(c, lang, y0), PAGE_H - MT)
+
+
+def generar_pdf_v3_1(datos: dict, *, preview: bool = False, full: bool = False, lang: str | None = None,
+                     verification_uuid: str | None = None) -> tuple[bytes, str]:
     """
     Generate modern medical-grade PDF report v3.1 with QR code verification.
     Based on NY Hospital CBC report visual design.
     Multilingual: EN/ES/PT/AR
+
+    verification_uuid: reuse an existing verification ID (pdf_cache); a new one if None.
     
     Returns:
         tuple: (pdf_bytes, verification_uuid)
     """
     
     # Generate unique verification UUID
-    verification_uuid = str(uuid.uuid4())
+    verification_uuid = verification_uuid or str(uuid.uuid4())
     
     # Setup
     buf = BytesIO()
     c = canvas.Canvas(buf, pagesize=A4)
-    W, H = A4
-    ML, MR, MT, MB = 2.5 * cm, 2.5 * cm, 2.0 * cm, 2.0 * cm
+    W, H = PAGE_W, PAGE_H
     y = H - MT
     
     # Language setup - normalize to lowercase
@@ -266,63 +434,22 @@ def generar_pdf_v3_1(datos: dict, *, preview: bool = False, full: bool = False,
     caprini_risk = "low" if cap_score <= 2 else "moderate" if cap_score <= 8 else "high" if cap_score > 0 else "low"
     
     # ===== QR CODE (Top Right Corner) =====
-    qr_size = 2.2 * cm  # QR code size
+    qr_size = QR_SIZE  # QR code size
     qr_x = W - MR - qr_size
     qr_y = H - MT - qr_size
     
-    # Generate QR code with verification URL
+    # QR code with verification URL (vector paths, no PNG round trip)
     verification_url = f"https://app.aestheticsafe.com/verify?id={verification_uuid}"
-    qr = qrcode.QRCode(version=1, box_size=10, border=1)
-    qr.add_data(verification_url)
-    qr.make(fit=True)
-    qr_img = qr.make_image(fill_color="black", back_color="white")
-    
-    # Convert PIL image to ReportLab image
-    qr_buffer = io.BytesIO()
-    qr_img.save(qr_buffer, format='PNG')
-    qr_buffer.seek(0)
-    
-    # Draw QR code on PDF
-    c.drawImage(ImageReader(qr_buffer), qr_x, qr_y, width=qr_size, height=qr_size)
-    
-    # QR label below the code
-    c.setFont("Helvetica", 7)
-    c.setFillColor(HexColor("#666666"))
-    c.drawCentredString(qr_x + qr_size/2, qr_y - 10, "Scan to verify")
-    
-    # ===== HEADER =====
-    y -= 15
-    
-    # Title (BLACK - official AestheticSafe style)
-    c.setFillColor(COLOR_TITLE)
-    c.setFont("Helvetica-Bold", 18)
-    title_text = translate_label("title", user_lang)
-    c.drawString(ML, y, title_text)
-    
-    # Version on the right side of the page
-    c.setFont("Helvetica", 10)
-    c.setFillColor(HexColor("#666666"))
-    c.drawRightString(W - MR, y, translate_label("version", user_lang))
-    y -= 18
-    
-    # Subtitle (Dark gray, light weight for elegance)
-    c.setFillColor(HexColor("#666666"))
-    c.setFont("Helvetica", 13)
-    c.drawString(ML, y, translate_label("subtitle", user_lang))
-    y -= 25
+    _draw_qr(c, verification_url, qr_x, qr_y, qr_size)
     
-    # Thin separator line
-    c.setStrokeColor(COLOR_GRAY)
-    c.setLineWidth(0.5)
-    c.line(ML, y, W - MR, y)
-    y -= 20
+    # ===== STATIC LAYER: QR label, header, section headings, footer (pre-recorded, pdf_templates) =====
+    tpl_place(c, _static_layer("page", user_lang))
+    y -= 15 + 18 + 25 + 20
     
     # ===== PATIENT INFO (Compact) =====
-    c.setFillColor(COLOR_TEXT)
-    c.setFont("Helvetica-Bold", 10)
-    c.drawString(ML, y, translate_label("patient_info", user_lang))
     y -= 15
     
+    c.setFillColor(COLOR_TEXT)
     c.setFont("Helvetica", 9)
     info_line = f"{translate_label('name', user_lang)}: {nombre}"
     if edad: info_line += f"  •  {translate_label('age', user_lang)}: {edad} {translate_label('years', user_lang)}"
@@ -336,10 +463,7 @@ def generar_pdf_v3_1(datos: dict, *, preview: bool = False, full: bool = False,
     c.drawString(ML, y, f"{translate_label('report_id', user_lang)}: {rep_id}  •  {translate_label('generated', user_lang)}: {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M UTC')}")
     y -= 25
     
-    # ===== CLINICAL METRICS =====
-    c.setFillColor(COLOR_TEXT)
-    c.setFont("Helvetica-Bold", 11)
-    c.drawString(ML, y, translate_label("clinical_metrics", user_lang))
+    # ===== CLINICAL METRICS (heading in the static layer) =====
     y -= 20
     
     # BMI Score
@@ -422,6 +546,20 @@ def generar_pdf_v3_1(datos: dict, *, preview: bool = False, full: bool = False,
             c.setFillColor(HexColor("#666666"))
             c.drawRightString(W - MR, y - 2, f"({nivel})")
         y -= 25
+
+    # What-if de peso (risk_whatif.resumen): umbrales donde cambia el nivel
+    whatif_lines = [str(x) for x in (datos.get("whatif") or []) if str(x).strip()]
+    if whatif_lines:
+        c.setFont("Helvetica-Bold", 9)
+        c.setFillColor(COLOR_TEXT)
+        c.drawString(ML, y, translate_label("whatif_title", user_lang))
+        y -= 12
+        c.setFont("Helvetica", 8)
+        c.setFillColor(HexColor("#666666"))
+        for line in whatif_lines:
+            c.drawString(ML + 10, y, line)
+            y -= 11
+        y -= 8
     
     # Separator
     c.setStrokeColor(COLOR_GRAY)
@@ -473,35 +611,8 @@ def generar_pdf_v3_1(datos: dict, *, preview: bool = False, full: bool = False,
     
     y -= 10
     
-    # ===== DISCLAIMER =====
-    c.setStrokeColor(COLOR_GRAY)
-    c.setLineWidth(0.5)
-    c.line(ML, y, W - MR, y)
-    y -= 15
-    
-    c.setFont("Helvetica-Bold", 9)
-    c.setFillColor(COLOR_TEXT)
-    c.drawString(ML, y, translate_label("disclaimer_title", user_lang))
-    y -= 12
-    
-    c.setFont("Helvetica", 8)
-    c.setFillColor(HexColor("#666666"))
-    disclaimer = translate_label("disclaimer_text", user_lang)
-    
-    # Wrap disclaimer text
-    words = disclaimer.split()
-    line = []
-    max_width = 100
-    for word in words:
-        test = " ".join(line + [word])
-        if len(test) <= max_width:
-            line.append(word)
-        else:
-            c.drawString(ML, y, " ".join(line))
-            y -= 10
-            line = [word]
-    if line:
-        c.drawString(ML, y, " ".join(line))
+    # ===== DISCLAIMER (static layer placed at y) =====
+    y = tpl_place(c, _static_layer("disclaimer", user_lang), y)
     
     # Verification code (below disclaimer) - use generated UUID
     y -= 15
@@ -509,11 +620,7 @@ def generar_pdf_v3_1(datos: dict, *, preview: bool = False, full: bool = False,
     c.setFillColor(HexColor("#666666"))
     c.drawString(ML, y, f"{translate_label('verification_code', user_lang)}: {verification_uuid[:16].upper()}")
     
-    # ===== FOOTER (Two lines, centered) =====
-    c.setFont("Helvetica", 8)
-    c.setFillColor(HexColor("#555555"))
-    c.drawCentredString(W / 2, MB + 20, "Generated automatically by AestheticSafe® v3.1")
-    c.drawCentredString(W / 2, MB + 10, "Bukret Pesce SB SRL — © AestheticSafe® 2025 — Buenos Aires, Argentina — info@aestheticsafe.com")
+    # ===== FOOTER: drawn by the static layer =====
     
     # Close PDF
     c.showPage()
@@ -0,0 +1,183 @@
+# pdf_prerender.py — pre-render del PDF final en un pool de procesos
+# generar_pdf_v3_1 (ReportLab + qrcode + PIL) es CPU puro: en el hilo del script compite por
+# el GIL con todas las sesiones. calculadora.py llama a prerender() apenas los datos del
+# informe están completos (el paciente todavía está en el gate de pago / WhatsApp) y después
+# result() devuelve los bytes ya listos, o espera el trabajo en curso en vez de empezar otro.
+# - Una tarea vigente por sesión (scope): si cambian los datos, la anterior se cancela (si
+#   ya corría, su resultado se descarta).
+# - Concurrencia acotada: PDF_RENDER_WORKERS procesos y como mucho PDF_RENDER_MAX_INFLIGHT
+#   trabajos encolados; con el pool lleno no se pre-renderiza (result() renderiza en el hilo).
+# - El resultado entra a pdf_cache con la misma clave, así descarga y email comparten bytes.
+
+import atexit
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple
+
+from pdf_cache import final_key, get_cache, pdf_final_v3_1
+
+WORKERS = int(os.getenv("PDF_RENDER_WORKERS", str(max(1, min(2, (os.cpu_count() or 2) - 1)))))
+MAX_INFLIGHT = int(os.getenv("PDF_RENDER_MAX_INFLIGHT", str(WORKERS * 2)))
+WAIT_S = float(os.getenv("PDF_RENDER_WAIT_S", "20"))
+
+
+def _warm() -> None:
+    import pdf_generator_v3_1  # noqa: F401  (ReportLab/qrcode cargados antes del 1er pedido)
+
+
+def _render(datos: Dict[str, Any], lang: Optional[str],
+            verification_uuid: Optional[str]) -> Tuple[bytes, str]:
+    """Corre en un worker."""
+    from pdf_generator_v3_1 import generar_pdf_v3_1
+    return generar_pdf_v3_1(datos, preview=False, full=True, lang=lang,
+                            verification_uuid=verification_uuid)
+
+
+class PreRenderer:
+    def __init__(self, workers: int = WORKERS, max_inflight: int = MAX_INFLIGHT) -> None:
+        self.workers = max(1, workers)
+        self.max_inflight = max(1, max_inflight)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Future] = {}  # clave → future (una por clave)
+        self._by_scope: "OrderedDict[str, str]" = OrderedDict()  # sesión → clave vigente (LRU)
+        self.stats_ = {"submitted": 0, "reused": 0, "cached": 0, "cancelled": 0, "stale": 0,
+                       "saturated": 0, "done": 0, "errors": 0, "waited": 0, "sync": 0}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: no heredar los hilos de Streamlit en un fork
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_warm)
+        return self._pool
+
+    def _inflight(self) -> int:
+        return sum(1 for f in self._jobs.values() if not f.done())
+
+    def prerender(self, datos: Dict[str, Any], *, scope: str = "", lang: Optional[str] = None,
+                  verification_uuid: Optional[str] = None) -> Optional[Future]:
+        """Lanza el render de 'datos' si hace falta; None si el pool está saturado o falló."""
+        key = final_key(datos, lang, scope)
+        with self._lock:
+            old = self._by_scope.get(scope)
+            if old is not None and old != key:
+                self._drop(old)
+            self._by_scope[scope] = key
+            self._by_scope.move_to_end(scope)
+            if len(self._by_scope) > 4096:
+                self._by_scope.popitem(last=False)
+            fut = self._jobs.get(key)
+            if fut is not None:
+                self.stats_["reused"] += 1
+                return fut
+            hit = get_cache().get(key)
+            if hit is not None:
+                self.stats_["cached"] += 1
+                done: Future = Future()
+                done.set_result(hit)
+                return done
+            if self._inflight() >= self.max_inflight:
+                self.stats_["saturated"] += 1
+                return None
+            try:
+                fut = self._get_pool().submit(_render, dict(datos), lang, verification_uuid)
+            except Exception as e:  # pool roto (worker muerto, sin fork/spawn): render en el hilo
+                print(f"⚠️ [pdf_prerender] no se pudo encolar: {type(e).__name__}: {e}")
+                self._pool = None
+                return None
+            self._jobs[key] = fut
+            self.stats_["submitted"] += 1
+        fut.add_done_callback(lambda f, k=key: self._finish(k, f))
+        return fut
+
+    def _drop(self, key: str) -> None:
+        """Los datos de la sesión cambiaron: cancelar (o descartar) el trabajo viejo. Con _lock."""
+        fut = self._jobs.pop(key, None)
+        if fut is None:
+            return
+        if fut.cancel():
+            self.stats_["cancelled"] += 1
+        elif not fut.done():
+            self.stats_["stale"] += 1  # ya corre: no se puede cortar, su resultado no se guarda
+
+    def _finish(self, key: str, fut: Future) -> None:
+        if fut.cancelled():
+            return
+        try:
+            pdf, vid = fut.result()
+        except Exception as e:
+            with self._lock:
+                if self._jobs.get(key) is fut:
+                    self._jobs.pop(key, None)
+                self.stats_["errors"] += 1
+                if isinstance(e, BrokenProcessPool):
+                    self._pool = None  # un worker murió: el próximo prerender arma otro pool
+            print(f"⚠️ [pdf_prerender] render falló: {type(e).__name__}: {e}")
+            return
+        with self._lock:
+            self.stats_["done"] += 1
+            # Cache antes de soltar el trabajo, bajo _lock: result() ve el trabajo o el PDF
+            # guardado, nunca ninguno (si no, renderiza en el hilo con otro verification_uuid).
+            if self._jobs.get(key) is fut:
+                get_cache().put(key, pdf, vid)
+                self._jobs.pop(key, None)
+
+    def result(self, datos: Dict[str, Any], *, scope: str = "", lang: Optional[str] = None,
+               verification_uuid: Optional[str] = None, timeout: float = WAIT_S) -> Tuple[bytes, str]:
+        """Bytes del PDF final: cache → trabajo en curso → render en el hilo (mismo resultado)."""
+        key = final_key(datos, lang, scope)
+        with self._lock:
+            fut = self._jobs.get(key)
+        if fut is not None:
+            try:
+                pdf, vid = fut.result(timeout)
+                with self._lock:
+                    self.stats_["waited"] += 1
+                get_cache().put(key, pdf, vid)  # por si el callback todavía no corrió
+                return pdf, vid
+            except (FutureTimeout, Exception) as e:
+                print(f"⚠️ [pdf_prerender] sin pre-render ({type(e).__name__}); render en el hilo")
+        hit = get_cache().get(key)
+        if hit is not None:
+            return hit[0], hit[1] or ""
+        with self._lock:
+            self.stats_["sync"] += 1
+        return pdf_final_v3_1(datos, lang=lang, scope=scope, verification_uuid=verification_uuid)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats_, "inflight": self._inflight(), "workers": self.workers,
+                    "max_inflight": self.max_inflight}
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+            self._jobs.clear()
+            self._by_scope.clear()
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+_RENDERER: Optional[PreRenderer] = None
+_RENDERER_LOCK = threading.Lock()
+
+
+def get_renderer() -> PreRenderer:
+    global _RENDERER
+    with _RENDERER_LOCK:
+        if _RENDERER is None:
+            _RENDERER = PreRenderer()
+            atexit.register(_RENDERER.shutdown)
+        return _RENDERER
+
+
+def prerender(datos: Dict[str, Any], **kw: Any) -> Optional[Future]:
+    return get_renderer().prerender(datos, **kw)
+
+
+def result(datos: Dict[str, Any], **kw: Any) -> Tuple[bytes, str]:
+    return get_renderer().result(datos, **kw)
@@ -0,0 +1,114 @@
+# pdf_templates.py — capa estática pre-armada de los informes PDF
+# Lo que no depende del paciente (encabezado, títulos fijos, descargo, pie) se dibuja UNA vez
+# por proceso, idioma y plantilla en un canvas de trabajo y se guardan los operadores PDF
+# resultantes. Cada informe sólo copia esos operadores (sin volver a medir, partir ni
+# formatear texto) y encima dibuja los valores del paciente, las barras y el QR.
+# - PDF_TEMPLATES=1 (default): operadores copiados en el stream de la página.
+# - PDF_TEMPLATES=form: como form XObject (beginForm/doForm). En ReportLab un form pertenece
+#   a un documento, así que se declara en cada PDF: en un informe de una página agrega un
+#   objeto y no ahorra CPU (benchmarks/bench_pdf_templates.py); sirve si la capa se repite
+#   en varias páginas del mismo documento.
+# - PDF_TEMPLATES=0: todo dibujado directo (mismo resultado visual; para comparar).
+# - PDF_ASCII85=0 (default): streams binarios; ASCII85 sólo sirve para transportes de 7 bits,
+#   agranda ~25% imágenes y contenido y en ReportLab sin rl_accel se codifica en Python puro.
+
+import io
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from reportlab import rl_config
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+MODE = {"0": "off", "form": "form"}.get(os.getenv("PDF_TEMPLATES", "1").strip().lower(), "inline")
+rl_config.useA85 = 1 if os.getenv("PDF_ASCII85", "0") == "1" else 0
+
+# draw(canvas, y0) → y final (lo que la capa "consume" hacia abajo desde y0)
+Draw = Callable[[canvas.Canvas, float], float]
+
+_FONT_OP = re.compile(r"(/F\d+)( \S+ Tf)")
+
+
+@dataclass(frozen=True)
+class Layer:
+    name: str
+    draw: Draw
+    ops: Tuple[str, ...]
+    fonts: Tuple[Tuple[str, str], ...]  # (fuente, nombre interno en el canvas de grabación)
+    y0: float
+    y1: float
+    pagesize: Tuple[float, float]
+
+
+_LAYERS: Dict[Hashable, Layer] = {}
+_LOCK = threading.Lock()
+
+
+def layer(key: Hashable, draw: Draw, y0: float, pagesize: Tuple[float, float] = A4) -> Layer:
+    """Capa grabada para 'key' (una vez por proceso). Las coordenadas de draw son de página."""
+    lay = _LAYERS.get(key)
+    if lay is not None:
+        return lay
+    scratch = canvas.Canvas(io.BytesIO(), pagesize=pagesize)
+    n0 = len(scratch._code)
+    y1 = draw(scratch, y0)
+    mapping = scratch._doc.fontMapping  # fuente → "/F1", en orden de primer uso
+    parts = key if isinstance(key, tuple) else (key,)
+    lay = Layer(name="tpl_" + re.sub(r"[^A-Za-z0-9_]", "_", "_".join(map(str, parts))),
+                draw=draw, ops=tuple(scratch._code[n0:]),
+                fonts=tuple(sorted(mapping.items(), key=lambda kv: int(kv[1][2:]))),
+                y0=y0, y1=y1, pagesize=(float(pagesize[0]), float(pagesize[1])))
+    with _LOCK:
+        return _LAYERS.setdefault(key, lay)
+
+
+def _ops_for(c: canvas.Canvas, lay: Layer) -> Sequence[str]:
+    """Operadores de la capa con los nombres de fuente de ESTE documento (las registra)."""
+    remap = {}
+    for font, rec_name in lay.fonts:
+        cur = c._doc.getInternalFontName(font)
+        if cur != rec_name:
+            remap[rec_name] = cur
+    if not remap:
+        return lay.ops
+    return [_FONT_OP.sub(lambda m: remap.get(m.group(1), m.group(1)) + m.group(2), op) for op in lay.ops]
+
+
+def _declare_form(c: canvas.Canvas, lay: Layer) -> None:
+    ops: List[str] = list(_ops_for(c, lay))
+    c.beginForm(lay.name, 0, 0, lay.pagesize[0], lay.pagesize[1])
+    c._code.extend(ops)
+    c.endForm()
+
+
+def place(c: canvas.Canvas, lay: Layer, y: Optional[float] = None, mode: Optional[str] = None) -> float:
+    """
+    Dibuja la capa con su borde superior en 'y' (None = donde se grabó) y devuelve la y
+    siguiente, igual que si se hubiera llamado draw(c, y).
+    """
+    y = lay.y0 if y is None else y
+    mode = mode or MODE
+    if mode == "off":
+        return lay.draw(c, y)
+    dy = y - lay.y0
+    c.saveState()  # q … Q: el estado gráfico de la capa no se filtra al resto de la página
+    if dy:
+        c.translate(0, dy)
+    if mode == "form":
+        declared = c.__dict__.setdefault("_tpl_forms", set())
+        if lay.name not in declared:
+            _declare_form(c, lay)
+            declared.add(lay.name)
+        c.doForm(lay.name)
+    else:
+        c._code.extend(_ops_for(c, lay))
+    c.restoreState()
+    return lay.y1 + dy
+
+
+def clear() -> None:
+    with _LOCK:
+        _LAYERS.clear()
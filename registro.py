@@ -4,10 +4,13 @@
 
 import os
 import json
-import gspread
-from google.oauth2.service_account import Credentials
 from datetime import datetime
 
+from gsheets import get_pool
+from sheets_schema import register_schema
+from events import RowEvent, emit
+from sheets_writer import idempotency_key
+
 SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets",
     "https://www.googleapis.com/auth/drive",
@@ -23,30 +26,6 @@ def _utc():
     return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
 
 
-def _creds():
-    raw = os.getenv("GOOGLE_CREDENTIALS")
-    if not raw:
-        return None, None
-    try:
-        info = json.loads(raw)
-        creds = Credentials.from_service_account_info(info, scopes=SCOPES)
-        return creds, info.get("client_email", None)
-    except:
-        return None, None
-
-
-def _open(tab_name):
-    creds, svc = _creds()
-    if not creds:
-        return None, svc
-    try:
-        gc = gspread.authorize(creds)
-        sh = gc.open_by_key(SHEET_KEY)
-        return sh.worksheet(tab_name), svc
-    except:
-        return None, svc
-
-
 # -------------------------------------------------------------------
 # 🔵 1. REGISTRO EN V3_Funnel_Progress
 # -------------------------------------------------------------------
@@ -74,6 +53,9 @@ FUNNEL_HEADERS = [
 ]
 
 
+register_schema(TAB_FUNNEL, FUNNEL_HEADERS)
+
+
 def registrar_evento_funnel(**data):
     """
     Recibe TODA la session_state de calculadora.py como **kwargs.
@@ -81,20 +63,16 @@ def registrar_evento_funnel(**data):
     No crashea nunca.
     """
 
-    ws, svc = _open(TAB_FUNNEL)
-    if not ws:
-        return False, svc
+    svc = get_pool().service_email()
 
     row = [_utc()]  # Timestamp
 
     for h in FUNNEL_HEADERS[1:]:
         row.append(data.get(h, ""))
 
-    try:
-        ws.append_row(row, value_input_option="USER_ENTERED")
-        return True, svc
-    except:
-        return False, svc
+    # Evento de fila: viaja en el lote de la corrida (events) y sale por el outbox
+    idem = idempotency_key(str(data.get("session_id", "")), "funnel", row[1:])
+    return emit(RowEvent(tuple(row), TAB_FUNNEL, value_input_option="USER_ENTERED", idem_key=idem)), svc
 
 
 # -------------------------------------------------------------------
@@ -115,6 +93,9 @@ INTEROP_HEADERS = [
 ]
 
 
+register_schema(TAB_INTEROP, INTEROP_HEADERS)
+
+
 def registrar_evento_interop(
     request_data: dict,
     response_data: dict,
@@ -131,9 +112,7 @@ def registrar_evento_interop(
     Inserta EXACTAMENTE en el sheet V3_Interoperability_Log siguiendo tus columnas reales.
     """
 
-    ws, svc = _open(TAB_INTEROP)
-    if not ws:
-        return False, svc
+    svc = get_pool().service_email()
 
     row = [
         _utc(),
@@ -149,8 +128,5 @@ def registrar_evento_interop(
         substage,
     ]
 
-    try:
-        ws.append_row(row, value_input_option="USER_ENTERED")
-        return True, svc
-    except:
-        return False, svc
+    idem = idempotency_key(session_id, f"interop_{stage}_{substage}", row[1:])
+    return emit(RowEvent(tuple(row), TAB_INTEROP, value_input_option="USER_ENTERED", idem_key=idem)), svc
@@ -0,0 +1,477 @@
+# risk_batch.py — scoring vectorizado (NumPy) para planillas de candidatos pre-quirúrgicos
+# Mismos resultados, bit a bit, que las funciones escalares de risk_core:
+# - Las operaciones IEEE (división, suma, comparaciones) se hacen en NumPy en el mismo orden.
+# - Lo que NumPy no garantiza igual a Python (pow con exponente 3.5 y round() decimal)
+#   se calcula con Python sobre los valores ÚNICOS y se expande con una tabla (np.unique).
+# Con edades/pesos/alturas enteras hay pocos únicos: 1M filas en menos de un segundo.
+
+import argparse
+import csv
+import json
+import math
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from risk_core import (
+    CAPRINI_BITS,
+    CAPRINI_CATALOGO,
+    CAPRINI_PESOS_BIT,
+    MASK_3P_GROUP,
+    RecKey,
+    caprini_categoria,
+    caprini_mask,
+    es_coagulacion,
+    es_fam_trombo,
+    ids_por_clave,
+    textos_por_clave,
+)
+
+_SMOKE_ADD = {
+    "Sí (1–7 por semana)": 0.1,
+    "Más de 7 por semana": 0.3,
+    ">7 por semana": 0.3,
+}
+_CAT_LABELS = np.array([caprini_categoria(0), caprini_categoria(3), caprini_categoria(9)], dtype=object)
+_NIVEL_LABELS = np.array(["Bajo", "Moderado", "Alto"], dtype=object)
+
+
+def _py_map(values: np.ndarray, fn: Any) -> np.ndarray:
+    """Aplica fn (Python puro) a cada valor único y expande: resultado idéntico al escalar."""
+    uniq, inv = np.unique(values, return_inverse=True)
+    table = np.array([fn(float(u)) for u in uniq.tolist()], dtype=np.float64)
+    return table[inv.reshape(values.shape)]
+
+
+def bmi_batch(peso: Any, altura_cm: Any) -> np.ndarray:
+    """round(peso / ((altura / 100) ** 2), 1), igual que calculadora."""
+    peso = np.asarray(peso, dtype=np.float64)
+    alt_m = np.asarray(altura_cm, dtype=np.float64) / 100.0
+    raw = peso / (alt_m * alt_m)  # x ** 2 == x * x en IEEE (una sola rounding)
+    return _py_map(raw, lambda v: round(v, 1))
+
+
+_PESOS_BIT = np.asarray(CAPRINI_PESOS_BIT, dtype=np.int64)
+_SHIFTS = np.arange(CAPRINI_BITS, dtype=np.int64)
+
+
+def caprini_masks(selections: Iterable[Iterable[str]]) -> np.ndarray:
+    """Listas de etiquetas → array de máscaras (risk_core.caprini_mask)."""
+    return np.asarray([caprini_mask(labels) for labels in selections], dtype=np.int64)
+
+
+def caprini_scores_from_masks(masks: Any) -> np.ndarray:
+    """Score Caprini por columnas: (bits · pesos) + 3 si hay algún bit del grupo trombofilia."""
+    m = np.asarray(masks, dtype=np.int64)
+    bits = (m[..., None] >> _SHIFTS) & 1
+    return bits @ _PESOS_BIT + np.where(m & MASK_3P_GROUP, 3, 0)
+
+
+def caprini_scores(selections: Iterable[Iterable[str]]) -> np.ndarray:
+    """caprini_desde(...)[0] para cada lista de etiquetas (sin armar el detalle)."""
+    return caprini_scores_from_masks(caprini_masks(selections))
+
+
+def _smoke_add(tabaquismo: Any, n: int) -> np.ndarray:
+    tab = np.asarray(tabaquismo, dtype=object)
+    if tab.ndim == 0:
+        tab = np.full(n, tab.item(), dtype=object)
+    uniq, inv = np.unique(tab.astype(str), return_inverse=True)
+    table = np.array([_SMOKE_ADD.get(u, 0.0) for u in uniq.tolist()], dtype=np.float64)
+    return table[inv]
+
+
+def factor_batch(edad: Any, bmi: Any, tabaquismo: Any, caprini_score: Any) -> np.ndarray:
+    """factor_riesgo_fn vectorizado, mismo orden de sumas."""
+    edad = np.asarray(edad)
+    bmi = np.asarray(bmi, dtype=np.float64)
+    cap = np.asarray(caprini_score)
+    n = edad.shape[0]
+
+    # pow sólo donde la rama escalar lo evalúa (edad >= 18): con edad negativa daría un
+    # complejo; las edades < 18 se llevan a 18 y su término se descarta en el where
+    edad_f = edad.astype(np.float64)
+    age_term = _py_map(np.where(edad_f < 18, 18.0, edad_f), lambda e: (e / 100.0) ** 3.5)
+    f = np.where(edad < 18, 1.0, 1.0 + age_term)
+    f = f + np.where(bmi >= 30, 0.4, np.where(bmi >= 25, 0.2, 0.0))
+    f = f + _smoke_add(tabaquismo, n)
+    f = f + np.where(cap >= 5, 0.245, 0.0)
+    return _py_map(f, lambda v: round(v, 3))
+
+
+def nivel_batch(f: Any) -> np.ndarray:
+    """nivel_por_factor: <1.2 Bajo, <1.6 Moderado, resto Alto (la rama de 1.4 no cambia el resultado)."""
+    f = np.asarray(f, dtype=np.float64)
+    idx = np.where(f >= 1.6, 2, np.where(f >= 1.2, 1, 0))
+    return _NIVEL_LABELS[idx]
+
+
+def categoria_batch(score: Any) -> np.ndarray:
+    s = np.asarray(score)
+    return _CAT_LABELS[np.where(s <= 2, 0, np.where(s <= 8, 1, 2))]
+
+
+def score_batch(
+    edad: Sequence[Any],
+    tabaquismo: Any,
+    *,
+    peso: Optional[Sequence[Any]] = None,
+    altura_cm: Optional[Sequence[Any]] = None,
+    bmi: Optional[Sequence[Any]] = None,
+    caprini_score: Optional[Sequence[Any]] = None,
+    caprini_labels: Optional[Iterable[Iterable[str]]] = None,
+    caprini_mask: Optional[Sequence[int]] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Scoring por columnas. Pasar peso+altura_cm (o bmi ya calculado) y caprini_score
+    (o caprini_mask, o caprini_labels). Devuelve arrays: bmi, caprini_score, caprini_categoria,
+    factor_riesgo, nivel_riesgo — idénticos a risk_core fila por fila.
+    """
+    edad_a = np.asarray(edad)
+    if bmi is None:
+        if peso is None or altura_cm is None:
+            raise ValueError("score_batch: falta bmi o peso + altura_cm")
+        bmi_a = bmi_batch(peso, altura_cm)
+    else:
+        bmi_a = np.asarray(bmi, dtype=np.float64)
+    if caprini_score is None:
+        if caprini_mask is not None:
+            cap = caprini_scores_from_masks(caprini_mask)
+        elif caprini_labels is not None:
+            cap = caprini_scores(caprini_labels)
+        else:
+            cap = np.zeros(len(edad_a), np.int64)
+    else:
+        cap = np.asarray(caprini_score, dtype=np.int64)
+    if not (len(edad_a) == len(bmi_a) == len(cap)):
+        raise ValueError("score_batch: columnas de distinto largo")
+
+    f = factor_batch(edad_a, bmi_a, tabaquismo, cap)
+    return {
+        "bmi": bmi_a,
+        "caprini_score": cap,
+        "caprini_categoria": categoria_batch(cap),
+        "factor_riesgo": f,
+        "nivel_riesgo": nivel_batch(f),
+    }
+
+
+
+# ---------- Recomendaciones por columnas ----------
+# La tabla de reglas de risk_core se evalúa una vez por combinación de rasgos discretos
+# presente en el lote (a lo sumo unos pocos miles) y se expande con el índice inverso.
+_MASK_COAG = sum(1 << f.bit for f in CAPRINI_CATALOGO if es_coagulacion(f.label))
+_MASK_FAM = sum(1 << f.bit for f in CAPRINI_CATALOGO if es_fam_trombo(f.label))
+_RIESGOS = ("Bajo", "Moderado", "Alto")
+
+
+def _col(values: Any, n: int) -> np.ndarray:
+    a = np.asarray(values, dtype=object)
+    return np.full(n, a.item(), dtype=object) if a.ndim == 0 else a
+
+
+def _distinto(values: Any, n: int, ref: str) -> np.ndarray:
+    """(x or '') != ref por columna, con la misma semántica que las reglas escalares."""
+    col = _col(values, n)
+    uniq, inv = np.unique(np.asarray([("" if v is None else str(v)) for v in col], dtype=object),
+                          return_inverse=True)
+    return np.asarray([u != ref for u in uniq.tolist()], dtype=bool)[inv]
+
+
+def rec_keys_batch(IMC: Any, edad: Any, tabaquismo: Any, hta: Any, diabetes: Any, tiroides: Any,
+                   riesgo: Any, caprini_mask: Any = 0) -> np.ndarray:
+    """Código entero de RecKey por fila (mismos cortes que risk_core.imc_banda/edad_banda)."""
+    imc = np.asarray(IMC, dtype=np.float64)
+    n = imc.shape[0]
+    e = np.asarray(edad, dtype=np.float64)
+    imc_b = np.select([imc < 18.5, imc < 19.5, imc > 31, imc > 28, imc > 25], [0, 1, 5, 4, 3], 2)
+    edad_b = np.where(e >= 50, 2, np.where(e >= 45, 1, 0))
+    mask = np.broadcast_to(np.asarray(caprini_mask, dtype=np.int64), (n,))
+    riesgo_c = _col(riesgo, n)
+    r_idx = np.where(riesgo_c == "Bajo", 0, np.where(riesgo_c == "Moderado", 1, 2))
+    flags = (_distinto(tabaquismo, n, "No").astype(np.int64)
+             | _distinto(hta, n, "No") << 1
+             | _distinto(diabetes, n, "No") << 2
+             | _distinto(tiroides, n, "Normal") << 3
+             | ((mask & _MASK_COAG) != 0) << 4
+             | ((mask & _MASK_FAM) != 0) << 5)
+    return (imc_b * 3 + edad_b) * 3 * 64 + r_idx * 64 + flags
+
+
+def _key_de_codigo(code: int) -> RecKey:
+    rest, flags = divmod(code, 64)
+    rest, r_idx = divmod(rest, 3)
+    imc_b, edad_b = divmod(rest, 3)
+    return RecKey(imc_b, edad_b, *(bool(flags >> i & 1) for i in range(6)), _RIESGOS[r_idx])
+
+
+def recomendaciones_batch(*args: Any, lang: Optional[str] = None,
+                          catalog_lang: Optional[str] = None, **kw: Any) -> np.ndarray:
+    """
+    Recomendaciones por fila (array de tuplas). Sin 'lang' devuelve IDs; con 'lang', textos.
+    Argumentos como rec_keys_batch: IMC, edad, tabaquismo, hta, diabetes, tiroides, riesgo,
+    caprini_mask (la máscara da los flags de coagulación / trombosis familiar).
+    """
+    codes = rec_keys_batch(*args, **kw)
+    uniq, inv = np.unique(codes, return_inverse=True)
+    table = np.empty(len(uniq), dtype=object)
+    for i, c in enumerate(uniq.tolist()):
+        key = _key_de_codigo(c)
+        table[i] = ids_por_clave(key) if lang is None else textos_por_clave(key, lang, catalog_lang)
+    return table[inv]
+
+
+def recomendaciones_frame(df: Any, *, lang: Optional[str] = None, catalog_lang: Optional[str] = None,
+                          imc: str = "bmi", edad: str = "edad", tabaquismo: str = "tabaquismo",
+                          hta: str = "hta", diabetes: str = "diabetes", tiroides: str = "tiroides",
+                          riesgo: str = "nivel_riesgo", mask: str = "caprini_mask") -> np.ndarray:
+    """recomendaciones_batch sobre las columnas de un DataFrame (faltantes → valores por defecto)."""
+    n = len(df)
+
+    def col(name: str, default: Any) -> Any:
+        return df[name].to_numpy() if name in df else np.full(n, default, dtype=object)
+
+    return recomendaciones_batch(
+        col(imc, np.nan).astype(np.float64), col(edad, np.nan).astype(np.float64),
+        col(tabaquismo, "No"), col(hta, "No"), col(diabetes, "No"), col(tiroides, "Normal"),
+        col(riesgo, "Alto"), col(mask, 0).astype(np.int64),
+        lang=lang, catalog_lang=catalog_lang)
+
+
+# ===================== CLI: scoring de planillas (CSV / XLSX) =====================
+#   python risk_batch.py pacientes.csv -o resultados.jsonl [--chunk 5000] [--workers 4]
+# Lee la planilla en chunks de tamaño fijo, los reparte en un ProcessPoolExecutor con
+# a lo sumo 2×workers chunks en vuelo y escribe en orden: la memoria no crece con el archivo.
+
+# Columna canónica → nombres aceptados en la planilla (minúsculas)
+_ALIASES = {
+    "id": ("id", "paciente_id", "patient_id", "rep_id"),
+    "edad": ("edad", "age"),
+    "peso": ("peso", "peso_kg", "weight", "weight_kg"),
+    "altura": ("altura", "altura_cm", "height", "height_cm"),
+    "tabaquismo": ("tabaquismo", "smoking"),
+    "hta": ("hta", "hipertension", "hipertensión", "hypertension"),
+    "diabetes": ("diabetes",),
+    "tiroides": ("tiroides", "thyroid"),
+    "caprini": ("caprini", "caprini_factores", "antecedentes"),
+    "caprini_mask": ("caprini_mask",),
+}
+OUT_FIELDS = ["id", "bmi", "caprini_score", "caprini_categoria", "factor_riesgo",
+              "nivel_riesgo", "recomendacion_ids", "error"]
+
+
+def _canon(header: List[Any]) -> List[str]:
+    lookup = {a: canon for canon, names in _ALIASES.items() for a in names}
+    return [lookup.get(str(h or "").strip().lower(), "") for h in header]
+
+
+def _iter_csv(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, newline="", encoding="utf-8-sig") as fh:
+        reader = csv.reader(fh)
+        cols = _canon(next(reader, []))
+        for r in reader:
+            yield {c: v for c, v in zip(cols, r) if c}
+
+
+def _iter_xlsx(path: str) -> Iterator[Dict[str, Any]]:
+    try:
+        from openpyxl import load_workbook
+    except Exception:
+        raise SystemExit("❌ Para leer .xlsx hace falta openpyxl (pip install openpyxl)")
+    wb = load_workbook(path, read_only=True, data_only=True)  # read_only: streaming por filas
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        cols = _canon(list(next(rows, ())))
+        for r in rows:
+            yield {c: v for c, v in zip(cols, r) if c}
+    finally:
+        wb.close()
+
+
+def iter_patients(path: str) -> Iterator[Dict[str, Any]]:
+    ext = os.path.splitext(path)[1].lower()
+    return _iter_xlsx(path) if ext in (".xlsx", ".xlsm") else _iter_csv(path)
+
+
+def _chunks(it: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk: List[Dict[str, Any]] = []
+    for row in it:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _num(v: Any) -> float:
+    if isinstance(v, (int, float)):
+        return v
+    return float(str(v).strip().replace(",", "."))
+
+
+def _txt(v: Any, default: str) -> str:
+    s = "" if v is None else str(v).strip()
+    return s or default
+
+
+# Columna 'caprini': IDs o etiquetas separadas por ";", "|" o salto de línea. Algunas etiquetas
+# del catálogo traen ";" adentro: se reconocen enteras antes de partir (las más largas primero).
+_CAPRINI_SEP = re.compile(r"[;|\n]")
+_LABELS_CON_SEP = tuple(sorted((f.label for f in CAPRINI_CATALOGO if _CAPRINI_SEP.search(f.label)),
+                               key=len, reverse=True))
+
+
+def _parse_caprini(row: Dict[str, Any]) -> int:
+    m = row.get("caprini_mask")
+    if m not in (None, ""):
+        return int(_num(m))
+    raw = str(row.get("caprini") or "")
+    found: List[str] = []
+    for label in _LABELS_CON_SEP:
+        if label in raw:
+            found.append(label)
+            raw = raw.replace(label, "\n")
+    found.extend(x.strip() for x in _CAPRINI_SEP.split(raw) if x.strip())
+    return caprini_mask(found)
+
+
+_MASK_LIMIT = 1 << CAPRINI_BITS
+
+
+def score_chunk(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Scorea un chunk (corre en un worker). Las filas inválidas salen con 'error'."""
+    out: List[Dict[str, Any]] = []
+    ok: List[Tuple[int, Any, Any, Any, str, int]] = []
+    for r in rows:
+        rec = {"id": _txt(r.get("id"), ""), "error": ""}
+        try:
+            edad = _num(r.get("edad"))
+            peso, altura = _num(r.get("peso")), _num(r.get("altura"))
+            # Rangos por fila: un valor que parsea pero rompe el cálculo vectorizado (edad
+            # negativa, máscara fuera de int64) tumbaría el chunk entero
+            if not all(math.isfinite(v) for v in (edad, peso, altura)):
+                raise ValueError("edad/peso/altura no finitos")
+            if edad < 0:
+                raise ValueError("edad < 0")
+            if altura <= 0:
+                raise ValueError("altura <= 0")
+            mask = _parse_caprini(r)
+            if not 0 <= mask < _MASK_LIMIT:
+                raise ValueError(f"caprini_mask fuera de rango: {mask}")
+            ok.append((len(out), edad, peso, altura, _txt(r.get("tabaquismo"), "No"), mask))
+        except Exception as e:
+            rec["error"] = f"{type(e).__name__}: {e}"
+        out.append(rec)
+    if not ok:
+        return out
+
+    idx, edad, peso, altura, tab, masks = (list(c) for c in zip(*ok))
+    res = score_batch(edad, np.asarray(tab, dtype=object), peso=peso, altura_cm=altura, caprini_mask=masks)
+    recs = recomendaciones_batch(
+        res["bmi"], np.asarray(edad, dtype=np.float64), np.asarray(tab, dtype=object),
+        [_txt(rows[i].get("hta"), "No") for i in idx], [_txt(rows[i].get("diabetes"), "No") for i in idx],
+        [_txt(rows[i].get("tiroides"), "Normal") for i in idx], res["nivel_riesgo"], masks)
+    for j, i in enumerate(idx):
+        out[i].update(bmi=float(res["bmi"][j]), caprini_score=int(res["caprini_score"][j]),
+                      caprini_categoria=str(res["caprini_categoria"][j]),
+                      factor_riesgo=float(res["factor_riesgo"][j]),
+                      nivel_riesgo=str(res["nivel_riesgo"][j]), recomendacion_ids=";".join(recs[j]))
+    return out
+
+
+class _Writer:
+    def __init__(self, path: str, fmt: str) -> None:
+        self.fh = sys.stdout if path == "-" else open(path, "w", newline="", encoding="utf-8")
+        self.jsonl = fmt == "jsonl"
+        if not self.jsonl:
+            self.csv = csv.DictWriter(self.fh, fieldnames=OUT_FIELDS, extrasaction="ignore")
+            self.csv.writeheader()
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        if self.jsonl:
+            for r in rows:
+                if r.get("recomendacion_ids") is not None:
+                    r = {**r, "recomendacion_ids": r["recomendacion_ids"].split(";")}
+                self.fh.write(json.dumps(r, ensure_ascii=False) + "\n")
+        else:
+            self.csv.writerows(rows)
+
+    def close(self) -> None:
+        if self.fh is not sys.stdout:
+            self.fh.close()
+
+
+def score_file(src: str, dst: str, fmt: str = "csv", chunk_size: int = 5000,
+               workers: Optional[int] = None, progress_s: float = 2.0) -> Dict[str, Any]:
+    """Scorea 'src' en streaming y escribe 'dst' en el mismo orden. Devuelve totales."""
+    workers = max(1, workers or os.cpu_count() or 1)
+    max_inflight = 2 * workers
+    writer = _Writer(dst, fmt)
+    total = errors = 0
+    t0 = last = time.perf_counter()
+
+    def _drain(job: Tuple[Any, List[Dict[str, Any]]]) -> None:
+        nonlocal total, errors, last
+        fut, chunk = job
+        try:
+            rows = fut.result()
+        except Exception as e:
+            # Falló el chunk entero (worker muerto, error no previsto): fila por fila en este
+            # proceso, así sólo las filas problemáticas salen con error y la corrida sigue
+            print(f"⚠️ chunk falló ({type(e).__name__}: {e}); se reintenta fila por fila", file=sys.stderr)
+            rows = []
+            for r in chunk:
+                try:
+                    rows.extend(score_chunk([r]))
+                except Exception as e2:
+                    rows.append({"id": _txt(r.get("id"), ""), "error": f"{type(e2).__name__}: {e2}"})
+        writer.write(rows)
+        total += len(rows)
+        errors += sum(1 for r in rows if r.get("error"))
+        now = time.perf_counter()
+        if now - last >= progress_s:
+            last = now
+            print(f"⏳ {total} filas · {total / (now - t0):,.0f} filas/s", file=sys.stderr)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            inflight: deque = deque()
+            for chunk in _chunks(iter_patients(src), chunk_size):
+                inflight.append((pool.submit(score_chunk, chunk), chunk))
+                if len(inflight) >= max_inflight:
+                    _drain(inflight.popleft())
+            while inflight:
+                _drain(inflight.popleft())
+    finally:
+        writer.close()
+    dt = time.perf_counter() - t0
+    return {"rows": total, "errors": errors, "seconds": round(dt, 2),
+            "rows_per_s": round(total / dt, 1) if dt > 0 else 0.0}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Scoring de riesgo para planillas de pacientes (CSV/XLSX)")
+    ap.add_argument("input", help="archivo .csv o .xlsx (header: edad, peso, altura, tabaquismo, ...)")
+    ap.add_argument("-o", "--output", default="-", help="salida .csv o .jsonl (por defecto stdout)")
+    ap.add_argument("--format", choices=["csv", "jsonl"], default=None,
+                    help="formato de salida (por defecto según la extensión)")
+    ap.add_argument("--chunk", type=int, default=5000, help="filas por chunk")
+    ap.add_argument("--workers", type=int, default=None, help="procesos (por defecto: CPUs)")
+    args = ap.parse_args(argv)
+
+    fmt = args.format or ("jsonl" if args.output.lower().endswith((".jsonl", ".ndjson")) else "csv")
+    stats = score_file(args.input, args.output, fmt, max(1, args.chunk), args.workers)
+    print(f"✅ {stats['rows']} filas ({stats['errors']} con error) en {stats['seconds']} s · "
+          f"{stats['rows_per_s']:,.0f} filas/s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,111 @@
+# risk_calculation.py — punto único de cálculo de riesgo para la calculadora
+# Con RISK_API_URL (p. ej. http://127.0.0.1:8765) usa el servicio risk_service.py;
+# sin ella calcula en el proceso con risk_core.evaluar (mismos números).
+# - Cache LRU por entradas normalizadas (RISK_CACHE_SIZE): un rerun con los mismos datos
+#   no vuelve a llamar al servicio.
+# - Si el servicio falla, está lento o el circuito está abierto, se calcula localmente
+#   (fallback=True, por defecto) y queda contado en metrics(); con fallback=False se
+#   propaga api_client.APIClientError.
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from api_client import RISK_API_URL, APIClientError, get_client
+from risk_core import evaluar
+
+CACHE_SIZE = int(os.getenv("RISK_CACHE_SIZE", "2048"))
+
+_cache: "OrderedDict[Tuple[Any, ...], Dict[str, Any]]" = OrderedDict()
+_lock = threading.Lock()
+_metrics = {"calls": 0, "cache_hits": 0, "remote": 0, "local": 0, "fallbacks": 0}
+
+
+def _count(key: str) -> None:
+    with _lock:
+        _metrics[key] += 1
+
+
+def _norm_num(v: Any, nd: int) -> Any:
+    try:
+        return round(float(v), nd)
+    except (TypeError, ValueError):
+        return v
+
+
+def _cache_key(p: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Entradas normalizadas: números redondeados, textos sin espacios, antecedentes ordenados."""
+    txt = lambda v: "" if v is None else str(v).strip()  # noqa: E731
+    return (
+        _norm_num(p["edad"], 0), _norm_num(p["peso"], 2), _norm_num(p["altura"], 2),
+        txt(p["tabaquismo"]), txt(p["hipertension"]), txt(p["diabetes"]), txt(p["tiroides"]),
+        p["caprini_score"], p["caprini_mask"], tuple(sorted(p["antecedentes"] or ())),
+    )
+
+
+def calcular_riesgo_api(*, edad: Any, peso: Any, altura: Any, tabaquismo: str = "No",
+                        hipertension: str = "No", diabetes: str = "No", tiroides: str = "Normal",
+                        caprini_score: Any = None, caprini_mask: Any = None,
+                        antecedentes: Optional[List[str]] = None,
+                        fallback: bool = True, deadline_s: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Devuelve bmi, bmi_categoria, caprini_score, caprini_categoria, caprini_mask,
+    factor_riesgo, nivel_riesgo, recomendacion_ids y origen (service | local | fallback).
+    """
+    paciente = {
+        "edad": edad, "peso": peso, "altura": altura, "tabaquismo": tabaquismo,
+        "hipertension": hipertension, "diabetes": diabetes, "tiroides": tiroides,
+        "caprini_score": caprini_score, "caprini_mask": caprini_mask,
+        "antecedentes": antecedentes,
+    }
+    _count("calls")
+    try:
+        key: Optional[Tuple[Any, ...]] = _cache_key(paciente)
+        hash(key)
+    except TypeError:
+        key = None
+    if key is not None:
+        with _lock:
+            hit = _cache.get(key)
+            if hit is not None:
+                _cache.move_to_end(key)
+                _metrics["cache_hits"] += 1
+                return dict(hit)
+
+    if not RISK_API_URL:
+        res, origen = evaluar(**paciente), "local"
+    else:
+        try:
+            res = get_client().score({k: v for k, v in paciente.items() if v is not None}, deadline_s)
+            origen = "service"
+        except APIClientError as e:
+            if not fallback or (e.status is not None and 400 <= e.status < 500):
+                raise  # 4xx: datos inválidos; calcular local daría el mismo error
+            res, origen = evaluar(**paciente), "fallback"
+    _count({"service": "remote", "local": "local", "fallback": "fallbacks"}[origen])
+
+    res = {**res, "origen": origen}
+    if key is not None and CACHE_SIZE > 0:
+        with _lock:
+            _cache[key] = res
+            if len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+    return dict(res)
+
+
+def metrics() -> Dict[str, Any]:
+    """Contadores de cálculo + latencia/breaker del cliente HTTP."""
+    with _lock:
+        m: Dict[str, Any] = dict(_metrics)
+        m["cache_size"] = len(_cache)
+    misses = m["calls"] - m["cache_hits"]
+    m["fallback_rate"] = round(m["fallbacks"] / misses, 4) if misses else 0.0
+    if RISK_API_URL:
+        m["client"] = get_client().stats()
+    return m
+
+
+def clear_cache() -> None:
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,505 @@
+# risk_core.py — lógica de riesgo pura (Caprini, factor de riesgo, nivel y recomendaciones)
+# Sin Streamlit ni dependencias de UI: importa en milisegundos y sirve para la calculadora,
+# procesos batch, workers de process pool y el servicio de scoring.
+# Los idiomas se pasan explícitos (calculadora.py los toma de st.session_state).
+
+import functools
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+
+# === i18n para bullets de RECOMENDACIONES (ES/EN/PT) ===
+RECS_I18N: Dict[str, Dict[str, str]] = {
+    "bariatric_eval": {
+        "ES": "Evaluar cirugía bariátrica si corresponde.",
+        "EN": "Consider bariatric surgery if appropriate.",
+        "PT": "Considerar cirurgia bariátrica se apropriado.",
+    },
+    "limit_duration": {
+        "ES":
+        "Limitar cirugías a máximo 5 h; combinaciones hasta 4 h (según criterio).",
+        "EN":
+        "Limit surgeries to a maximum of 5 h; combinations up to 4 h (per clinical judgement).",
+        "PT":
+        "Limitar cirurgias a no máximo de 5 h; combinações até 4 h (a critério clínico).",
+    },
+}
+
+def normalize_lang(val: Optional[str]) -> str:
+    """Normaliza un código de idioma/locale a ES/EN/PT/FR (igual que calculadora._lang)."""
+    up = str(val or "ES").upper()
+    if up.startswith("E") and up != "ES":
+        return "EN"
+    if up.startswith("P"):
+        return "PT"
+    if up.startswith("F"):
+        return "FR"
+    return "ES"
+
+
+def tr_lang(lang: str, es: str, en: str, pt: str, fr: str = "") -> str:
+    """Texto en el idioma del informe (fallback ES), igual que calculadora.tr."""
+    return {"ES": es, "EN": en, "PT": pt, "FR": fr or es}.get(lang, es)
+
+
+def catalog_text(key: str, lang: str) -> str:
+    """Texto de RECS_I18N por clave (fallback ES), igual que calculadora._t."""
+    entry = RECS_I18N.get(key, {})
+    return entry.get(lang, entry.get("ES", ""))
+
+
+# ===================== Lógica de riesgo =====================
+# Texto paciente-amigable en cada ítem
+CAPRINI_1P = {
+    "Realizaré cirugía menor (<45 min)",
+    "Várices visibles",
+    "Enfermedad inflamatoria intestinal (diagnosticada)",
+    "Piernas hinchadas (edema actual)",
+    "Antecedente de neumonía reciente (último mes) o infección seria",
+    "Antecedente de infarto de miocardio",
+    "Insuficiencia cardíaca (diagnosticada)",
+    "Reposo en cama o movilidad limitada (<72 h; férula removible)",
+    "Anticonceptivos / Terapia hormonal (ACO/HRT)",
+    "Embarazo / puerperio (<1 mes)",
+    "Antecedentes obstétricos (mortinato/≥3 abortos/RCIU/toxemia)",
+}
+CAPRINI_2P = {
+    "Cáncer actual o previo (no piel no melanoma)",
+    "Realizaré cirugía mayor (>45 min)",
+    "Yeso o molde no removible en el último mes",
+    "Actualmente tiene catéter venoso central / PICC / Port",
+    "En reposo en cama ≥72 h",
+}
+CAPRINI_3P_GROUP = {
+    # 🔧 corregido typo: “tombosis” → “trombosis”
+    "Historia personal de trombosis venosa profunda/embolismo pulmonar",
+    "Antecedente familiar de trombosis o accidente cerebrovascular (ACV)",
+    "Trombofilia (test positivo de hipercoagulabilidad)",
+}
+CAPRINI_5P = {
+    "Antecedente de artroplastia electiva de cadera/rodilla",
+    "Antecedente de fractura de cadera/pelvis/pierna",
+    "Antecedente de trauma mayor",
+    "Lesión medular con parálisis",
+    "Accidente cerebrovascular (ACV) reciente",
+}
+CAPRINI_TODOS = sorted(CAPRINI_1P | CAPRINI_2P | CAPRINI_3P_GROUP | CAPRINI_5P)
+
+# ---------- Catálogo estable de factores (bitmask) ----------
+# Cada ítem tiene un ID estable y una posición de bit FIJA: una selección se guarda y se
+# loguea como un solo entero (caprini_mask). NO reordenar ni reutilizar bits; los ítems
+# nuevos van al final con el siguiente bit libre.
+CAPRINI_GRUPO_3P = "Grupo trombofilia / DVT / antecedente"
+
+
+class CapriniFactor(NamedTuple):
+    id: str
+    bit: int
+    peso: int  # 1, 2, 5 o 3 (grupo: suma 3 una sola vez)
+    label: str
+
+
+CAPRINI_CATALOGO: Tuple[CapriniFactor, ...] = (
+    CapriniFactor("cirugia_menor", 0, 1, "Realizaré cirugía menor (<45 min)"),
+    CapriniFactor("varices", 1, 1, "Várices visibles"),
+    CapriniFactor("eii", 2, 1, "Enfermedad inflamatoria intestinal (diagnosticada)"),
+    CapriniFactor("edema", 3, 1, "Piernas hinchadas (edema actual)"),
+    CapriniFactor("neumonia_infeccion", 4, 1, "Antecedente de neumonía reciente (último mes) o infección seria"),
+    CapriniFactor("iam", 5, 1, "Antecedente de infarto de miocardio"),
+    CapriniFactor("insuf_cardiaca", 6, 1, "Insuficiencia cardíaca (diagnosticada)"),
+    CapriniFactor("reposo_corto", 7, 1, "Reposo en cama o movilidad limitada (<72 h; férula removible)"),
+    CapriniFactor("aco_thr", 8, 1, "Anticonceptivos / Terapia hormonal (ACO/HRT)"),
+    CapriniFactor("embarazo_puerperio", 9, 1, "Embarazo / puerperio (<1 mes)"),
+    CapriniFactor("obstetricos", 10, 1, "Antecedentes obstétricos (mortinato/≥3 abortos/RCIU/toxemia)"),
+    CapriniFactor("cancer", 11, 2, "Cáncer actual o previo (no piel no melanoma)"),
+    CapriniFactor("cirugia_mayor", 12, 2, "Realizaré cirugía mayor (>45 min)"),
+    CapriniFactor("yeso", 13, 2, "Yeso o molde no removible en el último mes"),
+    CapriniFactor("cvc", 14, 2, "Actualmente tiene catéter venoso central / PICC / Port"),
+    CapriniFactor("reposo_largo", 15, 2, "En reposo en cama ≥72 h"),
+    CapriniFactor("tvp_tep", 16, 3, "Historia personal de trombosis venosa profunda/embolismo pulmonar"),
+    CapriniFactor("familiar_trombosis", 17, 3, "Antecedente familiar de trombosis o accidente cerebrovascular (ACV)"),
+    CapriniFactor("trombofilia", 18, 3, "Trombofilia (test positivo de hipercoagulabilidad)"),
+    CapriniFactor("artroplastia", 19, 5, "Antecedente de artroplastia electiva de cadera/rodilla"),
+    CapriniFactor("fractura", 20, 5, "Antecedente de fractura de cadera/pelvis/pierna"),
+    CapriniFactor("trauma_mayor", 21, 5, "Antecedente de trauma mayor"),
+    CapriniFactor("lesion_medular", 22, 5, "Lesión medular con parálisis"),
+    CapriniFactor("acv_reciente", 23, 5, "Accidente cerebrovascular (ACV) reciente"),
+)
+
+CAPRINI_POR_LABEL: Dict[str, CapriniFactor] = {f.label: f for f in CAPRINI_CATALOGO}
+CAPRINI_POR_ID: Dict[str, CapriniFactor] = {f.id: f for f in CAPRINI_CATALOGO}
+CAPRINI_BITS = max(f.bit for f in CAPRINI_CATALOGO) + 1
+
+
+def _mask_de(labels: Any) -> int:
+    return sum(1 << CAPRINI_POR_LABEL[x].bit for x in labels)
+
+
+# Tablas precomputadas: una máscara por peso (el grupo de 3 puntos suma una sola vez)
+MASK_1P = _mask_de(CAPRINI_1P)
+MASK_2P = _mask_de(CAPRINI_2P)
+MASK_5P = _mask_de(CAPRINI_5P)
+MASK_3P_GROUP = _mask_de(CAPRINI_3P_GROUP)
+# Peso por bit (0 para el grupo; se suma aparte): permite score = bits · pesos en batch
+_PESOS = {f.bit: f.peso for f in CAPRINI_CATALOGO if not (MASK_3P_GROUP >> f.bit) & 1}
+CAPRINI_PESOS_BIT: Tuple[int, ...] = tuple(_PESOS.get(b, 0) for b in range(CAPRINI_BITS))
+
+
+def caprini_mask(labels: Any) -> int:
+    """Etiquetas (texto o IDs) → entero con un bit por factor. Lo desconocido se ignora."""
+    m = 0
+    for x in labels or ():
+        f = CAPRINI_POR_LABEL.get(x) or CAPRINI_POR_ID.get(x)
+        if f is not None:
+            m |= 1 << f.bit
+    return m
+
+
+_mask_labels = caprini_mask  # alias: en evaluar() 'caprini_mask' es un parámetro
+
+
+def caprini_factores(mask: int) -> List[CapriniFactor]:
+    """Factores seleccionados en una máscara, en orden de catálogo."""
+    mask = int(mask or 0)
+    return [f for f in CAPRINI_CATALOGO if (mask >> f.bit) & 1]
+
+
+def caprini_ids(mask: int) -> str:
+    """Representación compacta y legible para logs: 'cancer;tvp_tep'."""
+    return ";".join(f.id for f in caprini_factores(mask))
+
+
+def caprini_score_mask(mask: int) -> int:
+    """Score Caprini por popcount: 1·|1P| + 2·|2P| + 5·|5P| + 3 si hay algún ítem del grupo."""
+    mask = int(mask or 0)
+    return ((mask & MASK_1P).bit_count()
+            + 2 * (mask & MASK_2P).bit_count()
+            + 5 * (mask & MASK_5P).bit_count()
+            + (3 if mask & MASK_3P_GROUP else 0))
+
+
+def caprini_desde(labels: List[str]) -> Tuple[int, Dict[str, int]]:
+    mask = caprini_mask(labels)
+    detalle: Dict[str, int] = {}
+    for f in caprini_factores(mask & ~MASK_3P_GROUP):
+        detalle[f.label] = f.peso
+    if mask & MASK_3P_GROUP:
+        detalle[CAPRINI_GRUPO_3P] = 3
+    return caprini_score_mask(mask), detalle
+
+
+def caprini_categoria(score: int) -> str:
+    if score <= 2:
+        return "Bajo (0–2)"
+    if score <= 8:
+        return "Intermedio (3–8)"
+    return "Alto (>8)"
+
+
+def factor_riesgo_fn(edad: int, bmi: float, tabaquismo: str,
+                     caprini_score: int) -> float:
+    f = 1.0 if edad < 18 else 1.0 + (edad / 100.0)**3.5
+    if bmi >= 30:
+        f += 0.4
+    elif bmi >= 25:
+        f += 0.2
+    if tabaquismo == "Sí (1–7 por semana)":
+        f += 0.1
+    elif tabaquismo in ("Más de 7 por semana", ">7 por semana"):
+        f += 0.3
+    if caprini_score >= 5:
+        f += 0.245
+    return round(f, 3)
+
+
+def nivel_por_factor(f: float) -> str:
+    if f >= 1.4:
+        return "Moderado" if f < 1.6 else "Alto"
+    if f >= 1.2:
+        return "Moderado"
+    return "Bajo"
+
+
+# ===================== Recomendaciones (AppSheet + Longevity®) =====================
+
+
+# Textos por ID de recomendación: (ES, EN, PT) o clave de RECS_I18N (idioma de la UI)
+REC_TEXTOS: Dict[str, Any] = {
+    "imc_bajo_subir": (
+        "Incrementa tu peso de manera saludable para alcanzar un IMC adecuado.",
+        "Increase your weight in a healthy way to reach a suitable BMI.",
+        "Aumente seu peso de forma saudável para atingir um IMC adequado."),
+    "imc_bajo_plan": (
+        "Considera un plan de alimentación rico en nutrientes y actividad física para ganar masa muscular.",
+        "Consider a nutrient-dense meal plan and physical activity to gain lean mass.",
+        "Considere um plano alimentar rico em nutrientes e atividade física para ganhar massa magra."),
+    "imc_alto_bajar": (
+        "Trabaja en reducir tu peso para alcanzar un IMC saludable.",
+        "Work on reducing your weight to reach a healthy BMI.",
+        "Trabalhe para reduzir seu peso e atingir um IMC saudável."),
+    "imc_alto_dieta": (
+        "Sigue una dieta balanceada y realiza actividad física regular.",
+        "Follow a balanced diet and perform regular physical activity.",
+        "Siga uma dieta equilibrada e pratique atividade física regularmente."),
+    "imc_mantener": (
+        "Mantén tu peso actual con dieta balanceada y actividad física regular.",
+        "Maintain your current weight with a balanced diet and regular physical activity.",
+        "Mantenha seu peso atual com dieta equilibrada e atividade física regular."),
+    "dejar_fumar": (
+        "Deja de fumar para reducir riesgos quirúrgicos y mejorar tu salud general. Consulta con un especialista si necesitas apoyo.",
+        "Quit smoking to reduce surgical risks and improve your overall health. Seek specialist support if needed.",
+        "Pare de fumar para reduzir riscos cirúrgicos e melhorar sua saúde geral. Procure apoio especializado se necessário."),
+    "control_presion": (
+        "Controla tu presión arterial regularmente y lleva un registro para tu médico.",
+        "Monitor your blood pressure regularly and keep a log for your physician.",
+        "Controle sua pressão arterial regularmente e mantenha um registro para seu médico."),
+    "control_glucosa": (
+        "Mantén control estricto de glucosa y sigue indicaciones de tu endocrinólogo.",
+        "Keep strict glucose control and follow your endocrinologist’s recommendations.",
+        "Mantenha controle estrito da glicose e siga as recomendações do seu endocrinologista."),
+    "chequeos_edad": (
+        "Programa chequeos preventivos regulares acordes a tu edad.",
+        "Schedule age-appropriate preventive checkups regularly.",
+        "Agende exames preventivos regulares apropriados para sua idade."),
+    "duracion_bajo": (
+        "Puedes considerar cirugía hasta 6 h; combinaciones hasta 5 h (según criterio).",
+        "You may consider surgery up to 6 h; combined procedures up to 5 h (as clinically indicated).",
+        "Você pode considerar cirurgia de até 6 h; combinações até 5 h (conforme indicação clínica)."),
+    "limit_duration": "limit_duration",  # RECS_I18N
+    "duracion_alto": (
+        "Riesgo alto: solo cirugías simples hasta 3 h. Combinaciones no recomendadas.",
+        "High risk: simple procedures only up to 3 h. Combined procedures not recommended.",
+        "Alto risco: apenas procedimentos simples de até 3 h. Combinações não recomendadas."),
+    "nutricionista": (
+        "Aumentar de peso con nutricionista; descartar trastorno alimentario si aplica.",
+        "Increase weight with a nutritionist; rule out eating disorder if applicable.",
+        "Aumentar o peso com nutricionista; descartar transtorno alimentar se aplicável."),
+    "hematologia": (
+        "Consultar con Hematología para evaluación de trastornos de coagulación.",
+        "Suggest a Hematology consult for evaluation of coagulation disorders.",
+        "Sugira consulta com Hematologia para avaliação de distúrbios de coagulação."),
+    "endocrinologia": (
+        "Consultar con Endocrinología y monitorear hormonas tiroideas.",
+        "Refer to Endocrinology and monitor thyroid hormones.",
+        "Consulte um endocrinologista e monitore hormônios da tireoide."),
+    "bariatric_eval": "bariatric_eval",  # RECS_I18N
+    "ergometria": (
+        "Ergometría según criterio médico.",
+        "Exercise stress test as clinically indicated.",
+        "Teste ergométrico conforme critério médico."),
+    "doppler_cac": (
+        "Doppler de carótidas y score cálcico coronario (CAC).",
+        "Carotid Doppler and coronary artery calcium (CAC) score.",
+        "Doppler de carótidas e escore de cálcio coronário (CAC)."),
+    "presurometria_eco": (
+        "Presurometría 24 h y Eco-estrés (ejercicio y reposo) según criterio médico.",
+        "24-hour ambulatory BP monitoring and stress echocardiography (exercise and rest) as clinically indicated.",
+        "Pressurometria 24 h e Eco-estresse (exercício e repouso) conforme critério médico."),
+    "disclaimer": (
+        "Estas sugerencias no sustituyen el criterio médico.",
+        "These suggestions do not replace medical judgment.",
+        "Estas sugestões não substituem o julgamento clínico."),
+}
+
+
+def recomendacion_texto(rec_id: str, lang: str = "ES", catalog_lang: Optional[str] = None) -> str:
+    """Texto de una recomendación: los de RECS_I18N van en catalog_lang, el resto en lang."""
+    entry = REC_TEXTOS[rec_id]
+    if isinstance(entry, str):
+        return catalog_text(entry, normalize_lang(catalog_lang if catalog_lang is not None else lang))
+    return tr_lang(lang, *entry)
+
+
+# ---------- Motor de reglas ----------
+# Las recomendaciones dependen sólo de unos pocos rasgos discretos (RecKey). Cada regla
+# es (ID, condición sobre RecKey) y se evalúan en orden; el resultado por clave (y por
+# idioma, para los textos) queda en un LRU acotado. risk_batch las aplica por columnas.
+class RecKey(NamedTuple):
+    imc: int  # 0: <18.5 · 1: <19.5 · 2: 19.5–25 · 3: >25 · 4: >28 · 5: >31
+    edad: int  # 0: <45 · 1: 45–49 · 2: ≥50
+    fuma: bool
+    hta: bool
+    diabetes: bool
+    tiroides: bool  # tiroides distinta de "Normal"
+    coagulacion: bool  # algún antecedente de coagulación / trombosis / DVT
+    fam_trombo: bool
+    riesgo: str  # Bajo | Moderado | Alto (cualquier otro valor se trata como Alto)
+
+
+def imc_banda(IMC: float) -> int:
+    # NaN cae en 2 (ninguna comparación es verdadera), igual que la cadena de if original
+    if IMC < 18.5:
+        return 0
+    if IMC < 19.5:
+        return 1
+    if IMC > 31:
+        return 5
+    if IMC > 28:
+        return 4
+    if IMC > 25:
+        return 3
+    return 2
+
+
+def edad_banda(edad: float) -> int:
+    return 2 if edad >= 50 else (1 if edad >= 45 else 0)
+
+
+def es_coagulacion(a: str) -> bool:
+    a = a.lower()
+    return "coagulación" in a or "trombo" in a or "dvt" in a
+
+
+def es_fam_trombo(a: str) -> bool:
+    return a == "Antecedente familiar de trombosis"
+
+
+def rec_key(*, IMC: float, edad: float, tabaquismo: str, hta_txt: str,
+            diabetes_txt: str, tiroides_txt: str, antecedentes: List[str],
+            riesgo: str) -> RecKey:
+    ants = [a for a in (antecedentes or []) if a]
+    return RecKey(
+        imc=imc_banda(IMC),
+        edad=edad_banda(edad),
+        fuma=(tabaquismo or "") != "No",
+        hta=(hta_txt or "") != "No",
+        diabetes=(diabetes_txt or "") != "No",
+        tiroides=(tiroides_txt or "") != "Normal",
+        coagulacion=any(es_coagulacion(a) for a in ants),
+        fam_trombo=any(es_fam_trombo(a) for a in ants),
+        riesgo=riesgo if riesgo in ("Bajo", "Moderado") else "Alto",
+    )
+
+
+class RecRule(NamedTuple):
+    id: str
+    cuando: Callable[[RecKey], bool]
+
+
+REC_RULES: Tuple[RecRule, ...] = (
+    # Peso / IMC
+    RecRule("imc_bajo_subir", lambda k: k.imc <= 1),
+    RecRule("imc_bajo_plan", lambda k: k.imc <= 1),
+    RecRule("imc_alto_bajar", lambda k: k.imc >= 3),
+    RecRule("imc_alto_dieta", lambda k: k.imc >= 3),
+    RecRule("imc_mantener", lambda k: k.imc == 2),
+    # Factores puntuales
+    RecRule("dejar_fumar", lambda k: k.fuma),
+    RecRule("control_presion", lambda k: k.hta),
+    RecRule("control_glucosa", lambda k: k.diabetes),
+    RecRule("chequeos_edad", lambda k: k.edad == 2),
+    # Caprini / sugerencia por riesgo
+    RecRule("duracion_bajo", lambda k: k.riesgo == "Bajo"),
+    RecRule("limit_duration", lambda k: k.riesgo == "Moderado"),
+    RecRule("duracion_alto", lambda k: k.riesgo == "Alto"),
+    # Condiciones adicionales tipo AppSheet
+    RecRule("nutricionista", lambda k: k.imc == 0),
+    RecRule("hematologia", lambda k: k.coagulacion),
+    RecRule("endocrinologia", lambda k: k.tiroides),
+    RecRule("bariatric_eval", lambda k: k.imc == 5),
+    # Cardiovascular ampliado
+    RecRule("ergometria", lambda k: k.imc >= 4 or k.edad >= 1 or k.hta),
+    RecRule("doppler_cac", lambda k: k.edad == 2 or k.hta or k.fam_trombo),
+    RecRule("presurometria_eco", lambda k: k.edad == 2 or k.hta or k.fam_trombo),
+    RecRule("disclaimer", lambda k: True),
+)
+
+
+@functools.lru_cache(maxsize=4096)
+def ids_por_clave(key: RecKey) -> Tuple[str, ...]:
+    """IDs de recomendación para una clave discreta (una evaluación de la tabla por clave)."""
+    return tuple(r.id for r in REC_RULES if r.cuando(key))
+
+
+@functools.lru_cache(maxsize=4096)
+def textos_por_clave(key: RecKey, lang: str, catalog_lang: Optional[str]) -> Tuple[str, ...]:
+    return tuple(recomendacion_texto(i, lang, catalog_lang) for i in ids_por_clave(key))
+
+
+def recomendacion_ids(*, IMC: float, edad: int, tabaquismo: str,
+                      hta_txt: str, diabetes_txt: str, tiroides_txt: str,
+                      caprini_score: int, antecedentes: List[str],
+                      riesgo: str) -> List[str]:
+    """IDs estables (claves de REC_TEXTOS) de las recomendaciones, en orden de informe."""
+    key = rec_key(IMC=IMC, edad=edad, tabaquismo=tabaquismo, hta_txt=hta_txt,
+                  diabetes_txt=diabetes_txt, tiroides_txt=tiroides_txt,
+                  antecedentes=antecedentes, riesgo=riesgo)
+    return list(ids_por_clave(key))
+
+
+def recomendaciones_txt(*, IMC: float, edad: int, tabaquismo: str,
+                        hta_txt: str, diabetes_txt: str, tiroides_txt: str,
+                        caprini_score: int, antecedentes: List[str],
+                        riesgo: str, lang: str = "ES",
+                        catalog_lang: Optional[str] = None) -> List[str]:
+    """
+    lang: idioma del informe (ES/EN/PT/FR) para los textos en línea.
+    catalog_lang: idioma de la UI para los textos de RECS_I18N (por defecto = lang).
+    """
+    key = rec_key(IMC=IMC, edad=edad, tabaquismo=tabaquismo, hta_txt=hta_txt,
+                  diabetes_txt=diabetes_txt, tiroides_txt=tiroides_txt,
+                  antecedentes=antecedentes, riesgo=riesgo)
+    return list(textos_por_clave(key, lang, catalog_lang))
+
+
+# ===================== Evaluación completa (calculadora, servicio, integraciones) =====================
+def imc(peso: float, altura_cm: float) -> float:
+    return round(peso / ((altura_cm / 100)**2), 1)
+
+
+def imc_categoria(bmi: float) -> str:
+    """underweight | healthy | overweight | obese (mismos cortes que la UI)."""
+    if bmi < 18.5:
+        return "underweight"
+    if bmi < 25:
+        return "healthy"
+    if bmi < 30:
+        return "overweight"
+    return "obese"
+
+
+def _a_numero(nombre: str, v: Any, tipo: Callable[[Any], Any] = float) -> Any:
+    try:
+        out = tipo(v)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{nombre}' inválido: {v!r}")
+    if out != out or out < 0:  # NaN o negativo
+        raise ValueError(f"'{nombre}' inválido: {v!r}")
+    return out
+
+
+def evaluar(*, edad: Any, peso: Any, altura: Any, tabaquismo: str = "No",
+            hipertension: str = "No", diabetes: str = "No", tiroides: str = "Normal",
+            caprini_score: Any = None, caprini_mask: Any = None,
+            antecedentes: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Scoring de un paciente con los mismos números que la calculadora.
+    Caprini: caprini_score explícito, o se deriva de caprini_mask / antecedentes.
+    Lanza ValueError si faltan datos o no son numéricos.
+    """
+    edad_v = _a_numero("edad", edad, int)
+    peso_v = _a_numero("peso", peso)
+    altura_v = _a_numero("altura", altura)
+    if altura_v <= 0:
+        raise ValueError("'altura' debe ser > 0")
+
+    mask = caprini_mask if caprini_mask is not None else _mask_labels(antecedentes or [])
+    mask = _a_numero("caprini_mask", mask, int)
+    cap = caprini_score_mask(mask) if caprini_score is None else _a_numero("caprini_score", caprini_score, int)
+    labels = list(antecedentes) if antecedentes else [f.label for f in caprini_factores(mask)]
+
+    bmi = imc(peso_v, altura_v)
+    f = factor_riesgo_fn(edad_v, bmi, tabaquismo, cap)
+    nivel = nivel_por_factor(f)
+    return {
+        "bmi": bmi,
+        "bmi_categoria": imc_categoria(bmi),
+        "caprini_score": cap,
+        "caprini_categoria": caprini_categoria(cap),
+        "caprini_mask": mask,
+        "factor_riesgo": f,
+        "nivel_riesgo": nivel,
+        "recomendacion_ids": recomendacion_ids(
+            IMC=bmi, edad=edad_v, tabaquismo=tabaquismo, hta_txt=hipertension,
+            diabetes_txt=diabetes, tiroides_txt=tiroides, caprini_score=cap,
+            antecedentes=labels, riesgo=nivel),
+    }
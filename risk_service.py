@@ -0,0 +1,304 @@
+# risk_service.py — servicio HTTP local de scoring de riesgo (asyncio, sólo stdlib)
+# Expone risk_core.evaluar para varias instancias de la app y para integraciones:
+#   python risk_service.py [--host 127.0.0.1] [--port 8765] [--workers 2]
+#   GET  /health             → {"ok": true}
+#   GET  /v1/stats           → contadores (requests, coalescidos, lotes, workers)
+#   POST /v1/score           → un paciente (JSON) → resultado
+#   POST /v1/score/batch     → {"pacientes": [...]} → {"resultados": [...]} (mismo orden)
+# HTTP/1.1 con keep-alive. Los pedidos individuales que llegan juntos se agrupan en un
+# micro-lote (RISK_SERVICE_COALESCE_MS) y los idénticos en vuelo comparten resultado;
+# cada micro-lote/lote corre en un pool de procesos para no bloquear el event loop.
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from risk_core import evaluar
+
+HOST = os.getenv("RISK_SERVICE_HOST", "127.0.0.1")
+PORT = int(os.getenv("RISK_SERVICE_PORT", "8765"))
+WORKERS = int(os.getenv("RISK_SERVICE_WORKERS", str(min(4, os.cpu_count() or 1))))
+COALESCE_MS = float(os.getenv("RISK_SERVICE_COALESCE_MS", "2"))
+MAX_COALESCE = int(os.getenv("RISK_SERVICE_MAX_COALESCE", "256"))
+MAX_BATCH = int(os.getenv("RISK_SERVICE_MAX_BATCH", "10000"))
+MAX_BODY = int(os.getenv("RISK_SERVICE_MAX_BODY", str(8 * 1024 * 1024)))
+IDLE_TIMEOUT_S = float(os.getenv("RISK_SERVICE_IDLE_S", "30"))
+
+_CAMPOS = ("edad", "peso", "altura", "tabaquismo", "hipertension", "diabetes", "tiroides",
+           "caprini_score", "caprini_mask", "antecedentes")
+_NUMERICOS = ("edad", "peso", "altura", "caprini_score", "caprini_mask")
+_TEXTOS = ("tabaquismo", "hipertension", "diabetes", "tiroides")
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+def validar(item: Dict[str, Any]) -> Optional[str]:
+    """Tipos de los campos de un paciente; devuelve el error o None si el pedido es evaluable."""
+    for k in _NUMERICOS:
+        v = item.get(k)
+        if v is not None and (isinstance(v, bool) or not isinstance(v, (int, float, str))):
+            return f"'{k}' debe ser numérico"
+    for k in _TEXTOS:
+        v = item.get(k)
+        if v is not None and not isinstance(v, str):
+            return f"'{k}' debe ser texto"
+    ant = item.get("antecedentes")
+    if ant is not None and (not isinstance(ant, list) or not all(isinstance(a, str) for a in ant)):
+        return "'antecedentes' debe ser una lista de textos"
+    return None
+
+
+def score_many(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Corre en un worker: evalúa cada paciente; los inválidos devuelven {'error': ...}."""
+    out: List[Dict[str, Any]] = []
+    for it in items:
+        try:
+            out.append(evaluar(**{k: it[k] for k in _CAMPOS if k in it}))
+        except Exception as e:  # un paciente malo no tumba al resto del lote
+            out.append({"error": str(e) if isinstance(e, ValueError) else f"{type(e).__name__}: {e}"})
+    return out
+
+
+def _key(item: Dict[str, Any]) -> str:
+    return json.dumps({k: item.get(k) for k in _CAMPOS}, sort_keys=True, ensure_ascii=False)
+
+
+class Coalescer:
+    """
+    Junta pedidos individuales durante COALESCE_MS (o hasta MAX_COALESCE) y los manda al
+    pool como UN trabajo. Pedidos idénticos en vuelo esperan el mismo future.
+    """
+
+    def __init__(self, run: Callable[[List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]],
+                 window_ms: float = COALESCE_MS, max_items: int = MAX_COALESCE) -> None:
+        self.run = run  # RiskService.run: score_many en el pool (rearmado si se rompe)
+        self.window_s = window_ms / 1000.0
+        self.max_items = max_items
+        self._pending: Dict[str, Tuple[Dict[str, Any], asyncio.Future]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.stats = {"requests": 0, "coalesced": 0, "batches": 0}
+
+    def submit(self, item: Dict[str, Any]) -> "asyncio.Future[Dict[str, Any]]":
+        self.stats["requests"] += 1
+        k = _key(item)
+        hit = self._pending.get(k)
+        if hit is not None:
+            self.stats["coalesced"] += 1
+            return hit[1]
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending[k] = (item, fut)
+        if len(self._pending) >= self.max_items:
+            self._fire()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_s, self._fire)
+        return fut
+
+    def _fire(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch = list(self._pending.values())
+        self._pending = {}
+        self.stats["batches"] += 1
+        asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        try:
+            results = await self.run([it for it, _ in batch])
+        except Exception:
+            # Falló el trabajo entero (worker muerto, serialización): reintentar de a uno, así
+            # un pedido problemático sólo afecta a su propio future
+            for it, fut in batch:
+                try:
+                    res = (await self.run([it]))[0]
+                except Exception as e:
+                    if not fut.done():
+                        fut.set_exception(e)
+                    continue
+                if not fut.done():
+                    fut.set_result(res)
+            return
+        for (_, fut), res in zip(batch, results):
+            if not fut.done():
+                fut.set_result(res)
+
+
+class RiskService:
+    def __init__(self, workers: int = WORKERS) -> None:
+        self.workers = workers
+        self.pool: Executor = self._new_pool()
+        self.coalescer = Coalescer(self.run)
+        self.started = time.time()
+        self.stats = {"connections": 0, "http_requests": 0, "batch_items": 0, "errors": 0,
+                      "pool_rebuilds": 0}
+
+    def _new_pool(self) -> Executor:
+        # workers=0: en hilo (útil para desarrollo; el GIL limita el paralelismo)
+        return ProcessPoolExecutor(self.workers) if self.workers > 0 else ThreadPoolExecutor(1)
+
+    async def run(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        score_many(items) en el pool. Si un worker murió (BrokenProcessPool) el pool queda
+        inservible para siempre: se arma otro y se reintenta una vez.
+        """
+        loop = asyncio.get_running_loop()
+        pool = self.pool
+        try:
+            return await loop.run_in_executor(pool, score_many, items)
+        except BrokenProcessPool:
+            if self.pool is pool:  # el primero que lo ve lo reemplaza; el resto usa el nuevo
+                print("⚠️ [risk_service] pool de procesos roto; se arma uno nuevo")
+                self.pool = self._new_pool()
+                self.stats["pool_rebuilds"] += 1
+                pool.shutdown(wait=False, cancel_futures=True)
+            return await loop.run_in_executor(self.pool, score_many, items)
+
+    # ---------- HTTP ----------
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.stats["connections"] += 1
+        try:
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT_S)
+                except asyncio.TimeoutError:
+                    break
+                if not line:
+                    break
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    await self._send(writer, 400, {"error": "request line inválida"}, False)
+                    break
+                headers: Dict[str, str] = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = h.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                conn = headers.get("connection", "").lower()
+                keep_alive = conn != "close" if version == "HTTP/1.1" else conn == "keep-alive"
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._send(writer, 400, {"error": "Content-Length inválido"}, False)
+                    break
+                if length > MAX_BODY:
+                    await self._send(writer, 413, {"error": "body demasiado grande"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                self.stats["http_requests"] += 1
+                status, payload = await self.route(method, target.split("?", 1)[0], body)
+                await self._send(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, payload: Any, keep_alive: bool) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                "Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + data)
+        await writer.drain()
+
+    async def route(self, method: str, path: str, body: bytes) -> Tuple[int, Any]:
+        try:
+            if path == "/health":
+                return 200, {"ok": True}
+            if path == "/v1/stats":
+                return 200, {**self.stats, **self.coalescer.stats, "workers": self.workers,
+                             "uptime_s": round(time.time() - self.started, 1)}
+            if path not in ("/v1/score", "/v1/score/batch"):
+                return 404, {"error": f"ruta desconocida: {path}"}
+            if method != "POST":
+                return 405, {"error": "usar POST"}
+            try:
+                data = json.loads(body or b"null")
+            except ValueError:
+                return 400, {"error": "JSON inválido"}
+
+            if path == "/v1/score":
+                if not isinstance(data, dict):
+                    return 400, {"error": "se espera un objeto JSON"}
+                err = validar(data)
+                if err:
+                    return 400, {"error": err}
+                res = await self.coalescer.submit(data)
+                return (400 if "error" in res else 200), res
+
+            items = data.get("pacientes") if isinstance(data, dict) else data
+            if not isinstance(items, list) or not all(isinstance(i, dict) for i in items):
+                return 400, {"error": "se espera {'pacientes': [ {...}, ... ]}"}
+            if len(items) > MAX_BATCH:
+                return 413, {"error": f"máximo {MAX_BATCH} pacientes por lote"}
+            for i, it in enumerate(items):
+                err = validar(it)
+                if err:
+                    return 400, {"error": f"pacientes[{i}]: {err}"}
+            self.stats["batch_items"] += len(items)
+            return 200, {"resultados": await self._score_batch(items)}
+        except Exception as e:
+            self.stats["errors"] += 1
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+
+    async def _score_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Parte el lote en un trozo por worker y los evalúa en paralelo."""
+        n = max(1, self.workers)
+        size = max(1, -(-len(items) // n))
+        parts = [items[i:i + size] for i in range(0, len(items), size)]
+        done = await asyncio.gather(*(self.run(p) for p in parts))
+        return [r for part in done for r in part]
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def serve(host: str = HOST, port: int = PORT, workers: int = WORKERS) -> None:
+    svc = RiskService(workers)
+    # Calentar el pool: el primer pedido no paga el arranque de los procesos
+    await asyncio.gather(*(svc.run([]) for _ in range(max(1, workers))))
+    server = await asyncio.start_server(svc.handle, host, port)
+    print(f"✅ risk_service escuchando en http://{host}:{port} ({workers} workers)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        svc.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Servicio HTTP local de scoring de riesgo")
+    ap.add_argument("--host", default=HOST)
+    ap.add_argument("--port", type=int, default=PORT)
+    ap.add_argument("--workers", type=int, default=WORKERS, help="procesos de scoring (0 = en hilo)")
+    args = ap.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,336 @@
+# sheets_backend.py — backends locales de Google Sheets (memoria / archivo) para pruebas y benchmarks
+# Implementan el subconjunto de gspread que usa el código de logging:
+#   Client.open_by_key · Spreadsheet.worksheet / get_worksheet_by_id / add_worksheet / del_worksheet /
+#   worksheets / batch_update (appendCells)
+#   Worksheet.row_values / append_row / append_rows / update / get_all_values
+# Se enchufan en gsheets.SheetsPool con SHEETS_BACKEND=memory | file:<directorio>
+# (o get_pool().use_backend(...)) y pueden inyectar latencia, errores 5xx y 429.
+
+import csv
+import io
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+try:
+    from gspread import WorksheetNotFound  # misma excepción que captura SheetsPool
+except Exception:  # pragma: no cover - gspread ausente
+    class WorksheetNotFound(Exception):  # type: ignore[no-redef]
+        pass
+
+FAKE_SERVICE_EMAIL = "fake-backend@localhost"
+
+
+# ---------- Inyección de fallas ----------
+class FakeResponse:
+    def __init__(self, status_code: int, headers: Optional[Dict[str, str]] = None) -> None:
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeAPIError(Exception):
+    """Imita gspread.exceptions.APIError: expone .response.status_code y .response.headers."""
+
+    def __init__(self, status_code: int, message: str = "", headers: Optional[Dict[str, str]] = None) -> None:
+        super().__init__(f"{status_code}: {message}")
+        self.response = FakeResponse(status_code, headers)
+
+
+@dataclass
+class FaultConfig:
+    latency_ms: float = 0.0        # latencia base por llamada
+    jitter_ms: float = 0.0         # + uniforme [0, jitter_ms]
+    error_rate: float = 0.0        # probabilidad de 503 por escritura
+    throttle_rate: float = 0.0     # probabilidad de 429 por escritura
+    retry_after_s: float = 1.0     # header Retry-After de los 429
+    seed: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> "FaultConfig":
+        def _f(name: str, default: float) -> float:
+            try:
+                return float(os.getenv(name, default))
+            except ValueError:
+                return default
+        seed = os.getenv("SHEETS_FAKE_SEED")
+        return cls(
+            latency_ms=_f("SHEETS_FAKE_LATENCY_MS", 0.0),
+            jitter_ms=_f("SHEETS_FAKE_JITTER_MS", 0.0),
+            error_rate=_f("SHEETS_FAKE_ERROR_RATE", 0.0),
+            throttle_rate=_f("SHEETS_FAKE_429_RATE", 0.0),
+            retry_after_s=_f("SHEETS_FAKE_RETRY_AFTER_S", 1.0),
+            seed=int(seed) if seed else None,
+        )
+
+
+class _Faults:
+    def __init__(self, cfg: FaultConfig) -> None:
+        self.cfg = cfg
+        self._rnd = random.Random(cfg.seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.injected_errors = 0
+        self.injected_429 = 0
+
+    def before_call(self, write: bool) -> None:
+        c = self.cfg
+        with self._lock:
+            self.calls += 1
+            delay = c.latency_ms + (self._rnd.uniform(0, c.jitter_ms) if c.jitter_ms else 0.0)
+            roll = self._rnd.random() if write else 1.0
+            if roll < c.throttle_rate:
+                self.injected_429 += 1
+            elif roll < c.throttle_rate + c.error_rate:
+                self.injected_errors += 1
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        if roll < c.throttle_rate:
+            raise FakeAPIError(429, "RESOURCE_EXHAUSTED: Quota exceeded (fake)",
+                               {"Retry-After": str(c.retry_after_s)})
+        if roll < c.throttle_rate + c.error_rate:
+            raise FakeAPIError(503, "Service unavailable (fake)")
+
+
+# ---------- Almacenamiento ----------
+class _MemoryStore:
+    def __init__(self) -> None:
+        self._tabs: Dict[str, Dict[str, List[List[Any]]]] = {}
+        self._gids: Dict[str, Dict[str, int]] = {}
+
+    def titles(self, key: str) -> Dict[str, int]:
+        return dict(self._gids.get(key, {}))
+
+    def create(self, key: str, title: str, gid: int) -> None:
+        self._tabs.setdefault(key, {})[title] = []
+        self._gids.setdefault(key, {})[title] = gid
+
+    def drop(self, key: str, title: str) -> None:
+        self._tabs.get(key, {}).pop(title, None)
+        self._gids.get(key, {}).pop(title, None)
+
+    def read(self, key: str, title: str) -> List[List[Any]]:
+        return [list(r) for r in self._tabs[key][title]]
+
+    def append(self, key: str, title: str, rows: List[List[Any]]) -> None:
+        self._tabs[key][title].extend([list(r) for r in rows])
+
+    def write_all(self, key: str, title: str, rows: List[List[Any]]) -> None:
+        self._tabs[key][title] = [list(r) for r in rows]
+
+
+class _FileStore:
+    """Un CSV por pestaña en <root>/<key>/<título>.csv + _gids.json; append = escritura al final."""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def _dir(self, key: str) -> str:
+        d = os.path.join(self.root, key)
+        os.makedirs(d, exist_ok=True)
+        return d
+
+    def _path(self, key: str, title: str) -> str:
+        safe = "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in title)
+        return os.path.join(self._dir(key), safe + ".csv")
+
+    def titles(self, key: str) -> Dict[str, int]:
+        p = os.path.join(self._dir(key), "_gids.json")
+        if not os.path.exists(p):
+            return {}
+        with open(p, "r", encoding="utf-8") as fh:
+            return {k: int(v) for k, v in json.load(fh).items()}
+
+    def create(self, key: str, title: str, gid: int) -> None:
+        gids = self.titles(key)
+        gids[title] = gid
+        with open(os.path.join(self._dir(key), "_gids.json"), "w", encoding="utf-8") as fh:
+            json.dump(gids, fh, ensure_ascii=False)
+        open(self._path(key, title), "a", encoding="utf-8").close()
+
+    def drop(self, key: str, title: str) -> None:
+        gids = self.titles(key)
+        gids.pop(title, None)
+        with open(os.path.join(self._dir(key), "_gids.json"), "w", encoding="utf-8") as fh:
+            json.dump(gids, fh, ensure_ascii=False)
+        try:
+            os.remove(self._path(key, title))
+        except FileNotFoundError:
+            pass
+
+    def read(self, key: str, title: str) -> List[List[Any]]:
+        with open(self._path(key, title), "r", encoding="utf-8", newline="") as fh:
+            return [row for row in csv.reader(fh)]
+
+    def append(self, key: str, title: str, rows: List[List[Any]]) -> None:
+        buf = io.StringIO()
+        csv.writer(buf).writerows(["" if v is None else v for v in r] for r in rows)
+        with open(self._path(key, title), "a", encoding="utf-8", newline="") as fh:
+            fh.write(buf.getvalue())
+
+    def write_all(self, key: str, title: str, rows: List[List[Any]]) -> None:
+        tmp = self._path(key, title) + ".tmp"
+        with open(tmp, "w", encoding="utf-8", newline="") as fh:
+            csv.writer(fh).writerows(rows)
+        os.replace(tmp, self._path(key, title))
+
+
+def _cell_value(cell: Dict[str, Any]) -> Any:
+    v = cell.get("userEnteredValue") or {}
+    for k in ("stringValue", "numberValue", "boolValue", "formulaValue"):
+        if k in v:
+            return v[k]
+    return ""
+
+
+# ---------- Objetos con interfaz gspread ----------
+class FakeWorksheet:
+    def __init__(self, backend: "LocalBackend", key: str, title: str, gid: int) -> None:
+        self._b = backend
+        self._key = key
+        self.title = title
+        self.id = gid
+
+    def row_values(self, row: int) -> List[Any]:
+        self._b.faults.before_call(write=False)
+        with self._b.lock:
+            rows = self._b.store.read(self._key, self.title)
+        values = list(rows[row - 1]) if 0 < row <= len(rows) else []
+        while values and values[-1] in ("", None):
+            values.pop()
+        return values
+
+    def get_all_values(self) -> List[List[Any]]:
+        self._b.faults.before_call(write=False)
+        with self._b.lock:
+            return self._b.store.read(self._key, self.title)
+
+    def append_row(self, values: List[Any], value_input_option: str = "RAW", **_kw: Any) -> Dict[str, Any]:
+        return self.append_rows([values], value_input_option=value_input_option)
+
+    def append_rows(self, values: List[List[Any]], value_input_option: str = "RAW", **_kw: Any) -> Dict[str, Any]:
+        self._b.faults.before_call(write=True)
+        with self._b.lock:
+            self._b.store.append(self._key, self.title, values)
+            self._b.rows_written += len(values)
+        return {"updates": {"updatedRows": len(values)}}
+
+    def update(self, range_name: str = "A1", values: Optional[List[List[Any]]] = None, **_kw: Any) -> Dict[str, Any]:
+        """Sólo rangos que empiezan en columna A (p.ej. 'A1', 'A5'): reemplaza filas completas."""
+        self._b.faults.before_call(write=True)
+        values = values or []
+        start = int("".join(ch for ch in range_name.split(":")[0] if ch.isdigit()) or 1)
+        with self._b.lock:
+            rows = self._b.store.read(self._key, self.title)
+            while len(rows) < start - 1 + len(values):
+                rows.append([])
+            for i, r in enumerate(values):
+                rows[start - 1 + i] = list(r)
+            self._b.store.write_all(self._key, self.title, rows)
+        return {"updatedRows": len(values)}
+
+
+class FakeSpreadsheet:
+    def __init__(self, backend: "LocalBackend", key: str) -> None:
+        self._b = backend
+        self.id = key
+
+    def worksheets(self) -> List[FakeWorksheet]:
+        with self._b.lock:
+            return [FakeWorksheet(self._b, self.id, t, g) for t, g in self._b.store.titles(self.id).items()]
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        self._b.faults.before_call(write=False)
+        with self._b.lock:
+            gid = self._b.store.titles(self.id).get(title)
+        if gid is None:
+            raise WorksheetNotFound(title)
+        return FakeWorksheet(self._b, self.id, title, gid)
+
+    def get_worksheet_by_id(self, gid: int) -> FakeWorksheet:
+        for ws in self.worksheets():
+            if ws.id == int(gid):
+                return ws
+        raise WorksheetNotFound(str(gid))
+
+    def add_worksheet(self, title: str, rows: int = 1000, cols: int = 26, **_kw: Any) -> FakeWorksheet:
+        self._b.faults.before_call(write=True)
+        with self._b.lock:
+            existing = self._b.store.titles(self.id)
+            if title in existing:
+                raise FakeAPIError(400, f'A sheet with the name "{title}" already exists')
+            gid = max(existing.values(), default=0) + 1
+            self._b.store.create(self.id, title, gid)
+        return FakeWorksheet(self._b, self.id, title, gid)
+
+    def batch_update(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """spreadsheets.batchUpdate: sólo appendCells; atómico como en la API real."""
+        self._b.faults.before_call(write=True)
+        with self._b.lock:
+            by_gid = {g: t for t, g in self._b.store.titles(self.id).items()}
+            plan = []
+            for req in body.get("requests", []):
+                ac = req.get("appendCells")
+                if ac is None or ac.get("sheetId") not in by_gid:
+                    raise FakeAPIError(400, f"Unsupported or invalid request: {req}")
+                rows = [[_cell_value(c) for c in r.get("values", [])] for r in ac.get("rows", [])]
+                plan.append((by_gid[ac["sheetId"]], rows))
+            for title, rows in plan:
+                self._b.store.append(self.id, title, rows)
+                self._b.rows_written += len(rows)
+        return {"spreadsheetId": self.id, "replies": [{} for _ in plan]}
+
+    def del_worksheet(self, worksheet: FakeWorksheet) -> None:
+        self._b.faults.before_call(write=True)
+        with self._b.lock:
+            self._b.store.drop(self.id, worksheet.title)
+
+
+class FakeClient:
+    def __init__(self, backend: "LocalBackend") -> None:
+        self._b = backend
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        return FakeSpreadsheet(self._b, key)
+
+
+class LocalBackend:
+    """Backend local intercambiable con el cliente gspread real dentro de SheetsPool."""
+
+    def __init__(self, store: Any, faults: Optional[FaultConfig] = None) -> None:
+        self.store = store
+        self.faults = _Faults(faults or FaultConfig())
+        self.lock = threading.RLock()
+        self.rows_written = 0
+        self.service_email = FAKE_SERVICE_EMAIL
+
+    def client(self) -> FakeClient:
+        return FakeClient(self)
+
+    def stats(self) -> Dict[str, int]:
+        f = self.faults
+        return {"calls": f.calls, "rows_written": self.rows_written,
+                "injected_errors": f.injected_errors, "injected_429": f.injected_429}
+
+
+def memory_backend(faults: Optional[FaultConfig] = None) -> LocalBackend:
+    return LocalBackend(_MemoryStore(), faults)
+
+
+def file_backend(root: str, faults: Optional[FaultConfig] = None) -> LocalBackend:
+    return LocalBackend(_FileStore(root), faults)
+
+
+def backend_from_env() -> Optional[LocalBackend]:
+    """SHEETS_BACKEND=memory | file:<dir>; vacío o 'google' = Google Sheets real."""
+    spec = (os.getenv("SHEETS_BACKEND") or "").strip()
+    if not spec or spec == "google":
+        return None
+    if spec == "memory":
+        return memory_backend(FaultConfig.from_env())
+    if spec.startswith("file:"):
+        return file_backend(spec[5:] or "share/sheets_fake", FaultConfig.from_env())
+    return None
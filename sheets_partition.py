@@ -0,0 +1,209 @@
+# sheets_partition.py — particionado mensual de pestañas de log y archivo local de meses viejos
+# Las pestañas grandes (Calculadora_Evaluaciones, V3_Interoperability_Log) se escriben en
+# una pestaña por mes: "<pestaña>_AAAA_MM". El ruteo es transparente: sheets_writer y
+# gsheets.append_row_safe llaman resolve_tab() antes de persistir/escribir la fila, y la
+# partición hereda el header registrado de la pestaña base (sheets_schema).
+# Las particiones viejas se exportan a Parquet (si hay pyarrow) o CSV.gz y se pueden borrar:
+#   python sheets_partition.py list
+#   python sheets_partition.py archive --keep-months 2 [--delete]
+
+import argparse
+import csv
+import gzip
+import os
+import re
+import threading
+from datetime import datetime, timezone
+from typing import Any, List, Optional, Set, Tuple
+
+from sheets_schema import get_registry, register_schema
+
+PARTITION_MODE = os.getenv("SHEETS_PARTITION", "monthly").strip().lower()  # monthly | off
+PARTITIONED_TABS = tuple(
+    t.strip() for t in os.getenv(
+        "SHEETS_PARTITION_TABS", "Calculadora_Evaluaciones,V3_Interoperability_Log").split(",")
+    if t.strip())
+ARCHIVE_DIR = os.getenv("SHEETS_ARCHIVE_DIR", "share/archive")
+
+_PART_RE = re.compile(r"^(?P<base>.+)_(?P<y>\d{4})_(?P<m>\d{2})$")
+_registered: Set[str] = set()
+_unrouted: Set[str] = set()  # bases sin header registrado (alertadas una vez)
+_lock = threading.Lock()
+
+
+def partition_name(base: str, when: Optional[datetime] = None) -> str:
+    when = when or datetime.now(timezone.utc)
+    return f"{base}_{when.year:04d}_{when.month:02d}"
+
+
+def parse_partition(title: str) -> Optional[Tuple[str, int, int]]:
+    """'Tab_2026_03' → ('Tab', 2026, 3) si Tab es una pestaña particionada."""
+    m = _PART_RE.match(title)
+    if not m or m.group("base") not in PARTITIONED_TABS:
+        return None
+    return m.group("base"), int(m.group("y")), int(m.group("m"))
+
+
+def base_tab(title: str) -> str:
+    parsed = parse_partition(title)
+    return parsed[0] if parsed else title
+
+
+def resolve_tab(tab: str, tab_gid: Optional[int] = None,
+                when: Optional[datetime] = None) -> Tuple[str, Optional[int]]:
+    """
+    Pestaña física para una fila de 'tab' escrita en 'when' (UTC, por defecto ahora).
+    Las no particionadas se devuelven tal cual; las particionadas pierden el gid
+    (el gid es de la pestaña base) y la partición queda registrada con su header.
+    Mientras la base no tenga header registrado no se rutea: una partición nueva sin
+    schema se abriría vacía y TabSchema.fit recortaría las filas a [].
+    """
+    if PARTITION_MODE == "off":
+        return tab, tab_gid
+    parsed = parse_partition(tab)
+    if parsed is not None:  # ya resuelta (p. ej. fila del outbox): asegurar su schema
+        _register_partition(tab, parsed[0])
+        return tab, tab_gid
+    if tab not in PARTITIONED_TABS:
+        return tab, tab_gid
+    part = partition_name(tab, when)
+    if not _register_partition(part, tab):
+        return tab, tab_gid  # la pestaña base existe con su header: se escribe ahí
+    return part, None
+
+
+def _register_partition(part: str, base: str) -> bool:
+    """Registra el header de 'base' para 'part'; False si la base aún no lo registró."""
+    if part in _registered:
+        return True
+    with _lock:
+        if part in _registered:
+            return True
+        expected = get_registry().expected(base)
+        if not expected:
+            if base not in _unrouted:
+                _unrouted.add(base)
+                print(f"⚠️ [sheets_partition] '{base}' sin header registrado; se escribe sin particionar")
+            return False
+        register_schema(part, expected)
+        _registered.add(part)
+        return True
+
+
+# ---------- Archivo de particiones viejas ----------
+def _month_index(y: int, m: int) -> int:
+    return y * 12 + (m - 1)
+
+
+def _has_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except Exception:
+        return False
+
+
+def _columns(header: List[Any], width: int) -> List[str]:
+    cols: List[str] = []
+    for i in range(width):
+        name = str(header[i]).strip() if i < len(header) and str(header[i]).strip() else f"col_{i + 1}"
+        while name in cols:
+            name += "_dup"
+        cols.append(name)
+    return cols
+
+
+def export_values(values: List[List[Any]], path_base: str, fmt: str = "auto") -> Tuple[str, int]:
+    """Escribe header + filas en <path_base>.parquet o .csv.gz; devuelve (ruta, filas de datos)."""
+    os.makedirs(os.path.dirname(path_base) or ".", exist_ok=True)
+    header, rows = (values[0], values[1:]) if values else ([], [])
+    width = max([len(header)] + [len(r) for r in rows]) if values else 0
+    use_parquet = fmt == "parquet" or (fmt == "auto" and _has_pyarrow())
+
+    if use_parquet:
+        import pandas as pd
+        cols = _columns(header, width)
+        padded = [[("" if v is None else str(v)) for v in r] + [""] * (width - len(r)) for r in rows]
+        df = pd.DataFrame(padded, columns=cols)
+        path = path_base + ".parquet"
+        tmp = path + ".tmp"
+        df.to_parquet(tmp, index=False, compression="zstd")
+        if len(pd.read_parquet(tmp)) != len(rows):
+            os.remove(tmp)
+            raise RuntimeError(f"verificación fallida: {path}")
+    else:
+        path = path_base + ".csv.gz"
+        tmp = path + ".tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8", newline="") as fh:
+            csv.writer(fh).writerows(values)
+        with gzip.open(tmp, "rt", encoding="utf-8", newline="") as fh:
+            if sum(1 for _ in csv.reader(fh)) != len(values):
+                os.remove(tmp)
+                raise RuntimeError(f"verificación fallida: {path}")
+    os.replace(tmp, path)
+    return path, len(rows)
+
+
+def list_partitions(sh: Any) -> List[Tuple[str, int, int, Any]]:
+    out = []
+    for ws in sh.worksheets():
+        parsed = parse_partition(ws.title)
+        if parsed:
+            out.append((*parsed, ws))
+    return sorted(out, key=lambda p: (p[0], p[1], p[2]))
+
+
+def archive_old_partitions(sh: Any, keep_months: int = 2, out_dir: str = ARCHIVE_DIR,
+                           fmt: str = "auto", delete: bool = False,
+                           now: Optional[datetime] = None) -> List[Tuple[str, str, int]]:
+    """
+    Exporta las particiones anteriores a los últimos 'keep_months' meses (incluye el actual).
+    Con delete=True borra la pestaña sólo después de verificar el archivo.
+    """
+    now = now or datetime.now(timezone.utc)
+    cutoff = _month_index(now.year, now.month) - max(1, keep_months) + 1
+    done = []
+    for base, y, m, ws in list_partitions(sh):
+        if _month_index(y, m) >= cutoff:
+            continue
+        path, n = export_values(ws.get_all_values(), os.path.join(out_dir, base, ws.title), fmt)
+        if delete:
+            sh.del_worksheet(ws)
+            try:
+                from gsheets import get_pool
+                get_pool().invalidate(ws.title)
+            except Exception:
+                pass
+        done.append((ws.title, path, n))
+    return done
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Particiones mensuales de las pestañas de log")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="listar particiones existentes")
+    a = sub.add_parser("archive", help="exportar (y opcionalmente borrar) particiones viejas")
+    a.add_argument("--keep-months", type=int, default=2, help="meses vivos en la Sheet (incluye el actual)")
+    a.add_argument("--out", default=ARCHIVE_DIR)
+    a.add_argument("--format", choices=["auto", "parquet", "csv"], default="auto")
+    a.add_argument("--delete", action="store_true", help="borrar la pestaña tras verificar el archivo")
+    args = ap.parse_args(argv)
+
+    from gsheets import get_pool
+    sh = get_pool().spreadsheet()
+    if sh is None:
+        print("❌ Sin credenciales de Google (GOOGLE_CREDENTIALS) ni SHEETS_BACKEND")
+        return 1
+
+    if args.cmd == "list":
+        for base, y, m, ws in list_partitions(sh):
+            print(f"{ws.title}\t{base}\t{y:04d}-{m:02d}")
+        return 0
+
+    for title, path, n in archive_old_partitions(sh, args.keep_months, args.out, args.format, args.delete):
+        print(f"✅ {title}: {n} filas → {path}{' (pestaña borrada)' if args.delete else ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,166 @@
+# sheets_quota.py — planificador de escrituras según la cuota de Google Sheets
+# Token bucket compartido por todos los escritores (gsheets.append_row_safe,
+# gsheets.append_rows_safe y el worker de sheets_writer). Se dimensiona con la
+# cuota de escritura del proyecto y se adapta a los 429: baja el ritmo a la mitad,
+# respeta Retry-After y lo recupera de a poco con cada escritura exitosa (AIMD).
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Cuota por defecto de Sheets API: 60 escrituras/minuto por usuario (service account)
+WRITE_QUOTA_PER_MIN = float(os.getenv("SHEETS_WRITE_QUOTA_PER_MIN", "60"))
+WRITE_BURST = float(os.getenv("SHEETS_WRITE_BURST", "10"))
+MIN_RATE_PER_MIN = 6.0
+MAX_PAUSE_S = 64.0
+
+
+def _retry_after_s(exc: Exception) -> Optional[float]:
+    resp = getattr(exc, "response", None)
+    headers = getattr(resp, "headers", None) or {}
+    try:
+        raw = headers.get("Retry-After") or headers.get("retry-after")
+        return float(raw) if raw is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_throttle(exc: Exception) -> bool:
+    """
+    True si la respuesta fue 429 / RESOURCE_EXHAUSTED. Sólo mira el status de la respuesta,
+    nunca el texto del error (puede traer valores de celdas o rangos con esos dígitos).
+    """
+    resp = getattr(exc, "response", None)
+    if getattr(resp, "status_code", None) == 429:
+        return True
+    # gspread.exceptions.APIError: .error = cuerpo JSON {"code": 429, "status": "RESOURCE_EXHAUSTED"}
+    err = getattr(exc, "error", None)
+    if isinstance(err, dict) and (err.get("code") == 429 or err.get("status") == "RESOURCE_EXHAUSTED"):
+        return True
+    return getattr(exc, "code", None) == 429
+
+
+class QuotaScheduler:
+    """
+    Token bucket thread-safe con ritmo adaptativo.
+    - try_acquire(): no bloquea; para el hilo de la UI (si no hay token, se encola en el outbox).
+    - acquire(timeout): espera un token; sólo lo usa el worker de fondo.
+    - on_success() / on_error(exc): retroalimentación de cada escritura.
+    - stats(): ritmo actual, techo, tokens, pausa, backlog y uso del último minuto.
+    """
+
+    def __init__(self, quota_per_min: float = WRITE_QUOTA_PER_MIN, burst: float = WRITE_BURST) -> None:
+        self.ceiling_per_min = max(MIN_RATE_PER_MIN, quota_per_min)
+        self.rate_per_min = self.ceiling_per_min
+        self.capacity = max(1.0, burst)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._consecutive_429 = 0
+        self._throttled_total = 0
+        self._granted: list = []  # timestamps de escrituras del último minuto
+        self._cond = threading.Condition()
+        self._backlog_source: Optional[Callable[[], int]] = None
+
+    # ---------- Tokens ----------
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity,
+                           self._tokens + (now - self._last) * self.rate_per_min / 60.0)
+        self._last = now
+
+    def delay(self) -> float:
+        """Segundos hasta que haya un token disponible (0 = ya)."""
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            pause = max(0.0, self._paused_until - now)
+            if self._tokens >= 1.0:
+                return pause
+            return max(pause, (1.0 - self._tokens) * 60.0 / self.rate_per_min)
+
+    def try_acquire(self) -> bool:
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._paused_until or self._tokens < 1.0:
+                return False
+            self._take(now)
+            return True
+
+    def acquire(self, timeout: float = 30.0) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= 1.0:
+                    self._take(now)
+                    return True
+                wait = max(self._paused_until - now,
+                           (1.0 - self._tokens) * 60.0 / self.rate_per_min, 0.01)
+                if now + wait > deadline:
+                    return False
+                self._cond.wait(wait)
+
+    def _take(self, now: float) -> None:
+        self._tokens -= 1.0
+        self._granted.append(now)
+        cutoff = now - 60.0
+        while self._granted and self._granted[0] < cutoff:
+            self._granted.pop(0)
+
+    # ---------- Retroalimentación ----------
+    def on_success(self) -> None:
+        with self._cond:
+            self._consecutive_429 = 0
+            # Aumento aditivo: +1 escritura/min por éxito hasta el techo de la cuota
+            self.rate_per_min = min(self.ceiling_per_min, self.rate_per_min + 1.0)
+
+    def on_error(self, exc: Exception) -> bool:
+        """Registra un error; si fue 429 adapta el ritmo y devuelve True."""
+        if not is_throttle(exc):
+            return False
+        with self._cond:
+            self._consecutive_429 += 1
+            self._throttled_total += 1
+            self.rate_per_min = max(MIN_RATE_PER_MIN, self.rate_per_min * 0.5)
+            pause = _retry_after_s(exc)
+            if pause is None:
+                pause = min(MAX_PAUSE_S, 2.0 ** self._consecutive_429)
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            self._tokens = min(self._tokens, 0.0)
+            self._cond.notify_all()
+        return True
+
+    # ---------- Observabilidad ----------
+    def set_backlog_source(self, fn: Callable[[], int]) -> None:
+        self._backlog_source = fn
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            cutoff = now - 60.0
+            used = sum(1 for t in self._granted if t >= cutoff)
+            out: Dict[str, Any] = {
+                "rate_per_min": round(self.rate_per_min, 2),
+                "ceiling_per_min": self.ceiling_per_min,
+                "tokens": round(self._tokens, 2),
+                "paused_for_s": round(max(0.0, self._paused_until - now), 2),
+                "writes_last_min": used,
+                "utilization": round(used / self.ceiling_per_min, 3),
+                "throttled_total": self._throttled_total,
+            }
+        try:
+            out["backlog"] = self._backlog_source() if self._backlog_source else 0
+        except Exception:
+            out["backlog"] = -1
+        return out
+
+
+_SCHEDULER = QuotaScheduler()
+
+
+def get_scheduler() -> QuotaScheduler:
+    return _SCHEDULER
@@ -0,0 +1,165 @@
+# sheets_schema.py — registro de esquemas (headers) por pestaña de Google Sheets
+# Antes cada append leía la fila 1 para saber orden y cantidad de columnas.
+# Ahora el header real se lee una vez al abrir la pestaña (y luego cada SHEETS_SCHEMA_TTL_S),
+# se compara con el header declarado en código y se guarda con su mapa columna → índice.
+# Las escrituras siguientes no hacen ninguna lectura extra.
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+SCHEMA_TTL_S = float(os.getenv("SHEETS_SCHEMA_TTL_S", str(30 * 60)))
+
+
+@dataclass(frozen=True)
+class TabSchema:
+    """Header real de una pestaña y su mapa nombre → índice de columna."""
+    tab: str
+    headers: Tuple[str, ...]
+    index: Dict[str, int] = field(compare=False)
+    loaded_at: float = field(compare=False, default=0.0)
+    drift: Tuple[str, ...] = field(compare=False, default=())
+
+    @property
+    def width(self) -> int:
+        return len(self.headers)
+
+    def fit(self, row: Any) -> List[Any]:
+        """Normaliza una fila (dict o lista) al orden/largo del header."""
+        n = self.width
+        if isinstance(row, dict):
+            out: List[Any] = [""] * n
+            for k, v in row.items():
+                i = self.index.get(k)
+                if i is not None:
+                    out[i] = v
+            return out
+        values = list(row) if row is not None else []
+        # Quitar vacíos a la izquierda (evita corrimientos)
+        while values and (values[0] is None or str(values[0]).strip() == ""):
+            values.pop(0)
+        if len(values) < n:
+            values.extend([""] * (n - len(values)))
+        elif len(values) > n:
+            values = values[:n]
+        return values
+
+
+def _make_schema(tab: str, headers: Sequence[str], drift: Sequence[str] = ()) -> TabSchema:
+    hs = tuple("" if h is None else str(h) for h in headers)
+    index: Dict[str, int] = {}
+    for i, h in enumerate(hs):
+        if h and h not in index:  # columnas duplicadas: se completa sólo la primera
+            index[h] = i
+    return TabSchema(tab, hs, index, time.monotonic(), tuple(drift))
+
+
+def _diff(expected: Sequence[str], actual: Sequence[str]) -> List[str]:
+    notes: List[str] = []
+    missing = [h for h in expected if h not in actual]
+    extra = [h for h in actual if h and h not in expected]
+    if missing:
+        notes.append("faltan: " + ", ".join(missing))
+    if extra:
+        notes.append("sobran: " + ", ".join(extra))
+    if not missing and not extra and list(expected) != list(actual)[:len(expected)]:
+        notes.append("orden distinto")
+    return notes
+
+
+class SchemaRegistry:
+    """
+    Headers declarados en código + header real cacheado por (spreadsheet, pestaña).
+    - register(tab, headers): header esperado (gsheets, calculadora, registro).
+    - load(ws, tab, key): una lectura de la fila 1; inicializa pestañas vacías, completa
+      columnas faltantes al final (re-sync) y alerta si el header divergió.
+    - get(ws, tab, key): schema cacheado; sólo relee si venció el TTL.
+    La Sheet es la fuente de verdad: ante drift se escribe con el header real.
+    """
+
+    def __init__(self, ttl_s: float = SCHEMA_TTL_S) -> None:
+        self.ttl_s = ttl_s
+        self._lock = threading.RLock()
+        self._expected: Dict[str, Tuple[str, ...]] = {}
+        self._cache: Dict[Tuple[str, str], TabSchema] = {}
+        self._alerted: Dict[Tuple[str, str], Tuple[str, ...]] = {}
+
+    def register(self, tab: str, headers: Sequence[str]) -> None:
+        hs = tuple(headers)
+        with self._lock:
+            prev = self._expected.get(tab)
+            if prev is not None and prev != hs:
+                print(f"⚠️ [sheets_schema] headers distintos registrados para '{tab}'; se mantiene el primero")
+                return
+            self._expected[tab] = hs
+
+    def expected(self, tab: str) -> Optional[Tuple[str, ...]]:
+        return self._expected.get(tab)
+
+    def get(self, ws: Any, tab: str, key: str = "") -> TabSchema:
+        with self._lock:
+            sch = self._cache.get((key, tab))
+        if sch is not None and time.monotonic() - sch.loaded_at < self.ttl_s:
+            return sch
+        return self.load(ws, tab, key)
+
+    def load(self, ws: Any, tab: str, key: str = "") -> TabSchema:
+        expected = self._expected.get(tab)
+        actual = [str(h) for h in (ws.row_values(1) or [])]
+        while actual and not actual[-1].strip():
+            actual.pop()
+
+        drift: List[str] = []
+        if expected and not actual:
+            # Pestaña nueva/vacía: se escribe el header declarado
+            ws.update(range_name="A1", values=[list(expected)])
+            actual = list(expected)
+        elif expected and actual != list(expected):
+            if list(expected[:len(actual)]) == actual:
+                # Re-sync: sólo faltan columnas al final → se agregan
+                try:
+                    ws.update(range_name="A1", values=[list(expected)])
+                    actual = list(expected)
+                except Exception:
+                    drift = ["faltan columnas al final (no se pudo re-sincronizar)"]
+            else:
+                drift = _diff(expected, actual)
+
+        sch = _make_schema(tab, actual, drift)
+        with self._lock:
+            self._cache[(key, tab)] = sch
+            if drift and self._alerted.get((key, tab)) != sch.drift:
+                self._alerted[(key, tab)] = sch.drift
+                print(f"⚠️ [sheets_schema] drift en '{tab}': {'; '.join(drift)}")
+        return sch
+
+    def invalidate(self, tab: Optional[str] = None, key: str = "") -> None:
+        with self._lock:
+            if tab is None:
+                for k in [k for k in self._cache if k[0] == key]:
+                    self._cache.pop(k, None)
+            else:
+                self._cache.pop((key, tab), None)
+
+    def invalidate_all(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._alerted.clear()
+
+    def drift_report(self) -> Dict[str, List[str]]:
+        """Pestañas cuyo header real no coincide con el declarado en código."""
+        with self._lock:
+            return {tab: list(s.drift) for (_k, tab), s in self._cache.items() if s.drift}
+
+
+_REGISTRY = SchemaRegistry()
+
+
+def get_registry() -> SchemaRegistry:
+    return _REGISTRY
+
+
+def register_schema(tab: str, headers: Sequence[str]) -> None:
+    _REGISTRY.register(tab, headers)
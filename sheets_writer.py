@@ -0,0 +1,263 @@
+# sheets_writer.py — escritura diferida (write-behind) a Google Sheets
+# Las funciones de logging escriben la fila en el outbox local (outbox.py, SQLite WAL)
+# y vuelven al instante; un hilo de fondo la drena y la envía en una sola llamada
+# (append_rows si el lote es de una pestaña, batchUpdate si abarca varias).
+# Nunca bloquea el hilo del script de Streamlit (ni los on_click de los emojis) esperando a Google.
+
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from gsheets import FAIL_AMBIGUOUS, FAIL_THROTTLE, append_rows_multi, append_rows_safe
+from outbox import DEAD, Outbox, OutboxRow, get_outbox, idempotency_key  # noqa: F401 (re-export)
+from sheets_quota import QuotaScheduler, get_scheduler
+from sheets_partition import resolve_tab
+from sheets_schema import get_registry
+
+FLUSH_INTERVAL_MS = int(os.getenv("SHEETS_FLUSH_MS", "1000"))
+MAX_BATCH_ROWS = int(os.getenv("SHEETS_BATCH_ROWS", "100"))
+PURGE_EVERY_S = 3600.0
+
+# (tab, tab_gid, value_input_option)
+_TabKey = Tuple[str, Optional[int], str]
+
+
+class SheetsWriter:
+    """
+    Worker de replay del outbox.
+    - enqueue(): un INSERT local; nunca hace I/O de red.
+    - Orden garantizado por pestaña: el outbox entrega por id y bloquea la pestaña en backoff.
+    - Flush cada FLUSH_INTERVAL_MS o en cuanto se acumulan MAX_BATCH_ROWS filas.
+    - Lote fallido: backoff exponencial por fila (outbox.mark_failed); nada se descarta.
+    - Envío ambiguo (timeout/5xx del append: pudo haber entrado): las filas pasan a 'dead'
+      para revisión en vez de reenviarse y duplicarse.
+    - close() (registrado en atexit) intenta vaciar lo pendiente antes de salir.
+    - Ritmo según la cuota (sheets_quota): sin token no reclama; un 429 devuelve el lote
+      a 'pending' para después del Retry-After sin gastar intentos.
+    """
+
+    def __init__(
+        self,
+        outbox: Optional[Outbox] = None,
+        flush_interval_ms: int = FLUSH_INTERVAL_MS,
+        max_batch_rows: int = MAX_BATCH_ROWS,
+        scheduler: Optional[QuotaScheduler] = None,
+    ) -> None:
+        self.outbox = outbox or get_outbox()
+        self.scheduler = scheduler or get_scheduler()
+        self.scheduler.set_backlog_source(self.outbox.pending_count)
+        self.flush_interval = max(0.01, flush_interval_ms / 1000.0)
+        self.max_batch_rows = max(1, max_batch_rows)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._drain_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._since_flush = 0
+        self._last_purge = time.monotonic()
+
+    # ---------- API pública ----------
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run,
+                                            name="sheets-writer",
+                                            daemon=True)
+            self._thread.start()
+
+    def enqueue(
+        self,
+        row: Any,
+        tab: str,
+        tab_gid: Optional[int] = None,
+        value_input_option: str = "RAW",
+        idem_key: Optional[bytes] = None,
+    ) -> bool:
+        self.start()
+        tab, tab_gid = resolve_tab(tab, tab_gid)  # partición mensual al momento del evento
+        if not self.outbox.put(row, tab, tab_gid, value_input_option, idem_key):
+            return True  # duplicado ya registrado: se suprime sin leer la Sheet
+        self._since_flush += 1
+        if self._since_flush >= self.max_batch_rows:
+            self._wake.set()
+        return True
+
+    def enqueue_many(self, items: List[Tuple[Any, ...]]) -> int:
+        """
+        Persiste un lote multi-pestaña en una sola transacción del outbox y despierta al
+        worker. Items: (row, tab, tab_gid, value_input_option, idem_key). Devuelve filas nuevas.
+        """
+        self.start()
+        routed = []
+        for row, tab, gid, *rest in items:
+            tab, gid = resolve_tab(tab, gid)
+            routed.append((row, tab, gid, *rest))
+        n = self.outbox.put_many(routed)
+        if n:
+            self._wake.set()
+        return n
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Drena lo pendiente (ignora el backoff) hasta vaciar o agotar 'timeout'."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            delay = self.scheduler.delay()
+            if delay > deadline - time.monotonic():
+                return False  # pausa por cuota más larga que el plazo: queda en disco
+            if delay > 0:
+                time.sleep(delay)  # hilo del worker / atexit, nunca el de la UI
+            if not self._drain_once(due_only=False) and self.scheduler.delay() <= 0:
+                return self.outbox.pending_count() == 0
+        return False
+
+    def close(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        # Lo que no llegue a salir queda 'pending' en disco para el próximo arranque
+        self.flush(timeout)
+
+    def backlog(self) -> int:
+        return self.outbox.pending_count()
+
+    # ---------- Worker ----------
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._since_flush = 0
+            # Cuota agotada o pausa por 429: esperar aquí, no en el hilo de la UI
+            delay = self.scheduler.delay()
+            if delay > 0:
+                self._stop.wait(delay)
+                if self._stop.is_set():
+                    break
+            try:
+                while self._drain_once() and not self._stop.is_set():
+                    pass
+                if time.monotonic() - self._last_purge > PURGE_EVERY_S:
+                    self.outbox.purge_sent()
+                    self._last_purge = time.monotonic()
+            except Exception:
+                time.sleep(self.flush_interval)  # p.ej. disco bloqueado: reintentar en el próximo ciclo
+
+    def _drain_once(self, due_only: bool = True) -> int:
+        """
+        Reclama un lote del outbox y lo envía: una pestaña → append_rows; varias → un solo
+        spreadsheets.batchUpdate (gsheets.append_rows_multi), y si éste falla por un error
+        común, un append_rows por pestaña. Devuelve filas enviadas.
+        """
+        with self._drain_lock:
+            claimed = self.outbox.claim(self.max_batch_rows, due_only=due_only)
+            if not claimed:
+                return 0
+            by_tab: "OrderedDict[_TabKey, List[OutboxRow]]" = OrderedDict()
+            for r in claimed:
+                by_tab.setdefault(r.key, []).append(r)
+
+            if len(by_tab) > 1:
+                ok, _svc, why = append_rows_multi(
+                    [([r.row for r in rows], tab, tab_gid, vio)
+                     for (tab, tab_gid, vio), rows in by_tab.items()])
+                if ok or why in (FAIL_THROTTLE, FAIL_AMBIGUOUS):
+                    return self._settle(claimed, ok, why,
+                                        "batchUpdate failed: " + ", ".join(k[0] for k in by_tab))
+                # El batchUpdate es atómico: una fila mala (esquema/rango) tumba a todas las
+                # pestañas. Reintentar por pestaña para que cada una falle o entre por su cuenta.
+
+            sent = 0
+            for (tab, tab_gid, vio), rows in by_tab.items():
+                ok, _svc, why = append_rows_safe([r.row for r in rows], tab, tab_gid, vio)
+                sent += self._settle(rows, ok, why, f"append_rows failed: {tab}")
+            return sent
+
+    def _settle(self, rows: List[OutboxRow], ok: bool, why: Optional[str], error: str) -> int:
+        ids = [r.id for r in rows]
+        if ok:
+            self.outbox.mark_sent(ids)
+            return len(ids)
+        if why == FAIL_THROTTLE:
+            # 429 / sin token: no cuenta como intento fallido, vuelve tras la pausa
+            self.outbox.release(ids, not_before=time.time() + self.scheduler.delay())
+        elif why == FAIL_AMBIGUOUS:
+            self.outbox.mark_dead(ids, error=f"ambiguo, revisar antes de requeue-dead: {error}")
+        else:
+            self.outbox.mark_failed(ids, error=error)  # 5xx, timeout, etc.: backoff y, al tope, 'dead'
+        return 0
+
+
+_WRITER: Optional[SheetsWriter] = None
+_WRITER_LOCK = threading.Lock()
+
+
+def get_writer() -> SheetsWriter:
+    global _WRITER
+    if _WRITER is None:
+        with _WRITER_LOCK:
+            if _WRITER is None:
+                _WRITER = SheetsWriter()
+                atexit.register(_WRITER.close)
+    return _WRITER
+
+
+def enqueue_row(
+    row: Any,
+    tab: str,
+    tab_gid: Optional[int] = None,
+    value_input_option: str = "RAW",
+    idem_key: Optional[bytes] = None,
+) -> bool:
+    """
+    Persiste una fila en el outbox para la pestaña 'tab'. True = guardada (se envía en
+    segundo plano) o ya registrada antes con la misma idem_key (ver outbox.idempotency_key).
+    """
+    try:
+        return get_writer().enqueue(row, tab, tab_gid, value_input_option, idem_key)
+    except Exception:
+        return False
+
+
+def park_row(
+    row: Any,
+    tab: str,
+    tab_gid: Optional[int] = None,
+    value_input_option: str = "RAW",
+    idem_key: Optional[bytes] = None,
+    error: str = "",
+) -> bool:
+    """
+    Guarda en el outbox como 'dead' una fila cuyo envío fue ambiguo (timeout/5xx en el append):
+    no se reenvía sola para no duplicarla; se revisa en la hoja y se reencola con requeue-dead.
+    """
+    try:
+        get_writer().outbox.put(row, tab, tab_gid, value_input_option, idem_key,
+                                state=DEAD, error=f"ambiguo, revisar antes de requeue-dead: {error}")
+        return True
+    except Exception:
+        return False
+
+
+def enqueue_rows(items: List[Tuple[Any, ...]]) -> bool:
+    """Lote (row, tab, tab_gid, value_input_option, idem_key) en una transacción; False si falló el outbox."""
+    try:
+        get_writer().enqueue_many(items)
+        return True
+    except Exception:
+        return False
+
+
+def writer_stats() -> Dict[str, Any]:
+    """Estado de entrega del outbox (pending / inflight / sent / dead), de la cuota y drift de headers."""
+    w = get_writer()
+    out: Dict[str, Any] = dict(w.outbox.stats())
+    out["quota"] = w.scheduler.stats()
+    out["schema_drift"] = get_registry().drift_report()
+    return out